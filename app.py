@@ -1,8 +1,12 @@
 import streamlit as st
 from utils import (
-    GLOBAL_CSS, check_login, render_sidebar, page_header,
-    metric_card, query
+    GLOBAL_CSS, check_login, segundos_bloqueo, render_sidebar, page_header,
+    metric_card, ensure_schema
 )
+from utils_dashboard import dashboard_snapshot
+from utils_arranque import iniciar_calentamiento
+from utils_vencimientos import iniciar_programador
+from utils_perfil import perfilar_rerun, seccion, mostrar_ultimo
 
 # ── Siempre lo primero ──
 st.set_page_config(
@@ -12,6 +16,9 @@ st.set_page_config(
     initial_sidebar_state="expanded",
 )
 st.markdown(GLOBAL_CSS, unsafe_allow_html=True)
+iniciar_calentamiento()
+ensure_schema()
+iniciar_programador()
 
 # ─────────────────────────────────────────────
 # LOGIN
@@ -37,6 +44,9 @@ def pantalla_login():
                     st.session_state["rol"]     = rol
                     st.session_state["page"]    = "Dashboard"
                     st.rerun()
+                elif segundos_bloqueo(username):
+                    st.error("Demasiados intentos fallidos. Inténtalo de nuevo en "
+                             f"{segundos_bloqueo(username)} s.")
                 else:
                     st.error("Usuario o contraseña incorrectos.")
         st.markdown("</div>", unsafe_allow_html=True)
@@ -47,18 +57,11 @@ def pantalla_login():
 def pagina_dashboard():
     page_header("📊", "Dashboard")
 
-    empleados = query("SELECT COUNT(*) AS n FROM empleados WHERE activo = TRUE")
-    vehiculos = query("SELECT COUNT(*) AS n FROM vehiculos")
-    servicios = query("SELECT COUNT(*) AS n FROM servicios")
-    ausencias = query(
-        "SELECT COUNT(*) AS n FROM ausencias "
-        "WHERE fecha_inicio <= CURRENT_DATE AND (fecha_fin IS NULL OR fecha_fin >= CURRENT_DATE)"
-    )
-
-    n_emp = empleados[0]["n"] if empleados else "—"
-    n_veh = vehiculos[0]["n"] if vehiculos else "—"
-    n_srv = servicios[0]["n"] if servicios else "—"
-    n_aus = ausencias[0]["n"] if ausencias else "—"
+    snap  = dashboard_snapshot()
+    n_emp = snap.get("empleados_activos", "—")
+    n_veh = snap.get("vehiculos", "—")
+    n_srv = snap.get("servicios", "—")
+    n_aus = snap.get("ausencias_hoy", "—")
 
     c1, c2, c3, c4 = st.columns(4)
     with c1: metric_card("👥 Empleados activos", n_emp, "blue")
@@ -71,15 +74,11 @@ def pagina_dashboard():
 
     with col_a:
         st.markdown("#### Ausencias recientes")
-        rows = query("""
-            SELECT e.nombre, e.apellidos, a.tipo, a.fecha_inicio, a.fecha_fin
-            FROM ausencias a
-            JOIN empleados e ON e.id = a.empleado_id
-            ORDER BY a.fecha_inicio DESC LIMIT 8
-        """)
+        rows = snap.get("ausencias_recientes")
         if rows:
             import pandas as pd
-            df = pd.DataFrame(rows)
+            df = pd.DataFrame(rows, columns=["nombre", "apellidos", "tipo",
+                                             "fecha_inicio", "fecha_fin"])
             df.columns = ["Nombre", "Apellidos", "Tipo", "Inicio", "Fin"]
             st.dataframe(df, use_container_width=True, hide_index=True)
         else:
@@ -87,17 +86,11 @@ def pagina_dashboard():
 
     with col_b:
         st.markdown("#### ITVs próximas a vencer")
-        rows_itv = query("""
-            SELECT matricula, marca, modelo, itv_vigente_hasta,
-                   (itv_vigente_hasta - CURRENT_DATE) AS dias
-            FROM vehiculos
-            WHERE itv_vigente_hasta IS NOT NULL
-              AND itv_vigente_hasta >= CURRENT_DATE
-            ORDER BY itv_vigente_hasta ASC LIMIT 6
-        """)
+        rows_itv = snap.get("itv_proximas")
         if rows_itv:
             import pandas as pd
-            df2 = pd.DataFrame(rows_itv)
+            df2 = pd.DataFrame(rows_itv, columns=["matricula", "marca", "modelo",
+                                                  "itv_vigente_hasta", "dias"])
             df2.columns = ["Matrícula", "Marca", "Modelo", "ITV hasta", "Días"]
             st.dataframe(df2, use_container_width=True, hide_index=True)
         else:
@@ -109,20 +102,29 @@ def pagina_dashboard():
 if not st.session_state.get("login"):
     pantalla_login()
 else:
-    render_sidebar()
     page = st.session_state.get("page", "Dashboard")
-
-    if page == "Dashboard":
-        pagina_dashboard()
-    elif page == "Empleados":
-        from pages.empleados import render
-        render()
-    elif page == "Vehiculos":
-        from pages.vehiculos import render
-        render()
-    elif page == "Servicios":
-        from pages.servicios import render
-        render()
-    elif page == "Ausencias":
-        from pages.ausencias import render
-        render()
+    with perfilar_rerun(page):
+        with seccion("sidebar"):
+            render_sidebar()
+        with seccion(page):
+            if page == "Dashboard":
+                pagina_dashboard()
+            elif page == "Empleados":
+                from pages.empleados import render
+                render()
+            elif page == "Vehiculos":
+                from pages.vehiculos import render
+                render()
+            elif page == "Flota":
+                from pages.flota import render
+                render()
+            elif page == "Servicios":
+                from pages.servicios import render
+                render()
+            elif page == "Ausencias":
+                from pages.ausencias import render
+                render()
+            elif page == "Rendimiento" and st.session_state.get("rol") == "admin":
+                from pages.rendimiento import render
+                render()
+    mostrar_ultimo()
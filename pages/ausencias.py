@@ -2,8 +2,19 @@
 import streamlit as st
 import datetime
 from utils import query, execute, page_header, badge
+from utils_ausencias import indice_ausencias
+from utils_cuadrante import cuadrante
+from utils_import import panel_importacion
+from utils_export import boton_exportar
+from utils_perfil import seccion
 
 
+SQL_EMPLEADOS_ACTIVOS = (
+    "SELECT id, nombre || ' ' || apellidos AS nombre_completo "
+    "FROM empleados WHERE activo=TRUE ORDER BY apellidos"
+)
+SQL_NOMBRES = "SELECT id, nombre || ' ' || apellidos AS nombre_completo FROM empleados"
+
 TIPO_COLORS = {
     "Vacaciones":             "blue",
     "Baja médica":            "red",
@@ -13,16 +24,43 @@ TIPO_COLORS = {
 }
 
 
+def precargar():
+    """Deja en caché la lista de empleados activos y el índice (ver utils_arranque)."""
+    query(SQL_EMPLEADOS_ACTIVOS, ttl=300)
+    query(SQL_NOMBRES, ttl=300)
+    indice_ausencias()
+
+
+def panel_cuadrante(nombres: dict):
+    """Turnos de los próximos 7 días que necesitan sustituto o tienen el vehículo mal."""
+    inicio = st.date_input("Semana desde", value=datetime.date.today(), key="cuadrante_desde")
+    res = cuadrante(inicio, inicio + datetime.timedelta(days=6))
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Turnos", len(res["turnos"]))
+    c2.metric("Sustituciones", res["sustituciones"])
+    c3.metric("Sin cubrir", res["sin_cubrir"])
+    avisos = [t for t in res["turnos"] if t["motivo"] or t["vehiculo_estado"] != "ok"]
+    if not avisos:
+        st.success("Todos los turnos tienen su conductor y vehículo habituales.")
+        return
+    st.dataframe([{
+        "Fecha":     t["fecha"],
+        "Servicio":  t["codigo"],
+        "Horario":   f"{t['horario_inicio'] or '—'} – {t['horario_fin'] or '—'}",
+        "Base":      nombres.get(t["empleado_base_id"], "—"),
+        "Conductor": nombres.get(t["empleado_id"], "⚠️ sin cubrir"),
+        "Motivo":    t["motivo"] or "",
+        "Vehículo":  t["vehiculo_estado"],
+    } for t in avisos], use_container_width=True, hide_index=True)
+
+
 def render():
     page_header("📅", "Ausencias · Bajas · Vacaciones")
 
     # ── Filtros ──
     col1, col2, col3, col4 = st.columns([1.5, 1.2, 1, 1])
     with col1:
-        empleados_list = query(
-            "SELECT id, nombre || ' ' || apellidos AS nombre_completo "
-            "FROM empleados WHERE activo=TRUE ORDER BY apellidos"
-        )
+        empleados_list = query(SQL_EMPLEADOS_ACTIVOS, ttl=300)
         opciones_emp = {"Todos los empleados": None}
         opciones_emp.update({e["nombre_completo"]: e["id"] for e in empleados_list})
         sel_emp = st.selectbox("Empleado", list(opciones_emp.keys()),
@@ -44,28 +82,18 @@ def render():
                                     value=datetime.date.today(),
                                     label_visibility="collapsed")
 
-    # ── Query ──
-    where  = ["a.fecha_inicio <= %s", "a.fecha_fin >= %s"]
-    params = [fecha_hasta, fecha_desde]
-
-    if emp_id_filtro:
-        where.append("a.empleado_id = %s")
-        params.append(emp_id_filtro)
-    if tipo_filtro != "Todos los tipos":
-        where.append("a.tipo = %s")
-        params.append(tipo_filtro)
-
-    sql = """
-        SELECT a.id, e.nombre || ' ' || e.apellidos AS empleado,
-               a.tipo, a.fecha_inicio, a.fecha_fin,
-               (a.fecha_fin - a.fecha_inicio + 1) AS dias,
-               a.observaciones
-        FROM ausencias a
-        JOIN empleados e ON e.id = a.empleado_id
-        WHERE """ + " AND ".join(where) + """
-        ORDER BY a.fecha_inicio DESC
-    """
-    rows = query(sql, params)
+    # ── Consulta al índice en memoria ──
+    nombres = {e["id"]: e["nombre_completo"] for e in query(SQL_NOMBRES, ttl=300)}
+    rows = []
+    for r in indice_ausencias().registros(
+            fecha_desde, fecha_hasta,
+            tipo=None if tipo_filtro == "Todos los tipos" else tipo_filtro,
+            empleado_id=emp_id_filtro):
+        if r["empleado_id"] in nombres:
+            r["empleado"] = nombres[r["empleado_id"]]
+            r["dias"] = (max((r["fecha_fin"] - r["fecha_inicio"]).days + 1, 1)
+                         if r["fecha_fin"] else None)         # sin fin: en curso
+            rows.append(r)
 
     # ── Métricas rápidas ──
     total_dias = sum(r.get("dias") or 0 for r in rows)
@@ -97,12 +125,27 @@ def render():
             <div class="metric-value">{n_baja}</div>
         </div>""", unsafe_allow_html=True)
 
+    # ── Exportación (mismos filtros, en streaming desde la BD) ──
+    exp_where  = ["periodo_ausencia(a.fecha_inicio, a.fecha_fin) && daterange(%s, %s, '[]')"]
+    exp_params = [fecha_desde, fecha_hasta]
+    if emp_id_filtro:
+        exp_where.append("a.empleado_id = %s")
+        exp_params.append(emp_id_filtro)
+    if tipo_filtro != "Todos los tipos":
+        exp_where.append("a.tipo = %s")
+        exp_params.append(tipo_filtro)
+    with st.expander("📤 Exportar ausencias filtradas"):
+        boton_exportar("ausencias", exp_where, exp_params)
+
+    with st.expander("🗓️ Cuadrante: sustituciones de la semana"), seccion("cuadrante"):
+        panel_cuadrante(nombres)
+
     st.markdown("---")
 
     # ── Tabla de resultados ──
     col_tabla, col_form = st.columns([1.8, 1])
 
-    with col_tabla:
+    with col_tabla, seccion("filas"):
         if not rows:
             st.info("No hay ausencias con los filtros seleccionados.")
         else:
@@ -121,8 +164,8 @@ def render():
                             &nbsp;{b}
                         </div>
                         <div style="font-size:0.8rem;color:#5A6D82;">
-                            {r['fecha_inicio']} → {r['fecha_fin']}
-                            &nbsp;·&nbsp; <b>{r['dias']} día(s)</b>
+                            {r['fecha_inicio']} → {r['fecha_fin'] or 'en curso'}
+                            &nbsp;·&nbsp; <b>{f"{r['dias']} día(s)" if r['dias'] else 'sin fecha de fin'}</b>
                         </div>
                     </div>
                     <div style="font-size:0.78rem;color:#5A6D82;margin-top:4px;">
@@ -132,7 +175,7 @@ def render():
                 """, unsafe_allow_html=True)
 
     # ── Formulario nueva ausencia ──
-    with col_form:
+    with col_form, seccion("formulario"):
         st.markdown("#### ➕ Registrar ausencia")
         with st.container():
             st.markdown('<div class="card card-orange">', unsafe_allow_html=True)
@@ -160,3 +203,4 @@ def render():
                         st.success("✅ Ausencia registrada.")
                         st.rerun()
             st.markdown("</div>", unsafe_allow_html=True)
+        panel_importacion("ausencias")
@@ -1,6 +1,18 @@
 """pages/empleados.py — Lista de empleados y ficha individual."""
 import streamlit as st
-from utils import query, execute, page_header, back_button, badge
+from utils import (
+    query, query_frame, execute, page_header, back_button, badge,
+    query_page, contar, pagina_actual, controles_pagina, PAGE_SIZES,
+)
+
+from utils_busqueda import buscar_empleados, BUSQUEDA_LIMITE
+from utils_storage import miniatura_url
+from utils_pdf import pdf_empleados
+from utils_import import panel_importacion
+from utils_export import boton_exportar
+from utils_perfil import seccion
+
+ORDEN_EMPLEADOS = ["COALESCE(apellidos, '')", "COALESCE(nombre, '')", "id"]
 
 def ficha_empleado(emp_id: int):
     rows = query("SELECT * FROM empleados WHERE id = %s", (emp_id,))
@@ -16,7 +28,8 @@ def ficha_empleado(emp_id: int):
     col_foto, col_info = st.columns([0.15, 0.85])
     with col_foto:
         if e.get("foto_url"):
-            st.image(e["foto_url"], width=90)
+            st.image(miniatura_url(e["foto_url"], 256) if e.get("foto_miniaturas")
+                     else e["foto_url"], width=90)
         else:
             initials = (e.get("nombre","?")[0] + e.get("apellidos","?")[0]).upper()
             st.markdown(f"""
@@ -46,7 +59,7 @@ def ficha_empleado(emp_id: int):
         "📋 Datos personales", "🚛 Servicios asignados", "📅 Ausencias / Bajas"
     ])
 
-    with tab_datos:
+    with tab_datos, seccion("tab_datos"):
         c1, c2 = st.columns(2)
         with c1:
             nombre    = st.text_input("Nombre",    value=e.get("nombre", ""))
@@ -67,8 +80,8 @@ def ficha_empleado(emp_id: int):
             if ok:
                 st.success("Empleado actualizado correctamente.")
 
-    with tab_servicios:
-        servicios = query("""
+    with tab_servicios, seccion("tab_servicios"):
+        servicios = query_frame("""
             SELECT s.id, s.codigo, s.descripcion, s.tipo_servicio,
                    s.horario_inicio, s.horario_fin, s.dias_servicio,
                    v.matricula, v.marca, v.modelo
@@ -79,10 +92,8 @@ def ficha_empleado(emp_id: int):
             LIMIT 30
         """, (emp_id,))
 
-        if servicios:
-            import pandas as pd
-            df = pd.DataFrame(servicios)
-            df = df.rename(columns={
+        if not servicios.empty:
+            df = servicios.rename(columns={
                 "id": "ID", "codigo": "Código", "descripcion": "Descripción",
                 "tipo_servicio": "Tipo", "horario_inicio": "Inicio",
                 "horario_fin": "Fin", "dias_servicio": "Días",
@@ -92,18 +103,16 @@ def ficha_empleado(emp_id: int):
         else:
             st.info("Este empleado no tiene servicios asignados.")
 
-    with tab_ausencias:
-        ausencias = query("""
+    with tab_ausencias, seccion("tab_ausencias"):
+        ausencias = query_frame("""
             SELECT id, tipo, fecha_inicio, fecha_fin, observaciones
             FROM ausencias
             WHERE empleado_id = %s
             ORDER BY fecha_inicio DESC
         """, (emp_id,))
 
-        if ausencias:
-            import pandas as pd
-            df_a = pd.DataFrame(ausencias)
-            df_a = df_a.rename(columns={
+        if not ausencias.empty:
+            df_a = ausencias.rename(columns={
                 "id": "ID", "tipo": "Tipo", "fecha_inicio": "Inicio",
                 "fecha_fin": "Fin", "observaciones": "Observaciones"
             })
@@ -135,63 +144,86 @@ def ficha_empleado(emp_id: int):
 def lista_empleados():
     page_header("👥", "Empleados")
 
-    col_search, col_filter, col_btn = st.columns([2, 1, 0.8])
+    col_search, col_filter, col_size, col_btn = st.columns([2, 1, 0.6, 0.8])
     with col_search:
         buscar = st.text_input("🔍 Buscar", placeholder="Nombre, apellidos o DNI…",
                                label_visibility="collapsed")
     with col_filter:
         filtro_activo = st.selectbox("Estado", ["Todos", "Activos", "Inactivos"],
                                      label_visibility="collapsed")
+    with col_size:
+        page_size = st.selectbox("Por página", PAGE_SIZES, index=1,
+                                 label_visibility="collapsed", key="emp_page_size")
     with col_btn:
         if st.button("➕ Nuevo empleado", use_container_width=True):
             st.session_state["nuevo_empleado"] = True
 
     where, params = [], []
-    if buscar:
-        where.append("(nombre ILIKE %s OR apellidos ILIKE %s OR dni ILIKE %s)")
-        params += [f"%{buscar}%"] * 3
     if filtro_activo == "Activos":
         where.append("activo = TRUE")
     elif filtro_activo == "Inactivos":
         where.append("activo = FALSE")
 
-    sql = "SELECT * FROM empleados"
-    if where:
-        sql += " WHERE " + " AND ".join(where)
-    sql += " ORDER BY apellidos, nombre"
-
-    empleados = query(sql, params or None)
-    st.markdown(f"**{len(empleados)} empleado(s)**")
+    after = pagina_actual("empleados", (buscar, filtro_activo, page_size))
+    if buscar:
+        empleados, siguiente = buscar_empleados(buscar, where, params), None
+        st.markdown(f"**{len(empleados)} resultado(s)**"
+                    + (f" · mostrando los {BUSQUEDA_LIMITE} más relevantes"
+                       if len(empleados) >= BUSQUEDA_LIMITE else ""))
+    else:
+        empleados, siguiente = query_page("empleados", ORDEN_EMPLEADOS, where, params,
+                                          after=after, limit=page_size)
+        st.markdown(f"**{contar('empleados', where, params)} empleado(s)**")
     st.markdown("---")
 
     if not empleados:
         st.info("No se encontraron empleados.")
         return
 
-    for emp in empleados:
-        nombre_completo = f"{emp.get('nombre','')} {emp.get('apellidos','')}"
-        initials = (emp.get("nombre","?")[0] + emp.get("apellidos","?")[0]).upper()
-        estado   = badge("Activo", "green") if emp.get("activo") else badge("Inactivo", "red")
+    with seccion("filas"):
+        for emp in empleados:
+            nombre_completo = f"{emp.get('nombre','')} {emp.get('apellidos','')}"
+            initials = (emp.get("nombre","?")[0] + emp.get("apellidos","?")[0]).upper()
+            estado   = badge("Activo", "green") if emp.get("activo") else badge("Inactivo", "red")
 
-        col_main, col_action = st.columns([5, 0.8])
-        with col_main:
-            st.markdown(f"""
-            <div class="row-card">
-                <div class="row-avatar">{initials}</div>
-                <div>
-                    <div class="row-name">{nombre_completo} &nbsp; {estado}</div>
-                    <div class="row-sub">
-                        📧 {emp.get('email','—')} &nbsp;|&nbsp;
-                        📱 {emp.get('telefono','—')} &nbsp;|&nbsp;
-                        🪪 {emp.get('dni','—')}
+            col_main, col_action = st.columns([5, 0.8])
+            with col_main:
+                st.markdown(f"""
+                <div class="row-card">
+                    <div class="row-avatar">{initials}</div>
+                    <div>
+                        <div class="row-name">{nombre_completo} &nbsp; {estado}</div>
+                        <div class="row-sub">
+                            📧 {emp.get('email','—')} &nbsp;|&nbsp;
+                            📱 {emp.get('telefono','—')} &nbsp;|&nbsp;
+                            🪪 {emp.get('dni','—')}
+                        </div>
                     </div>
                 </div>
-            </div>
-            """, unsafe_allow_html=True)
-        with col_action:
-            if st.button("Ver ficha →", key=f"emp_{emp['id']}"):
-                st.session_state["selected_empleado"] = emp["id"]
-                st.rerun()
+                """, unsafe_allow_html=True)
+            with col_action:
+                if st.button("Ver ficha →", key=f"emp_{emp['id']}"):
+                    st.session_state["selected_empleado"] = emp["id"]
+                    st.rerun()
+
+    controles_pagina("empleados", siguiente)
+
+    with st.expander("🖨️ Imprimir fichas en PDF"):
+        st.caption("Una ficha por empleado con el filtro de estado actual.")
+        # El PDF guardado solo vale para el filtro con el que se generó
+        filtro = (tuple(where), tuple(params))
+        if st.button("Generar PDF", key="emp_pdf_generar"):
+            with st.spinner("Generando fichas…"):
+                st.session_state["emp_pdf"] = (filtro, pdf_empleados(where, params))
+        generado, pdf = st.session_state.get("emp_pdf") or (None, None)
+        if pdf and generado == filtro:
+            st.download_button("⬇️ Descargar PDF", pdf,
+                               file_name="fichas_empleados.pdf", mime="application/pdf",
+                               key="emp_pdf_descargar")
+    with st.expander("📤 Exportar"):
+        boton_exportar("empleados", where, params)
+        boton_exportar("servicios", etiqueta="⬇️ Exportar servicios asignados")
+    panel_importacion("empleados")
 
     if st.session_state.get("nuevo_empleado"):
         st.markdown("---")
@@ -222,6 +254,8 @@ def lista_empleados():
 
 def render():
     if st.session_state.get("selected_empleado"):
-        ficha_empleado(st.session_state["selected_empleado"])
+        with seccion("ficha"):
+            ficha_empleado(st.session_state["selected_empleado"])
     else:
-        lista_empleados()
+        with seccion("lista"):
+            lista_empleados()
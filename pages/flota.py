@@ -0,0 +1,96 @@
+"""pages/flota.py — Tablero de salud de la flota a partir del último check-in."""
+import pandas as pd
+import streamlit as st
+
+from utils import page_header, metric_card
+from utils_checkins import flota, incidencias, resumen_puntos, ITEMS
+from utils_perfil import seccion
+
+DIAS_INSPECCION = 30        # a partir de aquí el último check-in se considera antiguo
+
+ESTADO_FLOTA = {2: "❌ Defecto", 1: "⚠️ Revisar", 0: "✅ Correcto", None: "⚪ Sin check-in"}
+
+
+def sin_inspeccion(f: dict) -> bool:
+    """Sin check-in o con el último de hace más de DIAS_INSPECCION días."""
+    return f["dias"] is None or f["dias"] > DIAS_INSPECCION
+
+
+def precargar():
+    """Deja en caché el estado de la flota (ver utils_arranque)."""
+    flota()
+
+
+def render():
+    page_header("🩺", "Salud de la flota")
+
+    filas = flota()
+    n_def = sum(f["gravedad"] == 2 for f in filas)
+    n_rev = sum(f["gravedad"] == 1 for f in filas)
+    n_sin = sum(f["gravedad"] is None for f in filas)
+    n_old = sum(sin_inspeccion(f) for f in filas)
+
+    c1, c2, c3, c4 = st.columns(4)
+    with c1: metric_card("❌ Con defecto", n_def, "orange")
+    with c2: metric_card("⚠️ A revisar", n_rev, "yellow")
+    with c3: metric_card("⚪ Sin check-in", n_sin, "blue")
+    with c4: metric_card(f"⏳ Sin inspección en {DIAS_INSPECCION} días", n_old, "green")
+
+    st.markdown("---")
+    col_tabla, col_puntos = st.columns([2, 1])
+
+    with col_puntos, seccion("puntos"):
+        st.markdown("#### Incidencias por punto")
+        puntos = resumen_puntos()
+        if any(p["revisar"] or p["defecto"] for p in puntos):
+            df_p = pd.DataFrame(puntos).set_index("label")[["defecto", "revisar"]]
+            df_p.columns = ["Defecto", "Revisar"]
+            st.bar_chart(df_p, horizontal=True, color=["#C0392B", "#D4890A"])
+        else:
+            st.info("Ningún vehículo tiene incidencias en su último check-in.")
+
+    with col_tabla, seccion("tabla"):
+        f1, f2, f3 = st.columns([1.2, 1.2, 1])
+        estado_sel = f1.selectbox("Estado", ["Todos", *ESTADO_FLOTA.values()],
+                                  label_visibility="collapsed", key="flota_estado")
+        punto_sel = f2.selectbox("Punto", ["Todos los puntos", *ITEMS.values()],
+                                 label_visibility="collapsed", key="flota_punto")
+        antiguos = f3.checkbox(f"Sin inspección en {DIAS_INSPECCION} días", key="flota_antiguos")
+
+        punto = next((k for k, v in ITEMS.items() if v == punto_sel), None)
+        vista = []
+        for f in filas:
+            if estado_sel != "Todos" and ESTADO_FLOTA[f["gravedad"]] != estado_sel:
+                continue
+            malos = incidencias(f)
+            if punto and punto not in dict(malos):
+                continue
+            if antiguos and not sin_inspeccion(f):
+                continue
+            vista.append({
+                "id": f["vehiculo_id"],
+                "Matrícula": f["matricula"] or "—",
+                "Vehículo": f"{f['marca'] or ''} {f['modelo'] or ''}".strip() or "—",
+                "Estado": ESTADO_FLOTA[f["gravedad"]],
+                "Incidencias": ", ".join(f"{v.split()[0]} {ITEMS.get(k, k).split(' ', 1)[-1]}"
+                                         for k, v in malos) or "—",
+                "Último check-in": f["fecha"],
+                "Días": f["dias"],
+                "Responsable": f["responsable"] or "—",
+            })
+
+        st.markdown(f"**{len(vista)} vehículo(s)** · selecciona una fila para abrir su ficha")
+        if not vista:
+            st.info("Ningún vehículo con estos filtros.")
+            return
+        df = pd.DataFrame(vista)
+        sel = st.dataframe(
+            df.drop(columns="id"), use_container_width=True, hide_index=True,
+            on_select="rerun", selection_mode="single-row", key="flota_tabla",
+            column_config={"Días": st.column_config.NumberColumn(format="%d")},
+        )
+        if sel.selection.rows:
+            st.session_state["selected_vehiculo"] = int(df.iloc[sel.selection.rows[0]]["id"])
+            st.session_state["page"] = "Vehiculos"
+            st.session_state.pop("flota_tabla", None)     # que no reabra la ficha al volver
+            st.rerun()
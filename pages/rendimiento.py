@@ -0,0 +1,126 @@
+"""pages/rendimiento.py — Tiempos de consulta, consultas lentas y estado del pool (solo admin)."""
+import datetime
+from pathlib import Path
+
+import pandas as pd
+import streamlit as st
+
+from utils import (
+    page_header, metric_card, get_metricas, get_query_cache,
+    pool_status, preparadas_status,
+)
+from utils_perfil import get_perfilador
+
+
+def render():
+    page_header("⏱️", "Rendimiento")
+    if st.session_state.get("rol") != "admin":
+        st.error("Solo los administradores pueden ver esta página.")
+        return
+
+    metr       = get_metricas()
+    sentencias = metr.sentencias()
+    paginas    = metr.paginas()
+    lentas     = metr.lentas()
+    n_total    = sum(f["n"] for f in sentencias)
+    ms_total   = sum(f["total_ms"] for f in sentencias)
+
+    c1, c2, c3, c4 = st.columns(4)
+    with c1: metric_card("🔢 Consultas", n_total, "blue")
+    with c2: metric_card("⏱️ Media", f"{ms_total / n_total:.1f} ms" if n_total else "—", "orange")
+    with c3: metric_card("🐢 Lentas", len(lentas), "yellow")
+    with c4: metric_card("❌ Errores", sum(f["errores"] for f in sentencias), "green")
+    st.caption(f"Desde {metr.desde:%d/%m/%Y %H:%M} · lenta a partir de {metr.lenta_ms:.0f} ms · "
+               "percentiles aproximados al límite del cubo del histograma")
+
+    tab_sql, tab_pag, tab_lentas, tab_bd, tab_reruns = st.tabs(
+        ["🧾 Por sentencia", "📄 Por página", "🐢 Lentas", "🗄️ Pool y cachés", "🔁 Reruns"]
+    )
+
+    with tab_sql:
+        if sentencias:
+            df = pd.DataFrame(sentencias).rename(columns={
+                "sentencia": "Sentencia", "pagina": "Página", "n": "N",
+                "total_ms": "Total ms", "media_ms": "Media ms", "p50_ms": "p50",
+                "p95_ms": "p95", "p99_ms": "p99", "max_ms": "Máx ms",
+                "filas": "Filas", "errores": "Errores",
+            })
+            st.dataframe(df, use_container_width=True, hide_index=True)
+        else:
+            st.info("Aún no se ha registrado ninguna consulta.")
+
+    with tab_pag:
+        if paginas:
+            df = pd.DataFrame(paginas).rename(columns={
+                "pagina": "Página", "n": "N", "total_ms": "Total ms",
+                "media_ms": "Media ms", "p95_ms": "p95", "max_ms": "Máx ms",
+                "filas": "Filas", "errores": "Errores",
+            })
+            st.dataframe(df, use_container_width=True, hide_index=True)
+        else:
+            st.info("Aún no se ha registrado ninguna consulta.")
+
+    with tab_lentas:
+        if not lentas:
+            st.info(f"Ninguna consulta ha pasado de {metr.lenta_ms:.0f} ms.")
+        for l in lentas:
+            with st.expander(f"{l['ms']:.0f} ms · {l['pagina']} · {l['cuando']} · "
+                             f"{l['sentencia'][:80]}"):
+                st.code(l["sentencia"], language="sql")
+                st.caption(f"{l['filas']} fila(s)")
+                if l["plan"]:
+                    st.code(l["plan"], language="text")
+
+    with tab_bd:
+        ps = pool_status()
+        st.markdown(f"**Pool** — {ps['en_uso']}/{ps['max']} en uso · {ps['libres']} libres · "
+                    f"{ps['checkouts']} checkouts · {ps['timeouts']} timeouts · "
+                    f"espera media {ps['espera_media_ms']} ms (máx {ps['espera_max_ms']} ms)")
+        qc = get_query_cache().estado()
+        st.markdown(f"**Caché de consultas** — {qc['entradas']} entradas · "
+                    f"aciertos {qc['hit_rate']:.0%}")
+        pp = preparadas_status()
+        st.markdown(f"**Sentencias preparadas** — {pp['preparadas']} de {pp['sentencias']} · "
+                    f"aciertos {pp['hit_rate']:.0%}")
+        if pp["detalle"]:
+            st.dataframe(pd.DataFrame(pp["detalle"]).rename(columns={
+                "sql": "Sentencia", "ejecuciones": "Ejecuciones", "preparadas": "Por EXECUTE",
+                "aciertos": "Aciertos", "preparaciones": "PREPARE", "hit_rate": "Tasa",
+            }), use_container_width=True, hide_index=True)
+
+    with tab_reruns:
+        perf    = get_perfilador()
+        resumen = perf.resumen()
+        if not resumen:
+            st.info("Activa «⏱️ Perfilar reruns» en el menú lateral y navega por la app.")
+        else:
+            df = pd.DataFrame(resumen).rename(columns={
+                "seccion": "Sección", "n": "N", "media_ms": "Media ms", "p95_ms": "p95 ms",
+                "max_ms": "Máx ms", "presupuesto_ms": "Presupuesto ms",
+                "excedido": "Fuera de presupuesto",
+            })
+            st.dataframe(df, use_container_width=True, hide_index=True)
+            for reg in perf.reruns()[:20]:
+                aviso = f" · ⚠️ {', '.join(reg['excedidas'])}" if reg["excedidas"] else ""
+                st.markdown(f"`{reg['cuando']}` **{reg['pagina']}** "
+                            f"{reg['total_ms']:.0f} ms{aviso}")
+                for ruta in reg["dumps"]:
+                    p = Path(ruta)
+                    if p.exists():
+                        st.download_button(f"⬇️ {p.name}", data=p.read_bytes, file_name=p.name,
+                                           key=f"perfil_{p.name}", on_click="ignore")
+            if st.button("🧹 Vaciar historial de reruns"):
+                perf.limpiar()
+                st.rerun()
+
+    st.markdown("---")
+    c1, c2 = st.columns(2)
+    c1.download_button(
+        "⬇️ Exportar OpenMetrics", data=metr.openmetrics(),
+        file_name=f"prode_metricas_{datetime.datetime.now():%Y%m%d_%H%M}.txt",
+        mime="application/openmetrics-text; version=1.0.0; charset=utf-8",
+        use_container_width=True,
+    )
+    if c2.button("🧹 Reiniciar métricas", use_container_width=True):
+        metr.reiniciar()
+        st.rerun()
@@ -1,9 +1,10 @@
 """pages/vehiculos.py — Lista de vehículos, ficha, check-in de estado."""
 import streamlit as st
 from utils import query, execute, page_header, back_button, badge
-from utils_storage import subir_foto
+from utils_storage import subir_foto_y_miniaturas
+from utils_perfil import seccion
+from utils_checkins import estado_de, estado_json
 import datetime
-import json
 
 # ─────────────────────────────────────────────
 # IMÁGENES GENÉRICAS POR MARCA
@@ -76,9 +77,10 @@ def tab_checkin(veh_id: int, matricula: str):
     """, (veh_id,))
 
     if historico:
-        with st.expander(f"📂 Últimos {len(historico)} check-ins registrados"):
+        with st.expander(f"📂 Últimos {len(historico)} check-ins registrados"), \
+                seccion("historial"):
             for h in historico:
-                est = json.loads(h["estado_json"]) if h.get("estado_json") else {}
+                est = estado_de(h)
                 st.markdown(f"**{h['fecha']}** — {h.get('responsable','—')}")
                 cols = st.columns(4)
                 for i, (key, label) in enumerate(CHECKLIST_ITEMS):
@@ -122,7 +124,7 @@ def tab_checkin(veh_id: int, matricula: str):
             (vehiculo_id, fecha, responsable, estado_json, observaciones)
             VALUES (%s, %s, %s, %s, %s)
         """, (veh_id, datetime.date.today(), responsable,
-              json.dumps(estado_resultado), observaciones))
+              estado_json(estado_resultado), observaciones))
         if ok:
             st.success("✅ Check-in registrado correctamente.")
             st.rerun()
@@ -138,7 +140,7 @@ CREATE TABLE checkins_vehiculo (
   vehiculo_id     INT REFERENCES vehiculos(id),
   fecha           DATE NOT NULL DEFAULT CURRENT_DATE,
   responsable     TEXT,
-  estado_json     TEXT,
+  estado_json     JSONB,
   observaciones   TEXT,
   created_at      TIMESTAMPTZ DEFAULT NOW()
 );
@@ -193,10 +195,11 @@ def ficha_vehiculo(veh_id: int):
                                       label_visibility="collapsed")
         if foto_file:
             ext = foto_file.name.split(".")[-1]
-            url = subir_foto(foto_file, "vehiculos", f"vehiculo_{veh_id}.{ext}")
+            url, minis = subir_foto_y_miniaturas(foto_file, "vehiculos",
+                                                 f"vehiculo_{veh_id}.{ext}")
             if url:
-                ok = execute("UPDATE vehiculos SET foto_url=%s WHERE id=%s",
-                             (url, veh_id))
+                ok = execute("UPDATE vehiculos SET foto_url=%s, foto_miniaturas=%s "
+                             "WHERE id=%s", (url, minis, veh_id))
                 if ok:
                     st.success("✅ Foto actualizada.")
                     st.rerun()
@@ -219,7 +222,7 @@ def ficha_vehiculo(veh_id: int):
         "👥 Empleados asignados"
     ])
 
-    with tab_datos:
+    with tab_datos, seccion("tab_datos"):
         marcas_disp = get_marcas()
         marca_actual = marca if marca in marcas_disp else marcas_disp[0]
 
@@ -250,10 +253,10 @@ def ficha_vehiculo(veh_id: int):
             if ok:
                 st.success("Vehículo actualizado.")
 
-    with tab_checkin_t:
+    with tab_checkin_t, seccion("tab_checkin"):
         tab_checkin(veh_id, v.get("matricula",""))
 
-    with tab_empleados:
+    with tab_empleados, seccion("tab_empleados"):
         emp_rows = query("""
             SELECT DISTINCT e.id, e.nombre, e.apellidos, e.email
             FROM servicios s
@@ -421,6 +424,8 @@ def lista_vehiculos():
 # ─────────────────────────────────────────────
 def render():
     if st.session_state.get("selected_vehiculo"):
-        ficha_vehiculo(st.session_state["selected_vehiculo"])
+        with seccion("ficha"):
+            ficha_vehiculo(st.session_state["selected_vehiculo"])
     else:
-        lista_vehiculos()
+        with seccion("lista"):
+            lista_vehiculos()
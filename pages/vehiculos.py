@@ -1,9 +1,20 @@
 """pages/vehiculos.py — Lista de vehículos, ficha, check-in de estado."""
 import streamlit as st
-from utils import query, execute, page_header, back_button, badge
-from utils_storage import subir_foto
+from utils import (
+    query, execute, transaccion, page_header, back_button, badge,
+    query_page, contar, pagina_actual, controles_pagina, PAGE_SIZES,
+)
+from utils_storage import (
+    subir_foto_y_miniaturas, subir_fotos, miniatura_url, eliminar_foto_y_miniaturas,
+)
+from utils_busqueda import buscar_vehiculos, BUSQUEDA_LIMITE
+from utils_vencimientos import estados, dias_hasta, ESTADO_ICONO
+from utils_import import panel_importacion
+from utils_export import boton_exportar
+from utils_perfil import seccion
+from utils_checkins import CHECKLIST_ITEMS, ESTADO_OPTS, estado_de, estado_json
 import datetime
-import json
+import uuid
 
 # ─────────────────────────────────────────────
 # IMÁGENES GENÉRICAS POR MARCA
@@ -36,18 +47,13 @@ def get_marca_foto(marca: str) -> str:
     """Devuelve la URL de la foto genérica de la marca, o cadena vacía si no existe."""
     return MARCA_FOTOS.get(marca.lower().strip(), "")
 
-CHECKLIST_ITEMS = [
-    ("carroceria",    "🚗 Carrocería exterior"),
-    ("ruedas",        "🔧 Ruedas y neumáticos"),
-    ("luces",         "💡 Luces delanteras y traseras"),
-    ("cristales",     "🪟 Cristales y espejos"),
-    ("interior",      "💺 Interior y limpieza"),
-    ("frenos",        "🛑 Frenos"),
-    ("nivel_aceite",  "🛢️ Nivel de aceite"),
-    ("documentacion", "📄 Documentación en vehículo"),
-]
+def foto_vehiculo(v: dict, lado: int) -> str:
+    """Miniatura de `lado` px si existe; si no, la foto original o la de la marca."""
+    if v.get("foto_url"):
+        return miniatura_url(v["foto_url"], lado) if v.get("foto_miniaturas") else v["foto_url"]
+    return get_marca_foto(v.get("marca", "") or "")
 
-ESTADO_OPTS = ["✅ Correcto", "⚠️ Revisar", "❌ Defecto"]
+ORDEN_VEHICULOS = ["COALESCE(matricula, '')", "id"]
 
 
 def get_marcas():
@@ -70,22 +76,32 @@ def tab_checkin(veh_id: int, matricula: str):
 
     # Historial de check-ins anteriores
     historico = query("""
-        SELECT fecha, responsable, estado_json, observaciones
-        FROM checkins_vehiculo
-        WHERE vehiculo_id = %s
-        ORDER BY fecha DESC LIMIT 5
+        SELECT c.id, c.fecha, c.responsable, c.estado_json, c.observaciones,
+               (SELECT array_agg(f.url ORDER BY f.id) FROM checkins_fotos f
+                WHERE f.checkin_id = c.id) AS fotos,
+               (SELECT array_agg(f.miniaturas ORDER BY f.id) FROM checkins_fotos f
+                WHERE f.checkin_id = c.id) AS fotos_mini
+        FROM checkins_vehiculo c
+        WHERE c.vehiculo_id = %s
+        ORDER BY c.fecha DESC, c.id DESC LIMIT 5
     """, (veh_id,))
 
     if historico:
-        with st.expander(f"📂 Últimos {len(historico)} check-ins registrados"):
+        with st.expander(f"📂 Últimos {len(historico)} check-ins registrados"), \
+                seccion("historial"):
             for h in historico:
-                est = json.loads(h["estado_json"]) if h.get("estado_json") else {}
+                est = estado_de(h)
                 st.markdown(f"**{h['fecha']}** — {h.get('responsable','—')}")
                 cols = st.columns(4)
                 for i, (key, label) in enumerate(CHECKLIST_ITEMS):
                     cols[i % 4].markdown(f"{label}: **{est.get(key,'—')}**")
                 if h.get("observaciones"):
                     st.caption(f"💬 {h['observaciones']}")
+                if h.get("fotos"):
+                    cols_f = st.columns(min(len(h["fotos"]), 6))
+                    # Las fotos anteriores a las miniaturas se muestran tal cual
+                    for i, (url, mini) in enumerate(zip(h["fotos"], h["fotos_mini"])):
+                        cols_f[i % 6].image(miniatura_url(url, 96) if mini else url, width=96)
                 st.markdown("---")
 
     st.markdown("#### ➕ Nuevo check-in")
@@ -117,33 +133,71 @@ def tab_checkin(veh_id: int, matricula: str):
 
     if st.button("💾 Guardar check-in", key=f"save_chk_{veh_id}",
                  use_container_width=True):
-        # Intentar guardar en tabla checkins_vehiculo si existe
-        ok = execute("""
-            INSERT INTO checkins_vehiculo
-            (vehiculo_id, fecha, responsable, estado_json, observaciones)
-            VALUES (%s, %s, %s, %s, %s)
-        """, (veh_id, datetime.date.today(), responsable,
-              json.dumps(estado_resultado), observaciones))
+        # Primero las subidas (sin conexión abierta); luego check-in y fotos en
+        # una transacción corta. Si falla algo no queda nada guardado y
+        # "Guardar" se puede repetir sin duplicar el check-in.
+        lote = uuid.uuid4().hex[:12]
+        nombres = [f"checkins/{veh_id}/{lote}_{i}.jpg" for i in range(len(fotos or []))]
+        subidas = subir_fotos_checkin(fotos, nombres) if fotos else []
+        if subidas is None:
+            return
+        with transaccion() as tx:
+            checkin = tx.returning("""
+                INSERT INTO checkins_vehiculo
+                (vehiculo_id, fecha, responsable, estado_json, observaciones)
+                VALUES (%s, %s, %s, %s, %s)
+                RETURNING id
+            """, (veh_id, datetime.date.today(), responsable,
+                  estado_json(estado_resultado), observaciones))
+            if subidas:
+                tx.execute_values(
+                    "INSERT INTO checkins_fotos (checkin_id, url, nombre, miniaturas) VALUES %s",
+                    [(checkin["id"], url, nombre, True) for url, nombre in subidas])
+        if not tx.ok:
+            descartar_fotos(nombres)
+            return
+        st.success("✅ Check-in registrado correctamente.")
+        st.rerun()
+
+
+def subir_fotos_checkin(fotos, nombres: list):
+    """Sube las fotos en paralelo mostrando el progreso de cada una.
+
+    Cada foto sube con sus miniaturas. Devuelve [(url, nombre original)] o
+    None si alguna falló; en ese caso se borra todo lo que llegó a subir.
+    """
+    barra   = st.progress(0.0, text=f"Subiendo 0/{len(fotos)} fotos…")
+    estados = [st.empty() for _ in fotos]
+    for e, foto in zip(estados, fotos):
+        e.caption(f"⏳ {foto.name}")
+    hechas  = []
+
+    def al_terminar(i, ok, detalle):
+        hechas.append(i)
         if ok:
-            st.success("✅ Check-in registrado correctamente.")
-            st.rerun()
+            estados[i].caption(f"✅ {fotos[i].name}")
         else:
-            # Si la tabla no existe todavía, mostrar resumen igualmente
-            st.warning(
-                "⚠️ La tabla `checkins_vehiculo` no existe aún en Supabase. "
-                "Créala con esta SQL y vuelve a intentarlo:"
-            )
-            st.code("""
-CREATE TABLE checkins_vehiculo (
-  id              SERIAL PRIMARY KEY,
-  vehiculo_id     INT REFERENCES vehiculos(id),
-  fecha           DATE NOT NULL DEFAULT CURRENT_DATE,
-  responsable     TEXT,
-  estado_json     TEXT,
-  observaciones   TEXT,
-  created_at      TIMESTAMPTZ DEFAULT NOW()
-);
-            """, language="sql")
+            estados[i].caption(f"❌ {fotos[i].name}: {detalle}")
+        barra.progress(len(hechas) / len(fotos),
+                       text=f"Subiendo {len(hechas)}/{len(fotos)} fotos…")
+
+    resultados = subir_fotos(fotos, "vehiculos", nombres, al_terminar, miniaturas=True)
+    fallidas = sum(not ok for ok, _ in resultados)
+    if fallidas:
+        descartar_fotos(nombres)          # también las que solo subieron a medias
+        st.error(f"❌ {fallidas} foto(s) no se pudieron subir; el check-in no se ha "
+                 "guardado. Vuelve a intentarlo.")
+        return None
+    return [(url, f.name) for f, (_, url) in zip(fotos, resultados)]
+
+
+def descartar_fotos(nombres: list):
+    """Borra del almacenamiento fotos (y miniaturas) de un check-in que no se guardó."""
+    for n in nombres:
+        try:
+            eliminar_foto_y_miniaturas("vehiculos", n)
+        except Exception:
+            pass                         # queda huérfana; no impide seguir
 
 
 # ─────────────────────────────────────────────
@@ -162,21 +216,22 @@ def ficha_vehiculo(veh_id: int):
 
     hoy       = datetime.date.today()
     itv_fecha = v.get("itv_vigente_hasta")
-    seg_fecha = v.get("seguro_vigente_hasta")
-
-    if itv_fecha and itv_fecha <= hoy:
-        st.error(f"⚠️ ITV vencida el {itv_fecha}")
-    elif itv_fecha and (itv_fecha - hoy).days <= 30:
-        st.warning(f"⚠️ ITV vence en {(itv_fecha - hoy).days} días ({itv_fecha})")
-    if seg_fecha and seg_fecha <= hoy:
-        st.error(f"⚠️ Seguro vencido el {seg_fecha}")
-    elif seg_fecha and (seg_fecha - hoy).days <= 30:
-        st.warning(f"⚠️ Seguro vence en {(seg_fecha - hoy).days} días ({seg_fecha})")
+    venc      = estados([veh_id]).get(veh_id, {})
+
+    if venc.get("itv_estado") == "vencido":
+        st.error(f"⚠️ ITV vencida el {venc['itv_hasta']}")
+    elif venc.get("itv_estado") == "proximo":
+        st.warning(f"⚠️ ITV vence en {dias_hasta(venc['itv_hasta'])} días ({venc['itv_hasta']})")
+    if venc.get("seguro_estado") == "vencido":
+        st.error(f"⚠️ Seguro vencido el {venc['seguro_hasta']}")
+    elif venc.get("seguro_estado") == "proximo":
+        st.warning(f"⚠️ Seguro vence en {dias_hasta(venc['seguro_hasta'])} días "
+                   f"({venc['seguro_hasta']})")
 
     marca      = v.get("marca", "")
     emoji      = get_emoji(marca)
     tipo_color = "orange" if str(v.get("tipo","")).lower() == "renting" else "blue"
-    foto_url      = v.get("foto_url", "") or get_marca_foto(marca)
+    foto_url   = foto_vehiculo(v, 256)
 
     col_img, col_info = st.columns([0.18, 0.82])
     with col_img:
@@ -194,13 +249,18 @@ def ficha_vehiculo(veh_id: int):
                                       label_visibility="collapsed")
         if foto_file:
             ext = foto_file.name.split(".")[-1]
-            url = subir_foto(foto_file, "vehiculos", f"vehiculo_{veh_id}.{ext}")
+            url, minis = subir_foto_y_miniaturas(foto_file, "vehiculos",
+                                                 f"vehiculo_{veh_id}.{ext}")
             if url:
-                ok = execute("UPDATE vehiculos SET foto_url=%s WHERE id=%s",
-                             (url, veh_id))
-                if ok:
+                with transaccion() as tx:
+                    if tx.execute("UPDATE vehiculos SET foto_url=%s, foto_miniaturas=%s "
+                                  "WHERE id=%s", (url, minis, veh_id)) != 1:
+                        tx.cancelar("vehículo no encontrado")
+                if tx.ok:
                     st.success("✅ Foto actualizada.")
                     st.rerun()
+                elif tx.cancelada:
+                    st.error(f"No se pudo actualizar la foto: {tx.error or 'cambio descartado'}")
     with col_info:
         st.markdown(f"""
         <h2 style="margin:0;color:#1B3A6B;font-weight:800;">
@@ -220,7 +280,7 @@ def ficha_vehiculo(veh_id: int):
         "👥 Empleados asignados"
     ])
 
-    with tab_datos:
+    with tab_datos, seccion("tab_datos"):
         marcas_disp = get_marcas()
         marca_actual = marca if marca in marcas_disp else marcas_disp[0]
 
@@ -251,10 +311,10 @@ def ficha_vehiculo(veh_id: int):
             if ok:
                 st.success("Vehículo actualizado.")
 
-    with tab_checkin_t:
+    with tab_checkin_t, seccion("tab_checkin"):
         tab_checkin(veh_id, v.get("matricula",""))
 
-    with tab_empleados:
+    with tab_empleados, seccion("tab_empleados"):
         emp_rows = query("""
             SELECT DISTINCT e.id, e.nombre, e.apellidos, e.email
             FROM servicios s
@@ -285,13 +345,16 @@ def lista_vehiculos():
     page_header("🚛", "Vehículos")
     hoy = datetime.date.today()
 
-    col_s, col_t, col_btn, col_marca = st.columns([2, 1, 1, 1])
+    col_s, col_t, col_size, col_btn, col_marca = st.columns([2, 1, 0.6, 1, 1])
     with col_s:
         buscar = st.text_input("🔍 Buscar", label_visibility="collapsed",
                                placeholder="Matrícula, marca, modelo…")
     with col_t:
         filtro_tipo = st.selectbox("Tipo", ["Todos","Renting","Propiedad"],
                                    label_visibility="collapsed")
+    with col_size:
+        page_size = st.selectbox("Por página", PAGE_SIZES, index=1,
+                                 label_visibility="collapsed", key="veh_page_size")
     with col_btn:
         if st.button("➕ Nuevo vehículo", use_container_width=True):
             st.session_state["nuevo_vehiculo"] = not st.session_state.get("nuevo_vehiculo", False)
@@ -353,75 +416,86 @@ def lista_vehiculos():
                             st.success(f"Vehículo {n_mat} creado correctamente.")
                             st.session_state["nuevo_vehiculo"] = False
                             st.rerun()
+    panel_importacion("vehiculos")
 
     # ── Filtros BD ──
     where, params = [], []
-    if buscar:
-        where.append("(matricula ILIKE %s OR marca ILIKE %s OR modelo ILIKE %s)")
-        params += [f"%{buscar}%"] * 3
     if filtro_tipo == "Renting":
         where.append("tipo = 'renting'")
     elif filtro_tipo == "Propiedad":
         where.append("tipo = 'propiedad'")
 
-    sql = "SELECT * FROM vehiculos"
-    if where:
-        sql += " WHERE " + " AND ".join(where)
-    sql += " ORDER BY matricula"
+    with st.expander("📤 Exportar"):
+        boton_exportar("vehiculos", where, params)
+        boton_exportar("checkins", etiqueta="⬇️ Exportar historial de check-ins")
 
-    vehiculos = query(sql, params or None)
-    st.markdown(f"**{len(vehiculos)} vehículo(s)**")
+    after = pagina_actual("vehiculos", (buscar, filtro_tipo, page_size))
+    if buscar:
+        vehiculos, siguiente = buscar_vehiculos(buscar, where, params), None
+        st.markdown(f"**{len(vehiculos)} resultado(s)**"
+                    + (f" · mostrando los {BUSQUEDA_LIMITE} más relevantes"
+                       if len(vehiculos) >= BUSQUEDA_LIMITE else ""))
+    else:
+        vehiculos, siguiente = query_page("vehiculos", ORDEN_VEHICULOS, where, params,
+                                          after=after, limit=page_size, ttl=300)
+        st.markdown(f"**{contar('vehiculos', where, params, ttl=300)} vehículo(s)**")
     st.markdown("---")
 
-    for v in vehiculos:
-        itv_v    = v.get("itv_vigente_hasta")
-        marca    = v.get("marca","")
-        emoji    = get_emoji(marca)
-        foto_url = v.get("foto_url","") or get_marca_foto(marca)
-
-        if itv_v and itv_v <= hoy:
-            alerta = "🔴"
-        elif itv_v and (itv_v - hoy).days <= 30:
-            alerta = "🟡"
-        else:
-            alerta = "🟢"
-
-        tipo_b = badge(v.get("tipo","—"),
-                       "orange" if v.get("tipo") == "renting" else "blue")
-
-        if foto_url:
-            avatar_veh = f'<img src="{foto_url}" style="width:48px;height:48px;border-radius:8px;object-fit:cover;flex-shrink:0;">'
-        else:
-            avatar_veh = f'<div class="row-avatar" style="background:rgba(27,58,107,0.08);color:#1B3A6B;font-size:1.6rem;width:48px;height:48px;">{emoji}</div>'
-
-        col_main, col_act = st.columns([5, 0.8])
-        with col_main:
-            st.markdown(f"""
-            <div class="row-card">
-                {avatar_veh}
-                <div>
-                    <div class="row-name">
-                        {v.get('matricula','—')} &nbsp; {tipo_b}
-                    </div>
-                    <div class="row-sub">
-                        {marca} {v.get('modelo','—')}
-                        &nbsp;|&nbsp; ITV: {alerta} {itv_v or '—'}
-                        &nbsp;|&nbsp; Bastidor: {v.get('bastidor','—')}
+    with seccion("filas"):
+        venc = estados(v["id"] for v in vehiculos)
+        for v in vehiculos:
+            itv_v    = v.get("itv_vigente_hasta")
+            marca    = v.get("marca","")
+            emoji    = get_emoji(marca)
+            foto_url = foto_vehiculo(v, 96)
+            alerta   = ESTADO_ICONO.get(venc.get(v["id"], {}).get("itv_estado"), "🟢")
+
+            tipo_b = badge(v.get("tipo","—"),
+                           "orange" if v.get("tipo") == "renting" else "blue")
+
+            if foto_url:
+                avatar_veh = f'<img src="{foto_url}" style="width:48px;height:48px;border-radius:8px;object-fit:cover;flex-shrink:0;">'
+            else:
+                avatar_veh = f'<div class="row-avatar" style="background:rgba(27,58,107,0.08);color:#1B3A6B;font-size:1.6rem;width:48px;height:48px;">{emoji}</div>'
+
+            col_main, col_act = st.columns([5, 0.8])
+            with col_main:
+                st.markdown(f"""
+                <div class="row-card">
+                    {avatar_veh}
+                    <div>
+                        <div class="row-name">
+                            {v.get('matricula','—')} &nbsp; {tipo_b}
+                        </div>
+                        <div class="row-sub">
+                            {marca} {v.get('modelo','—')}
+                            &nbsp;|&nbsp; ITV: {alerta} {itv_v or '—'}
+                            &nbsp;|&nbsp; Bastidor: {v.get('bastidor','—')}
+                        </div>
                     </div>
                 </div>
-            </div>
-            """, unsafe_allow_html=True)
-        with col_act:
-            if st.button("Ver →", key=f"veh_{v['id']}"):
-                st.session_state["selected_vehiculo"] = v["id"]
-                st.rerun()
+                """, unsafe_allow_html=True)
+            with col_act:
+                if st.button("Ver →", key=f"veh_{v['id']}"):
+                    st.session_state["selected_vehiculo"] = v["id"]
+                    st.rerun()
+
+    controles_pagina("vehiculos", siguiente)
 
 
 # ─────────────────────────────────────────────
 # ENTRY POINT
 # ─────────────────────────────────────────────
+def precargar():
+    """Deja en caché la primera página de la lista (ver utils_arranque)."""
+    query_page("vehiculos", ORDEN_VEHICULOS, [], [], limit=PAGE_SIZES[1], ttl=300)
+    contar("vehiculos", [], [], ttl=300)
+
+
 def render():
     if st.session_state.get("selected_vehiculo"):
-        ficha_vehiculo(st.session_state["selected_vehiculo"])
+        with seccion("ficha"):
+            ficha_vehiculo(st.session_state["selected_vehiculo"])
     else:
-        lista_vehiculos()
+        with seccion("lista"):
+            lista_vehiculos()
@@ -0,0 +1,5 @@
+"""Configuración común de pytest: los módulos de la app se importan desde la raíz."""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,154 @@
+"""utils_ausencias: el índice en memoria frente a un recorrido fila a fila."""
+import datetime
+import random
+
+import numpy as np
+
+from utils_ausencias import IndiceAusencias
+
+HOY = datetime.date(2024, 6, 15)
+
+
+def indice(filas: list) -> IndiceAusencias:
+    ind = IndiceAusencias()
+    ind._publicar({r["id"]: r for r in filas}, 0)
+    return ind
+
+
+def ausencia(id_, empleado, ini, fin, tipo="Vacaciones"):
+    return {"id": id_, "empleado_id": empleado, "tipo": tipo, "fecha_inicio": ini,
+            "fecha_fin": fin, "observaciones": None}
+
+
+def solapa(r, desde, hasta):
+    """Misma regla que periodo_ausencia: sin fin, abierta; fin < inicio, un día."""
+    fin = r["fecha_fin"]
+    fin = datetime.date.max if fin is None else max(fin, r["fecha_inicio"])
+    return r["fecha_inicio"] <= hasta and fin >= desde
+
+
+def test_abiertas_cuentan():
+    ind = indice([
+        ausencia(1, 10, HOY - datetime.timedelta(days=400), None, "Baja médica"),
+        ausencia(2, 11, HOY - datetime.timedelta(days=3), HOY + datetime.timedelta(days=2)),
+        ausencia(3, 12, HOY - datetime.timedelta(days=20), HOY - datetime.timedelta(days=10)),
+    ])
+    assert ind.contar(HOY) == 2
+    assert ind.ausentes(HOY) == {10, 11}
+    assert ind.contar(HOY, tipo="Baja médica") == 1
+    assert ind.estado()["max_dias"] == 10
+    assert ind.estado()["abiertas"] == 1
+    assert ind.matriz([10, 12], HOY, HOY + datetime.timedelta(days=4)).tolist() == \
+        [[True] * 5, [False] * 5]
+
+
+def test_fin_anterior_al_inicio_es_un_dia():
+    ind = indice([ausencia(1, 10, HOY, HOY - datetime.timedelta(days=5))])
+    assert ind.contar(HOY) == 1
+    assert ind.contar(HOY + datetime.timedelta(days=1)) == 0
+
+
+def test_igual_que_recorrido():
+    rnd = random.Random(13)
+    filas = []
+    for i in range(1, 400):
+        ini = HOY + datetime.timedelta(days=rnd.randint(-300, 300))
+        fin = None if rnd.random() < 0.1 else ini + datetime.timedelta(days=rnd.randint(-2, 40))
+        filas.append(ausencia(i, rnd.randint(1, 30), ini, fin,
+                              rnd.choice(["Vacaciones", "Baja médica"])))
+    ind = indice(filas)
+    for _ in range(200):
+        desde = HOY + datetime.timedelta(days=rnd.randint(-320, 320))
+        hasta = desde + datetime.timedelta(days=rnd.randint(0, 30))
+        esperadas = {r["id"] for r in filas if solapa(r, desde, hasta)}
+        assert {r["id"] for r in ind.registros(desde, hasta)} == esperadas
+        assert ind.contar(desde, hasta, tipo="Baja médica") == \
+            sum(1 for r in filas if r["id"] in esperadas and r["tipo"] == "Baja médica")
+    empleados = list(range(1, 31))
+    desde, hasta = HOY - datetime.timedelta(days=10), HOY + datetime.timedelta(days=10)
+    m = ind.matriz(empleados, desde, hasta)
+    for fila, e in zip(m, empleados):
+        for j, ok in enumerate(fila):
+            dia = desde + datetime.timedelta(days=j)
+            assert ok == any(r["empleado_id"] == e and solapa(r, dia, dia) for r in filas)
+    assert np.asarray(m).dtype == bool
+
+
+class BD:
+    """Imita ausencias + ausencias_cambios con transacciones que confirman en
+    otro orden que el de sus ids."""
+
+    def __init__(self):
+        self.filas, self.cambios = {}, []       # solo lo confirmado
+        self.en_curso, self.siguiente_id, self.siguiente_xid = {}, 1, 100
+
+    def empezar(self) -> int:
+        xid, self.siguiente_xid = self.siguiente_xid, self.siguiente_xid + 1
+        self.en_curso[xid] = ([], {})
+        return xid
+
+    def escribir(self, xid: int, fila: dict):
+        cambios, filas = self.en_curso[xid]
+        cambios.append((self.siguiente_id, fila["id"], xid))
+        self.siguiente_id += 1
+        filas[fila["id"]] = fila
+
+    def borrar(self, xid: int, id_: int):
+        cambios, filas = self.en_curso[xid]
+        cambios.append((self.siguiente_id, id_, xid))
+        self.siguiente_id += 1
+        filas[id_] = None
+
+    def confirmar(self, xid: int):
+        cambios, filas = self.en_curso.pop(xid)
+        self.cambios += cambios
+        for id_, fila in filas.items():
+            if fila is None:
+                self.filas.pop(id_, None)
+            else:
+                self.filas[id_] = fila
+
+    def query(self, sql, params=None, ttl=None):
+        import utils_ausencias as ua
+        if sql is ua.SQL_MARCA:
+            ids = [c[0] for c in self.cambios]
+            return [{"primero": min(ids, default=0), "ultimo": max(ids, default=0),
+                     "horizonte": str(min(self.en_curso, default=self.siguiente_xid))}]
+        if sql is ua.SQL_CARGA:
+            return [dict(r) for r in self.filas.values()]
+        if sql is ua.SQL_CAMBIOS:
+            desde, ultimos = int(params[0]), {}
+            for id_, aus, xid in self.cambios:
+                if xid >= desde:
+                    ultimos[aus] = max(ultimos.get(aus, 0), id_)
+            return [dict(self.filas.get(a) or dict.fromkeys(["id"]), ausencia_id=a, ultimo=u)
+                    for a, u in ultimos.items()]
+        raise AssertionError(sql)
+
+
+def test_carga_larga_confirmada_despues(monkeypatch):
+    import utils_ausencias as ua
+    bd = BD()
+    monkeypatch.setattr(ua, "query", bd.query)
+    ind = IndiceAusencias()
+    ind.refrescar(forzar=True)
+
+    larga = bd.empezar()                          # COPY: ids 1..50, sin confirmar
+    for i in range(1, 51):
+        bd.escribir(larga, ausencia(i, i, HOY, HOY))
+    corta = bd.empezar()                          # alta suelta: id 51, confirma antes
+    bd.escribir(corta, ausencia(1000, 1000, HOY, HOY))
+    bd.confirmar(corta)
+
+    ind.refrescar(version=1)
+    assert ind.contar(HOY) == 1 and ind.estado()["cambio"] == 51
+
+    bd.confirmar(larga)
+    ind.refrescar(version=2)
+    assert ind.contar(HOY) == 51                 # los ids 1..50 no se han saltado
+
+    borrado = bd.empezar()
+    bd.borrar(borrado, 1000)
+    bd.confirmar(borrado)
+    ind.refrescar(version=3)
+    assert ind.contar(HOY) == 50
@@ -0,0 +1,68 @@
+"""utils_auth: bloqueo por (usuario, cliente) y limpieza del registro de fallos."""
+import pytest
+
+import utils_auth
+from utils_auth import DirectorioUsuarios, hash_password, MAX_FALLOS
+
+
+class Reloj:
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self):
+        return self.t
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    r = Reloj()
+    monkeypatch.setattr(utils_auth.time, "monotonic", r)
+    return r
+
+
+@pytest.fixture
+def directorio(tmp_path):
+    ruta = tmp_path / "usuarios.csv"
+    ruta.write_text(f"username,password,rol\nadmin,{hash_password('bien', 1000)},admin\n")
+    return DirectorioUsuarios(ruta, iteraciones=1000)
+
+
+def test_bloqueo_solo_para_el_cliente_que_falla(directorio, reloj):
+    for _ in range(MAX_FALLOS):
+        assert directorio.verificar("admin", "mal", "10.0.0.9") == (False, None)
+    assert directorio.segundos_bloqueo("admin", "10.0.0.9") == utils_auth.BLOQUEO_SEG
+    # Bloqueado incluso con la contraseña buena desde ese cliente…
+    assert directorio.verificar("admin", "bien", "10.0.0.9") == (False, None)
+    # …pero el titular entra desde el suyo
+    assert directorio.segundos_bloqueo("admin", "10.0.0.1") == 0
+    assert directorio.verificar("admin", "bien", "10.0.0.1") == (True, "admin")
+
+    reloj.t += utils_auth.BLOQUEO_SEG
+    assert directorio.verificar("admin", "bien", "10.0.0.9") == (True, "admin")
+    assert directorio._fallos == {}
+
+
+def test_fallos_olvidados_se_purgan(directorio, reloj):
+    directorio.verificar("admin", "mal", "a")
+    directorio.verificar("nadie", "x", "b")
+    reloj.t += utils_auth.OLVIDO_SEG + 1
+    directorio.verificar("admin", "mal", "c")
+    assert list(directorio._fallos) == [("admin", "c")]
+
+
+def test_tope_de_claves(directorio, reloj, monkeypatch):
+    monkeypatch.setattr(utils_auth, "MAX_CLAVES", 3)
+    for i in range(10):
+        reloj.t += 1
+        directorio.verificar(f"u{i}", "x", "c")
+    assert list(directorio._fallos) == [("u7", "c"), ("u8", "c"), ("u9", "c")]
+
+
+def test_reincidente_pasa_al_final(directorio, reloj, monkeypatch):
+    monkeypatch.setattr(utils_auth, "MAX_CLAVES", 2)
+    directorio.verificar("u1", "x", "c")
+    directorio.verificar("u2", "x", "c")
+    directorio.verificar("u1", "x", "c")
+    directorio.verificar("u3", "x", "c")        # sale u2, el fallo más antiguo
+    assert list(directorio._fallos) == [("u1", "c"), ("u3", "c")]
+    assert directorio._fallos[("u1", "c")][0] == 2
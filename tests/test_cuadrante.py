@@ -0,0 +1,154 @@
+"""utils_cuadrante: expansión de servicios, sustituciones y estado del vehículo."""
+import datetime
+import time
+
+import numpy as np
+
+from utils_cuadrante import mascara_dias, resolver, DIAS_DEFECTO
+
+LUNES = datetime.date(2024, 6, 17)
+T = datetime.time
+
+
+def servicio(id_, base, ini=T(8), fin=T(12), dias="todos", vehiculo=None):
+    return {"id": id_, "codigo": f"S{id_}", "descripcion": "", "horario_inicio": ini,
+            "horario_fin": fin, "dias_servicio": dias, "empleado_base_id": base,
+            "vehiculo_base_id": vehiculo}
+
+
+def empleados(*ids, inactivos=()):
+    return [{"id": i, "activo": i not in inactivos} for i in ids]
+
+
+def ausencias(faltas: dict):
+    """Sustituto de IndiceAusencias.matriz: {empleado: {días desde `desde`}}."""
+    def matriz(ids, desde, hasta):
+        m = np.zeros((len(ids), (hasta - desde).days + 1), bool)
+        for fila, e in enumerate(ids):
+            for d in faltas.get(e, ()):
+                m[fila, d] = True
+        return m
+    return matriz
+
+
+def turno(res, servicio_id, fecha=LUNES):
+    return next(t for t in res["turnos"]
+                if t["servicio_id"] == servicio_id and t["fecha"] == fecha)
+
+
+def test_mascara_dias():
+    assert mascara_dias("L-V") == 0b0011111
+    assert mascara_dias("L,X,V") == 0b0010101
+    assert mascara_dias("Lunes a viernes") == 0b0011111
+    assert mascara_dias("Sábado y domingo") == 0b1100000
+    assert mascara_dias("V-L") == 0b1110001              # cruza el fin de semana
+    assert mascara_dias("todos") == 0b1111111
+    assert mascara_dias("") == mascara_dias(None) == mascara_dias("???") == DIAS_DEFECTO
+
+
+def test_dias_de_servicio():
+    res = resolver([servicio(1, 10, dias="L,X,V")], empleados(10), [], ausencias({}),
+                   LUNES, LUNES + datetime.timedelta(days=6))
+    assert [t["fecha"].weekday() for t in res["turnos"]] == [0, 2, 4]
+    assert all(t["empleado_id"] == 10 and t["motivo"] is None for t in res["turnos"])
+
+
+def test_ausencia_solo_el_dia_que_falta():
+    res = resolver([servicio(1, 10)], empleados(10, 11), [], ausencias({10: {1}}),
+                   LUNES, LUNES + datetime.timedelta(days=2))
+    quien = [(t["empleado_id"], t["motivo"]) for t in res["turnos"]]
+    assert quien == [(10, None), (11, "ausencia"), (10, None)]
+    assert res["sustituciones"] == 1 and res["sin_cubrir"] == 0
+
+
+def test_sustituto_no_puede_estar_ausente_ni_inactivo():
+    res = resolver([servicio(1, 10)], empleados(10, 11, 12, inactivos={12}), [],
+                   ausencias({10: {0}, 11: {0}}), LUNES, LUNES)
+    t = turno(res, 1)
+    assert t["empleado_id"] is None and t["motivo"] == "ausencia"
+    assert res["sin_cubrir"] == 1
+
+
+def test_rechaza_solapes():
+    srv = [servicio(1, 10, T(9), T(13)),
+           servicio(2, 11, T(8), T(16)),     # solapa con el 1: 11 no vale
+           servicio(3, 12, T(14), T(18))]    # no solapa: 12 sí
+    res = resolver(srv, empleados(10, 11, 12), [], ausencias({10: {0}}), LUNES, LUNES)
+    assert turno(res, 1)["empleado_id"] == 12
+    assert turno(res, 2)["empleado_id"] == 11
+
+
+def test_turno_nocturno_solapa_con_la_manana():
+    srv = [servicio(1, 10, T(5), T(7)),
+           servicio(2, 11, T(22), T(6))]     # cruza la medianoche
+    res = resolver(srv, empleados(10, 11), [], ausencias({10: {0}}), LUNES, LUNES)
+    assert turno(res, 1)["empleado_id"] is None
+
+
+def test_elige_el_menos_cargado():
+    srv = [servicio(1, 10, T(6), T(8)),
+           servicio(2, 11, T(10), T(12)),
+           servicio(3, 12, T(14), T(16))]
+    res = resolver(srv, empleados(10, 11, 12, 13), [], ausencias({10: {0, 1}}),
+                   LUNES, LUNES + datetime.timedelta(days=1))
+    # 13 no tiene turnos; los dos días le toca a él aunque 11 y 12 están libres a esa hora
+    assert turno(res, 1)["empleado_id"] == 13
+    assert turno(res, 1, LUNES + datetime.timedelta(days=1))["empleado_id"] == 13
+
+
+def test_reparte_entre_los_menos_cargados():
+    srv = [servicio(1, 10, T(6), T(8)), servicio(2, 10, T(9), T(11)),
+           servicio(3, 10, T(12), T(14))]
+    res = resolver(srv, empleados(10, 11, 12, 13), [], ausencias({10: {0}}), LUNES, LUNES)
+    assert sorted(turno(res, s)["empleado_id"] for s in (1, 2, 3)) == [11, 12, 13]
+
+
+def test_motivos_sin_base_e_inactivo():
+    srv = [servicio(1, None), servicio(2, 10, T(13), T(15))]
+    res = resolver(srv, empleados(10, 11, inactivos={10}), [], ausencias({}), LUNES, LUNES)
+    assert turno(res, 1)["motivo"] == "sin conductor base"
+    assert turno(res, 2)["motivo"] == "conductor inactivo"
+    assert {turno(res, s)["empleado_id"] for s in (1, 2)} == {11}
+
+
+def test_estado_vehiculo():
+    ayer = LUNES - datetime.timedelta(days=1)
+    vehiculos = [{"id": 1, "itv_vigente_hasta": None, "seguro_vigente_hasta": None},
+                 {"id": 2, "itv_vigente_hasta": ayer, "seguro_vigente_hasta": None},
+                 {"id": 3, "itv_vigente_hasta": LUNES, "seguro_vigente_hasta": ayer}]
+    srv = [servicio(i, 10 + i, vehiculo=v) for i, v in enumerate([1, 2, 3, None], 1)]
+    res = resolver(srv, empleados(11, 12, 13, 14), vehiculos, ausencias({}), LUNES, LUNES)
+    assert [turno(res, i)["vehiculo_estado"] for i in (1, 2, 3, 4)] == \
+        ["ok", "ITV caducada", "seguro caducado", "sin vehículo"]
+
+
+def test_rango_vacio():
+    assert resolver([servicio(1, 10)], empleados(10), [], ausencias({}),
+                    LUNES, LUNES - datetime.timedelta(days=1))["turnos"] == []
+
+
+def test_mes_de_la_flota_de_ejemplo():
+    """120 servicios, 300 empleados y un 10 % de ausencias durante 31 días."""
+    rng = np.random.default_rng(0)
+    dias = ["L-V", "todos", "L,X,V", ""]
+    srv = [servicio(s, 2 * s, T(6 + s % 8), T(14 + s % 8), dias[s % 4], s)
+           for s in range(1, 121)]
+    emp = empleados(*range(1, 301), inactivos=set(range(20, 301, 20)))
+
+    def faltas(ids, desde, hasta):
+        return rng.random((len(ids), (hasta - desde).days + 1)) < 0.1
+
+    desde = datetime.date(2024, 3, 1)
+    t0 = time.perf_counter()
+    res = resolver(srv, emp, [], faltas, desde, datetime.date(2024, 3, 31))
+    seg = time.perf_counter() - t0
+
+    assert res["sin_cubrir"] == 0 and res["sustituciones"] > 0
+    # Nadie conduce dos turnos solapados el mismo día
+    por_dia = {}
+    for t in res["turnos"]:
+        por_dia.setdefault((t["fecha"], t["empleado_id"]), []).append(t)
+    for ts in por_dia.values():
+        ts.sort(key=lambda t: t["horario_inicio"])
+        assert all(a["horario_fin"] <= b["horario_inicio"] for a, b in zip(ts, ts[1:]))
+    assert seg < 1.0          # ~20 ms en una máquina de desarrollo
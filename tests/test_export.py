@@ -0,0 +1,63 @@
+"""utils_export: la descarga diferida de st.download_button recibe la exportación."""
+import datetime
+import gzip
+import io
+
+import pytest
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+
+import utils_export
+
+FILAS = [
+    (1, "Ana Pérez", "12345678Z", "Vacaciones", datetime.date(2024, 8, 1),
+     datetime.date(2024, 8, 15), 15, None),
+    (2, "Luis Gómez", "87654321X", "Baja", datetime.date(2024, 9, 2), None, None, "sin alta"),
+]
+
+
+@pytest.fixture
+def filas(monkeypatch):
+    consultas = []
+
+    def query_stream(sql, params=None, filas="dict"):
+        consultas.append((sql, params, filas))
+        yield from FILAS
+
+    monkeypatch.setattr(utils_export, "query_stream", query_stream)
+    return consultas
+
+
+def descarga_diferida(ext: str) -> bytes:
+    """Registra `exportar` como lo hace boton_exportar y lo ejecuta como un clic."""
+    almacen = MediaFileManager(MemoryMediaFileStorage("/media"))
+    mime = dict(utils_export.FORMATOS.values())[ext]
+    fid = almacen.add_deferred(lambda: utils_export.exportar("ausencias", ext), mime,
+                               "coordenadas", file_name=f"ausencias.{ext}")
+    url = almacen.execute_deferred(fid)
+    return almacen._storage.get_file(url.rsplit("/", 1)[-1]).content
+
+
+def test_csv_gz(filas):
+    texto = gzip.decompress(descarga_diferida("csv.gz")).decode("utf-8-sig")
+    lineas = texto.splitlines()
+    assert lineas[0].split(";") == utils_export.EXPORTACIONES["ausencias"][2]
+    assert lineas[1].startswith("1;Ana Pérez;12345678Z;Vacaciones;2024-08-01;2024-08-15;15")
+    assert len(lineas) == 3
+    assert filas[0][2] == "tupla"
+
+
+def test_xlsx(filas):
+    from openpyxl import load_workbook
+    ws = load_workbook(io.BytesIO(descarga_diferida("xlsx"))).active
+    valores = list(ws.values)
+    assert list(valores[0]) == utils_export.EXPORTACIONES["ausencias"][2]
+    assert valores[2][1] == "Luis Gómez" and valores[2][5] is None
+    assert len(valores) == 3
+
+
+def test_filtro(filas):
+    utils_export.exportar("ausencias", "csv.gz", ["a.tipo = %s"], ["Baja"])
+    sql, params, _ = filas[0]
+    assert "WHERE a.tipo = %s ORDER BY" in sql
+    assert params == ("Baja",)
@@ -0,0 +1,83 @@
+"""utils_pdf: lotes en vuelo acotados y fotos locales de respaldo."""
+import io
+
+from PIL import Image
+from pypdf import PdfReader
+
+import utils_pdf
+
+
+def empleados(n: int, leidos: list):
+    for i in range(1, n + 1):
+        leidos.append(i)
+        yield {"id": i, "nombre": f"Nombre{i}", "apellidos": "Prueba", "dni": None,
+               "email": None, "telefono": None, "activo": True,
+               "foto_url": None, "foto_miniaturas": False}
+
+
+def test_ventana_acotada(monkeypatch):
+    leidos, adelanto = [], []
+    dibujar = utils_pdf._dibujar_lote
+
+    def dibujar_y_medir(fichas):
+        # Fichas leídas del iterable por delante de la que se está dibujando
+        adelanto.append(len(leidos) - int(fichas[-1][1][0][1]))
+        return dibujar(fichas)
+
+    monkeypatch.setattr(utils_pdf, "_dibujar_lote", dibujar_y_medir)
+    buffer = io.BytesIO()
+    n = utils_pdf.generar_pdf_empleados(empleados(200, leidos), salida=buffer,
+                                        procesos=1, lote=10)
+    assert n == 200 and len(PdfReader(buffer).pages) == 200
+    assert max(adelanto) <= 10                # en serie, solo el lote siguiente
+
+
+def test_procesos_en_orden():
+    leidos, buffer = [], io.BytesIO()
+    n = utils_pdf.generar_pdf_empleados(empleados(45, leidos), salida=buffer,
+                                        procesos=2, lote=5)
+    paginas = PdfReader(buffer).pages
+    assert n == 45
+    assert "Nombre1 " in paginas[0].extract_text() + " "
+    assert "Nombre45" in paginas[-1].extract_text()
+
+
+def test_ventana_con_procesos(monkeypatch):
+    """Con 2 procesos nunca hay más de 4 lotes enviados sin recoger."""
+    enviados, recogidos, pico = [0], [0], [0]
+
+    class Futuro:
+        def __init__(self, lote):
+            self.lote = lote
+
+        def result(self):
+            recogidos[0] += 1
+            return utils_pdf._dibujar_lote(self.lote)
+
+    class Pool:
+        def __init__(self, *a, **k):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *a):
+            return False
+
+        def submit(self, fn, lote):
+            enviados[0] += 1
+            pico[0] = max(pico[0], enviados[0] - recogidos[0])
+            return Futuro(lote)
+
+    monkeypatch.setattr(utils_pdf, "ProcessPoolExecutor", Pool)
+    buffer = io.BytesIO()
+    utils_pdf.generar_pdf_empleados(empleados(100, []), salida=buffer, procesos=2, lote=5)
+    assert enviados[0] == 20 and pico[0] == 4
+
+
+def test_foto_local(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils_pdf, "FOTOS_CACHE", tmp_path / "cache")
+    Image.new("RGB", (640, 480), "red").save(tmp_path / "1.jpg")
+    ficha = utils_pdf._ficha(next(empleados(1, [])), tmp_path)
+    assert ficha[2] == str(tmp_path / "1.jpg")
+    assert utils_pdf._foto_reducida(ficha[2]).startswith(str(tmp_path / "cache"))
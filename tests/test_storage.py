@@ -0,0 +1,235 @@
+"""utils_storage: subida en paralelo, reintentos y preparación de imágenes."""
+import io
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import utils_storage
+
+
+@pytest.fixture
+def secretos(monkeypatch):
+    """Secrets de prueba sin tocar .streamlit/secrets.toml."""
+    valores = {"SUPABASE_URL": "http://storage.local", "SUPABASE_KEY": "clave"}
+    monkeypatch.setattr(utils_storage, "st", SimpleNamespace(secrets=valores))
+    monkeypatch.setattr(utils_storage, "get_session", lambda: None)
+    return valores
+
+
+def test_lote_tarda_lo_que_la_mas_lenta(secretos, monkeypatch):
+    espera, activas, pico = 0.3, [0], [0]
+    lock = threading.Lock()
+
+    def subida_lenta(session, url_base, headers, archivo, bucket, nombre):
+        with lock:
+            activas[0] += 1
+            pico[0] = max(pico[0], activas[0])
+        time.sleep(espera)
+        with lock:
+            activas[0] -= 1
+        return True, f"{url_base}/{bucket}/{nombre}"
+
+    monkeypatch.setattr(utils_storage, "_subir_foto", subida_lenta)
+    avisos = []
+    t0 = time.perf_counter()
+    res = utils_storage.subir_fotos([io.BytesIO(b"x") for _ in range(12)], "vehiculos",
+                                    [f"f{i}.jpg" for i in range(12)],
+                                    lambda i, ok, d: avisos.append(i))
+    seg = time.perf_counter() - t0
+    assert pico[0] == 12
+    assert seg < espera * 2                # una sola ronda, no 12 / hilos
+    assert sorted(avisos) == list(range(12))
+    assert res == [(True, f"http://storage.local/vehiculos/f{i}.jpg") for i in range(12)]
+
+
+def test_tope_configurable(secretos, monkeypatch):
+    secretos["SUBIDAS_PARALELAS"] = 3
+    activas, pico = [0], [0]
+    lock = threading.Lock()
+
+    def subida(session, url_base, headers, archivo, bucket, nombre):
+        with lock:
+            activas[0] += 1
+            pico[0] = max(pico[0], activas[0])
+        time.sleep(0.05)
+        with lock:
+            activas[0] -= 1
+        return True, nombre
+
+    monkeypatch.setattr(utils_storage, "_subir_foto", subida)
+    utils_storage.subir_fotos([io.BytesIO() for _ in range(8)], "b", [str(i) for i in range(8)])
+    assert pico[0] == 3
+
+
+def test_error_en_hilo_no_corta_el_lote(secretos, monkeypatch):
+    def subida(session, url_base, headers, archivo, bucket, nombre):
+        if nombre == "1":
+            raise RuntimeError("sin red")
+        return True, nombre
+
+    monkeypatch.setattr(utils_storage, "_subir_foto", subida)
+    res = utils_storage.subir_fotos([io.BytesIO() for _ in range(3)], "b", ["0", "1", "2"])
+    assert res == [(True, "0"), (False, "sin red"), (True, "2")]
+
+
+# ── Reintentos contra un Storage local ──
+class Storage:
+    """Servidor HTTP que imita POST /storage/v1/object/… respondiendo `codigos` en orden."""
+
+    def __init__(self, codigos):
+        import http.server
+        self.codigos, self.recibidos, self.borrados = list(codigos), [], []
+        servidor = self
+
+        class Manejador(http.server.BaseHTTPRequestHandler):
+            def do_POST(self):
+                cuerpo = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                servidor.recibidos.append((self.path, dict(self.headers), cuerpo))
+                codigo = servidor.codigos.pop(0) if servidor.codigos else 200
+                self.send_response(codigo)
+                self.end_headers()
+                self.wfile.write(b'{"Key": "ok"}' if codigo < 300 else b"fallo")
+
+            def do_DELETE(self):
+                servidor.borrados.append(self.path)
+                self.send_response(200)
+                self.end_headers()
+
+            def log_message(self, *a):
+                pass
+
+        self.http = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Manejador)
+        self.url = f"http://127.0.0.1:{self.http.server_port}"
+        threading.Thread(target=self.http.serve_forever, daemon=True).start()
+
+    def cerrar(self):
+        self.http.shutdown()
+        self.http.server_close()
+
+
+@pytest.fixture
+def storage(secretos, monkeypatch):
+    import requests
+    monkeypatch.setattr(utils_storage, "BACKOFF_SEG", 0.01)
+    monkeypatch.setattr(utils_storage, "get_session", requests.Session)
+    servidores = []
+
+    def arrancar(*codigos):
+        s = Storage(codigos)
+        secretos["SUPABASE_URL"] = s.url
+        servidores.append(s)
+        return s
+
+    yield arrancar
+    for s in servidores:
+        s.cerrar()
+
+
+def test_reintenta_5xx(storage):
+    s = storage(503, 502)
+    ok, url = utils_storage.subir_bytes(io.BytesIO(b"datos"), "vehiculos", "a/b.bin")
+    assert ok and url == f"{s.url}/storage/v1/object/public/vehiculos/a/b.bin"
+    assert len(s.recibidos) == 3
+    assert all(cuerpo == b"datos" for _, _, cuerpo in s.recibidos)   # se rebobina
+    assert s.recibidos[-1][1]["x-upsert"] == "true"
+
+
+def test_se_rinde_tras_reintentos(storage):
+    s = storage(500, 500, 500, 500)
+    ok, detalle = utils_storage.subir_bytes(io.BytesIO(b"x"), "vehiculos", "c.bin")
+    assert not ok and detalle.startswith("500")
+    assert len(s.recibidos) == utils_storage.REINTENTOS
+
+
+def test_4xx_no_reintenta(storage):
+    s = storage(400)
+    ok, detalle = utils_storage.subir_bytes(io.BytesIO(b"x"), "vehiculos", "d.bin")
+    assert not ok and detalle == "400 — fallo"
+    assert len(s.recibidos) == 1
+
+
+def test_sin_conexion(secretos, monkeypatch):
+    import requests
+    monkeypatch.setattr(utils_storage, "BACKOFF_SEG", 0.01)
+    monkeypatch.setattr(utils_storage, "get_session", requests.Session)
+    secretos["SUPABASE_URL"] = "http://127.0.0.1:9"                 # puerto cerrado
+    ok, detalle = utils_storage.subir_bytes(io.BytesIO(b"x"), "vehiculos", "e.bin")
+    assert not ok and detalle
+
+
+def test_subir_foto_envia_jpeg_reducido(storage):
+    from PIL import Image
+    s = storage(503)
+    png = io.BytesIO()
+    Image.new("RGBA", (3200, 1000), (10, 20, 30, 255)).save(png, "PNG")
+    url = utils_storage.subir_foto(png, "vehiculos", "vehiculo_7.png")
+    assert url.endswith("/vehiculos/vehiculo_7.jpg")
+    ruta, cabeceras, cuerpo = s.recibidos[-1]
+    assert ruta == "/storage/v1/object/vehiculos/vehiculo_7.jpg"
+    assert cabeceras["Content-Type"] == "image/jpeg"
+    with Image.open(io.BytesIO(cuerpo)) as img:
+        assert img.format == "JPEG" and img.size == (1600, 500)
+
+
+def png(ancho=800, alto=600):
+    from PIL import Image
+    salida = io.BytesIO()
+    Image.new("RGB", (ancho, alto), "green").save(salida, "PNG")
+    return salida
+
+
+def test_subir_fotos_con_miniaturas(storage):
+    s = storage()
+    res = utils_storage.subir_fotos([png(), png()], "vehiculos",
+                                    ["checkins/7/a_0.jpg", "checkins/7/a_1.jpg"],
+                                    miniaturas=True)
+    assert [ok for ok, _ in res] == [True, True]
+    assert res[0][1].endswith("/vehiculos/checkins/7/a_0.jpg")
+    rutas = {r for r, _, _ in s.recibidos}
+    assert rutas == {f"/storage/v1/object/vehiculos/{p}" for p in (
+        "checkins/7/a_0.jpg", "checkins/7/a_1.jpg",
+        "miniaturas/96/checkins/7/a_0.jpg", "miniaturas/256/checkins/7/a_0.jpg",
+        "miniaturas/96/checkins/7/a_1.jpg", "miniaturas/256/checkins/7/a_1.jpg")}
+
+
+def test_miniatura_fallida_cuenta_como_fallo(storage):
+    storage(200, 400)                           # la foto entra, la miniatura no
+    [(ok, detalle)] = utils_storage.subir_fotos([png()], "vehiculos", ["c/x.jpg"],
+                                                miniaturas=True)
+    assert not ok and detalle == "miniaturas: 400 — fallo"
+
+
+def test_eliminar_foto_y_miniaturas(storage):
+    s = storage()
+    assert utils_storage.eliminar_foto_y_miniaturas("vehiculos", "checkins/7/a_0.jpg")
+    assert sorted(s.borrados) == [f"/storage/v1/object/vehiculos/{p}" for p in (
+        "checkins/7/a_0.jpg", "miniaturas/256/checkins/7/a_0.jpg",
+        "miniaturas/96/checkins/7/a_0.jpg")]
+
+
+# ── Preparación de imágenes ──
+def test_preparar_imagen_orienta_y_quita_exif():
+    from PIL import Image
+    original = io.BytesIO()
+    exif = Image.Exif()
+    exif[0x0112] = 6                           # rotada 90°
+    exif[0x010F] = "Cámara"
+    Image.new("RGB", (2000, 1000), "white").save(original, "JPEG", exif=exif)
+    jpeg = utils_storage.preparar_imagen(original, max_lado=800)
+    with Image.open(jpeg) as img:
+        assert img.size == (400, 800)
+        assert not img.getexif()
+
+
+def test_preparar_imagen_no_imagen():
+    assert utils_storage.preparar_imagen(io.BytesIO(b"no soy una imagen")) is None
+
+
+def test_preparar_miniatura_cuadrada():
+    from PIL import Image
+    original = io.BytesIO()
+    Image.new("RGB", (1200, 600), "blue").save(original, "PNG")
+    with Image.open(utils_storage.preparar_miniatura(original, 96)) as img:
+        assert img.size == (96, 96) and img.format == "JPEG"
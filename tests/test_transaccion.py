@@ -0,0 +1,159 @@
+"""utils.transaccion: COMMIT único, ROLLBACK, savepoints, cancelar y conexiones caídas."""
+from types import SimpleNamespace
+
+import psycopg2
+import pytest
+
+import utils
+
+
+class Cursor:
+    def __init__(self, conn):
+        self.conn, self.rowcount, self._fila = conn, -1, None
+
+    def execute(self, sql, params=None):
+        if self.conn.closed:
+            raise psycopg2.InterfaceError("connection already closed")
+        self.conn.sentencias.append(sql)
+        if "CAE" in sql:
+            self.conn.closed = 2
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        if "DUPLICADO" in sql:
+            raise psycopg2.IntegrityError("duplicate key value")
+        self.rowcount = 1 if sql.startswith(("INSERT", "UPDATE", "DELETE")) else -1
+        self._fila = {"id": 7} if "RETURNING" in sql else None
+
+    def executemany(self, sql, seq):
+        for p in seq:
+            self.execute(sql, p)
+        self.rowcount = len(seq)
+
+    def fetchone(self):
+        return self._fila
+
+    def close(self):
+        if self.conn.closed:
+            raise psycopg2.InterfaceError("connection already closed")
+
+
+class Conexion:
+    def __init__(self):
+        self.closed, self.autocommit, self.sentencias = 0, True, []
+        self.info = SimpleNamespace(
+            transaction_status=psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+
+    def cursor(self, **kw):
+        return Cursor(self)
+
+    def commit(self):
+        if self.closed:
+            raise psycopg2.InterfaceError("connection already closed")
+        self.sentencias.append("COMMIT")
+
+    def rollback(self):
+        if self.closed:
+            raise psycopg2.InterfaceError("connection already closed")
+        self.sentencias.append("ROLLBACK")
+
+    def close(self):
+        self.closed = 1
+
+
+class Pool(utils.ConnectionPool):
+    def __init__(self):
+        self.conexiones = []
+        super().__init__("", minconn=0, maxconn=2, timeout=1)
+
+    def _conectar(self):
+        conn = Conexion()
+        self.conexiones.append(conn)
+        with self._lock:
+            self._stats["abiertas"] += 1
+        return conn
+
+
+@pytest.fixture
+def bd(monkeypatch):
+    pool, errores, invalidadas = Pool(), [], []
+    monkeypatch.setattr(utils, "get_pool", lambda: pool)
+    monkeypatch.setattr(utils, "st", SimpleNamespace(error=errores.append))
+    monkeypatch.setattr(utils, "_medir", lambda *a, **k: None)
+    monkeypatch.setattr(utils, "get_query_cache",
+                        lambda: SimpleNamespace(invalidar=lambda t: invalidadas.append(set(t))))
+    return SimpleNamespace(pool=pool, errores=errores, invalidadas=invalidadas)
+
+
+def test_commit_unico(bd):
+    with utils.transaccion() as tx:
+        fila = tx.returning("INSERT INTO checkins_vehiculo (x) VALUES (%s) RETURNING id", (1,))
+        n = tx.executemany("INSERT INTO checkins_fotos (x) VALUES (%s)", [(1,), (2,), (3,)])
+    conn = bd.pool.conexiones[0]
+    assert tx.ok and fila == {"id": 7} and n == 3 and tx.filas == 4
+    assert conn.sentencias[-1] == "COMMIT" and conn.sentencias.count("COMMIT") == 1
+    assert conn.autocommit is True                      # putconn la deja como estaba
+    assert bd.invalidadas == [{"checkins_vehiculo", "checkins_fotos"}]
+
+
+def test_error_de_bd_deshace(bd):
+    with utils.transaccion() as tx:
+        tx.execute("INSERT INTO vehiculos (x) VALUES (1)")
+        tx.execute("INSERT INTO vehiculos DUPLICADO")
+        pytest.fail("el bloque no debe seguir")
+    conn = bd.pool.conexiones[0]
+    assert not tx.ok and "duplicate" in tx.error
+    assert conn.sentencias[-1] == "ROLLBACK" and "COMMIT" not in conn.sentencias
+    assert bd.errores and not bd.invalidadas
+
+
+def test_avisar_false(bd):
+    with utils.transaccion(avisar=False) as tx:
+        tx.execute("INSERT INTO vehiculos DUPLICADO")
+    assert not tx.ok and not bd.errores
+
+
+def test_savepoint(bd):
+    with utils.transaccion() as tx:
+        tx.execute("INSERT INTO vehiculos (x) VALUES (1)")
+        with tx.savepoint() as p:
+            tx.execute("INSERT INTO vehiculos DUPLICADO")
+        tx.execute("INSERT INTO vehiculos (x) VALUES (2)")
+    s = bd.pool.conexiones[0].sentencias
+    assert tx.ok and not p.ok and "duplicate" in p.error
+    assert s.index("SAVEPOINT punto_1") < s.index("ROLLBACK TO SAVEPOINT punto_1")
+    assert "RELEASE SAVEPOINT punto_1" not in s and s[-1] == "COMMIT"
+
+
+def test_savepoint_ok_libera(bd):
+    with utils.transaccion() as tx:
+        with tx.savepoint() as p:
+            tx.execute("UPDATE vehiculos SET x = 1")
+    assert p.ok and "RELEASE SAVEPOINT punto_1" in bd.pool.conexiones[0].sentencias
+
+
+def test_cancelar(bd):
+    with utils.transaccion() as tx:
+        tx.execute("UPDATE vehiculos SET x = 1")
+        tx.cancelar("vehículo no encontrado")
+    assert not tx.ok and tx.cancelada and tx.error == "vehículo no encontrado"
+    assert bd.pool.conexiones[0].sentencias[-1] == "ROLLBACK"
+    assert not bd.errores and not bd.invalidadas
+
+
+def test_otra_excepcion_se_propaga(bd):
+    with pytest.raises(KeyError):
+        with utils.transaccion() as tx:
+            tx.execute("UPDATE vehiculos SET x = 1")
+            raise KeyError("x")
+    assert bd.pool.conexiones[0].sentencias[-1] == "ROLLBACK"
+
+
+def test_conexion_caida(bd):
+    with utils.transaccion() as tx:
+        tx.execute("UPDATE vehiculos CAE")
+    assert not tx.ok and "server closed" in tx.error
+    assert bd.errores                                   # se avisa, sin traza
+    estado = bd.pool.estado()
+    assert estado["en_uso"] == 0 and estado["libres"] == 0 and estado["recicladas"] == 1
+    with utils.transaccion() as tx2:                    # la siguiente usa otra conexión
+        tx2.execute("UPDATE vehiculos SET x = 1")
+    assert tx2.ok and len(bd.pool.conexiones) == 2
@@ -0,0 +1,19 @@
+"""utils_vencimientos: el refresco diario no guarda los fallos en caché."""
+import utils_vencimientos as uv
+
+
+def test_fallo_no_queda_en_cache(monkeypatch):
+    uv._refresco_diario.clear()
+    respuestas, llamadas = [False, False, True], []
+
+    def execute(sql, params=None):
+        llamadas.append(sql)
+        return respuestas.pop(0)
+
+    monkeypatch.setattr(uv, "execute", execute)
+    assert uv.refrescar() is False
+    assert uv.refrescar() is False             # se reintenta
+    assert uv.refrescar() is True
+    assert uv.refrescar() is True              # ya hecho hoy: no vuelve a la BD
+    assert len(llamadas) == 3
+    uv._refresco_diario.clear()
@@ -5,8 +5,19 @@ Importar en Home.py y en todas las páginas.
 import streamlit as st
 import psycopg2
 import psycopg2.extras
-import hashlib
+import psycopg2.pool
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import io
+import threading
 import time
+from contextlib import contextmanager
+from utils_cache import QueryCache, clave, tablas_de
+from utils_schema import aplicar_esquema
+from utils_auth import DirectorioUsuarios, hash_password, KDF_ITERACIONES
+from utils_monitor import MonitorBD, MONITOR_INTERVALO
+from utils_metricas import Metricas, LENTA_MS, explicable
+from utils_preparadas import ConexionPreparada, SentenciasPreparadas, PREPARAR_TRAS, PREPARADAS_MAX
+from utils_arranque import informe_arranque
 
 # ─────────────────────────────────────────────
 # PALETA Y CSS GLOBAL
@@ -232,71 +243,661 @@ header[data-testid="stHeader"] { background: transparent !important; }
 # ─────────────────────────────────────────────
 # BASE DE DATOS
 # ─────────────────────────────────────────────
+POOL_MIN      = 2      # conexiones abiertas al arrancar
+POOL_MAX      = 20     # conexiones simultáneas como máximo
+POOL_TIMEOUT  = 10     # segundos esperando una conexión libre
+PING_INTERVAL = 30     # segundos de inactividad tras los que se verifica
+
+
+class ConnectionPool:
+    """Pool de conexiones psycopg2 thread-safe con checkout por llamada.
+
+    Las conexiones trabajan en autocommit: cada sentencia suelta es su propia
+    transacción, así que un fallo no deja la conexión abortada para el
+    siguiente usuario. Las conexiones rotas se descartan y se reabren.
+    """
+
+    def __init__(self, dsn: str, minconn: int = POOL_MIN,
+                 maxconn: int = POOL_MAX, timeout: float = POOL_TIMEOUT):
+        self.dsn     = dsn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self._lock   = threading.Lock()
+        self._sem    = threading.BoundedSemaphore(maxconn)
+        self._libres = []          # [(conn, último uso)] — LIFO, la más caliente arriba
+        self._stats  = {
+            "abiertas": 0, "en_uso": 0, "checkouts": 0, "timeouts": 0,
+            "recicladas": 0, "espera_total": 0.0, "espera_max": 0.0,
+        }
+        for _ in range(min(minconn, maxconn)):
+            self._libres.append((self._conectar(), time.monotonic()))
+
+    def _conectar(self):
+        conn = psycopg2.connect(self.dsn, connect_timeout=8,
+                                connection_factory=ConexionPreparada)
+        conn.autocommit = True
+        with self._lock:
+            self._stats["abiertas"] += 1
+        return conn
+
+    def _cerrar(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._stats["abiertas"]   -= 1
+            self._stats["recicladas"] += 1
+
+    def _sana(self, conn, ultimo_uso: float) -> bool:
+        if conn.closed:
+            return False
+        if conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if time.monotonic() - ultimo_uso > PING_INTERVAL:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+            except psycopg2.Error:
+                return False
+        return True
+
+    def getconn(self):
+        """Saca una conexión sana del pool, esperando como mucho `timeout` s."""
+        t0 = time.perf_counter()
+        if not self._sem.acquire(timeout=self.timeout):
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise psycopg2.pool.PoolError(
+                f"Sin conexiones libres tras {self.timeout}s ({self.maxconn} en uso)"
+            )
+        espera = time.perf_counter() - t0
+        try:
+            while True:
+                with self._lock:
+                    item = self._libres.pop() if self._libres else None
+                if item is None:
+                    conn = self._conectar()
+                    break
+                if self._sana(*item):
+                    conn = item[0]
+                    break
+                self._cerrar(item[0])
+        except Exception:
+            self._sem.release()
+            raise
+        with self._lock:
+            s = self._stats
+            s["en_uso"]       += 1
+            s["checkouts"]    += 1
+            s["espera_total"] += espera
+            s["espera_max"]    = max(s["espera_max"], espera)
+        return conn
+
+    def putconn(self, conn, descartar: bool = False):
+        """Devuelve la conexión al pool; si está rota o en mal estado la cierra."""
+        try:
+            if not descartar and not conn.closed:
+                status = conn.info.transaction_status
+                if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                    descartar = True
+                else:
+                    try:
+                        if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                            conn.rollback()
+                        conn.autocommit = True
+                    except psycopg2.Error:
+                        descartar = True
+            if descartar or conn.closed:
+                self._cerrar(conn)
+            else:
+                with self._lock:
+                    self._libres.append((conn, time.monotonic()))
+        finally:
+            with self._lock:
+                self._stats["en_uso"] -= 1
+            self._sem.release()
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        rota = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            rota = True
+            raise
+        finally:
+            self.putconn(conn, descartar=rota)
+
+    def estado(self) -> dict:
+        """Tamaño del pool y tiempos de espera acumulados."""
+        with self._lock:
+            s = dict(self._stats)
+            libres = len(self._libres)
+        n = s["checkouts"] or 1
+        return {
+            "max": self.maxconn,
+            "abiertas": s["abiertas"],
+            "en_uso": s["en_uso"],
+            "libres": libres,
+            "checkouts": s["checkouts"],
+            "timeouts": s["timeouts"],
+            "recicladas": s["recicladas"],
+            "espera_media_ms": round(s["espera_total"] / n * 1000, 2),
+            "espera_max_ms": round(s["espera_max"] * 1000, 2),
+        }
+
+
 @st.cache_resource(show_spinner=False)
+def get_pool() -> ConnectionPool:
+    return ConnectionPool(
+        st.secrets["DATABASE_URL"],
+        minconn=int(st.secrets.get("DB_POOL_MIN", POOL_MIN)),
+        maxconn=int(st.secrets.get("DB_POOL_MAX", POOL_MAX)),
+    )
+
 def get_conn():
-    return psycopg2.connect(st.secrets["DATABASE_URL"], connect_timeout=8)
+    """Context manager: `with get_conn() as conn:` saca y devuelve una conexión."""
+    return get_pool().connection()
 
-def query(sql: str, params=None):
-    """Ejecuta SELECT y devuelve lista de dicts."""
-    conn = get_conn()
+def pool_status() -> dict:
+    return get_pool().estado()
+
+@st.cache_resource(show_spinner=False)
+def get_preparadas() -> SentenciasPreparadas:
+    """Registro de sentencias preparadas compartido por todas las sesiones."""
+    return SentenciasPreparadas(
+        preparar_tras=int(st.secrets.get("PREPARAR_TRAS", PREPARAR_TRAS)),
+        maximo_conexion=int(st.secrets.get("PREPARADAS_MAX", PREPARADAS_MAX)),
+    )
+
+def preparadas_status() -> dict:
+    return get_preparadas().estado()
+
+@st.cache_resource(show_spinner=False)
+def get_metricas() -> Metricas:
+    """Tiempos de consulta por sentencia y página (ver utils_metricas)."""
+    return Metricas(lenta_ms=float(st.secrets.get("LENTA_MS", LENTA_MS)))
+
+def _pagina() -> str:
+    if get_script_run_ctx(suppress_warning=True) is None:
+        return "(fondo)"                     # hilos sin sesión: monitor, calentamiento…
+    if not st.session_state.get("login"):
+        return "Login"
+    return st.session_state.get("page", "Dashboard")
+
+def _explicar(sql: str, params=None):
+    if not explicable(sql):
+        return None
     try:
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-            cur.execute(sql, params)
-            return [dict(r) for r in cur.fetchall()]
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute("EXPLAIN " + sql, params)
+                return "\n".join(r[0] for r in cur)
     except Exception as e:
+        return f"(sin plan: {e})"
+
+def _medir(sql: str, params, t0: float, filas: int = 0, error: bool = False):
+    """Apunta la ejecución en las métricas; si ha sido lenta guarda también su plan."""
+    ms      = (time.perf_counter() - t0) * 1000
+    pagina  = _pagina()
+    metr    = get_metricas()
+    if metr.registrar(sql, pagina, ms, filas, error):
+        metr.lenta(sql, pagina, ms, filas, _explicar(sql, params))
+
+@st.cache_resource(show_spinner=False)
+def get_query_cache() -> QueryCache:
+    """Caché de resultados compartida por todas las sesiones del servidor."""
+    return QueryCache(max_entradas=int(st.secrets.get("QUERY_CACHE_MAX", 512)))
+
+def invalidar_cache(*tablas):
+    """Descarta los resultados cacheados que leen de alguna de las tablas."""
+    get_query_cache().invalidar(tablas)
+
+def query(sql: str, params=None, ttl: float = None):
+    """Ejecuta SELECT y devuelve lista de dicts.
+
+    Con `ttl` (segundos) el resultado se sirve desde la caché compartida
+    hasta que caduque o una escritura toque alguna de sus tablas.
+    """
+    if ttl:
+        cache   = get_query_cache()
+        k       = clave(sql, params)
+        filas   = cache.get(k)
+        if filas is not None:
+            return [dict(r) for r in filas]
+        tablas  = tablas_de(sql)
+        version = cache.version(tablas)
+    t0 = time.perf_counter()
+    try:
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                get_preparadas().ejecutar(cur, sql, params)
+                columnas = [c.name for c in cur.description]
+                filas = [dict(zip(columnas, r)) for r in cur]
+    except Exception as e:
+        _medir(sql, params, t0, error=True)
         st.error(f"ERROR SQL: {e}")
-        get_conn.clear()
         return []
+    _medir(sql, params, t0, len(filas))
+    if ttl:
+        cache.put(k, tablas, filas, version, ttl)
+        return [dict(r) for r in filas]
+    return filas
+
 def execute(sql: str, params=None) -> bool:
     """Ejecuta INSERT/UPDATE/DELETE. Devuelve True si OK."""
-    conn = get_conn()
+    t0 = time.perf_counter()
     try:
-        with conn.cursor() as cur:
-            cur.execute(sql, params)
-        conn.commit()
-        return True
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql, params)
+                filas = cur.rowcount
     except Exception as e:
-        conn.rollback()
+        _medir(sql, params, t0, error=True)
         st.error(f"Error de BD: {e}")
         return False
+    _medir(sql, params, t0, max(filas, 0))
+    get_query_cache().invalidar(tablas_de(sql))
+    return True
 
-def db_status() -> bool:
+def execute_returning(sql: str, params=None):
+    """Como execute, para sentencias con RETURNING: devuelve la primera fila o None."""
+    t0 = time.perf_counter()
+    try:
+        with get_conn() as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                cur.execute(sql, params)
+                fila = cur.fetchone()
+                filas = cur.rowcount
+    except Exception as e:
+        _medir(sql, params, t0, error=True)
+        st.error(f"Error de BD: {e}")
+        return None
+    _medir(sql, params, t0, max(filas, 0))
+    get_query_cache().invalidar(tablas_de(sql))
+    return dict(fila) if fila else None
+
+TX_LOTE = 500   # filas por sentencia en Transaccion.execute_values
+
+class Punto:
+    """Resultado de un savepoint: `ok` y, si falló, el `error` de la BD."""
+
+    def __init__(self):
+        self.ok    = True
+        self.error = None
+
+class Transaccion:
+    """Varias escrituras en una sola transacción (ver `transaccion`).
+
+    Cada método devuelve las filas afectadas; `filas` lleva el total y
+    `conteos` una entrada (sentencia, filas) por llamada.
+    """
+
+    def __init__(self, conn):
+        self.conn    = conn
+        self.cur     = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        self.filas   = 0
+        self.conteos = []
+        self.tablas  = set()
+        self.ok      = True
+        self.error   = None
+        self.cancelada = False
+        self._puntos    = 0
+
+    def _apuntar(self, sql: str, params, t0: float, n: int) -> int:
+        n = max(n, 0)
+        _medir(sql, params, t0, n)
+        self.filas += n
+        self.conteos.append((" ".join(sql.split())[:80], n))
+        self.tablas |= tablas_de(sql)
+        return n
+
+    def _ejecutar(self, sql: str, params, fn):
+        t0 = time.perf_counter()
+        try:
+            fn()
+        except psycopg2.Error:
+            _medir(sql, params, t0, error=True)
+            raise
+        return self._apuntar(sql, params, t0, self.cur.rowcount)
+
+    def execute(self, sql: str, params=None) -> int:
+        return self._ejecutar(sql, params, lambda: self.cur.execute(sql, params))
+
+    def returning(self, sql: str, params=None):
+        """Sentencia con RETURNING: devuelve la primera fila (dict) o None."""
+        self.execute(sql, params)
+        fila = self.cur.fetchone()
+        return dict(fila) if fila else None
+
+    def executemany(self, sql: str, seq_params) -> int:
+        seq_params = list(seq_params)
+        return self._ejecutar(sql, None, lambda: self.cur.executemany(sql, seq_params))
+
+    def execute_values(self, sql: str, filas, template: str = None,
+                       lote: int = TX_LOTE) -> int:
+        """INSERT ... VALUES %s con `lote` filas por sentencia (execute_values de psycopg2)."""
+        filas, total = list(filas), 0
+        for i in range(0, len(filas), lote):
+            parte = filas[i:i + lote]
+            total += self._ejecutar(sql, None, lambda: psycopg2.extras.execute_values(
+                self.cur, sql, parte, template=template, page_size=len(parte)))
+        return total
+
+    def copy(self, sql: str, fichero) -> int:
+        """COPY ... FROM STDIN leyendo de `fichero`."""
+        return self._ejecutar(sql, None, lambda: self.cur.copy_expert(sql, fichero))
+
+    @contextmanager
+    def savepoint(self):
+        """Bloque que, si falla en la BD, se deshace solo y deja seguir la transacción.
+
+        `with tx.savepoint() as p:` … después, `p.ok` / `p.error`.
+        """
+        self._puntos += 1
+        nombre = f"punto_{self._puntos}"
+        punto  = Punto()
+        self.cur.execute(f"SAVEPOINT {nombre}")
+        try:
+            yield punto
+        except psycopg2.Error as e:
+            self.cur.execute(f"ROLLBACK TO SAVEPOINT {nombre}")
+            punto.ok, punto.error = False, str(e).strip()
+        except BaseException:
+            self.cur.execute(f"ROLLBACK TO SAVEPOINT {nombre}")
+            raise
+        else:
+            self.cur.execute(f"RELEASE SAVEPOINT {nombre}")
+
+    def cancelar(self, motivo: str = None):
+        """Deshace todo al salir del bloque, sin tratarlo como error de BD."""
+        self.cancelada = True
+        self.error = motivo
+
+def _deshacer(conn):
+    """ROLLBACK que no falla si la conexión ya se ha caído."""
+    if conn.closed:
+        return
+    try:
+        conn.rollback()
+    except psycopg2.Error:
+        pass
+
+@contextmanager
+def transaccion(avisar: bool = True):
+    """Unidad de trabajo: `with transaccion() as tx:` y un único COMMIT al salir.
+
+    Un error de la BD dentro del bloque deshace todo, se muestra con
+    st.error (salvo `avisar=False`) y deja `tx.ok = False` y `tx.error`;
+    el resto del bloque no se ejecuta. Si lo que falla es la conexión,
+    además se descarta del pool.
+    Cualquier otra excepción también deshace y se propaga; por eso
+    st.rerun() va después del bloque, no dentro. La caché se invalida
+    solo si se confirma.
+    """
+    tx = None
+    try:
+        with get_conn() as conn:
+            conn.autocommit = False
+            tx = Transaccion(conn)
+            try:
+                yield tx
+                if tx.cancelada:
+                    conn.rollback()
+                    tx.ok = False
+                else:
+                    conn.commit()
+            except psycopg2.Error as e:
+                _deshacer(conn)
+                tx.ok, tx.error = False, str(e).strip()
+                if isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+                    raise                    # get_conn descarta la conexión rota
+                if avisar:
+                    st.error(f"Error de BD: {e}")
+            except BaseException:
+                _deshacer(conn)
+                raise
+            finally:
+                if not conn.closed:
+                    tx.cur.close()
+    except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+        if tx is None:
+            raise                            # no se llegó a abrir: no hay bloque que saltar
+        if avisar:
+            st.error(f"Error de BD: {e}")
+    if tx.ok:
+        get_query_cache().invalidar(tx.tablas)
+
+# OID de PostgreSQL -> dtype de pandas para query_frame (el resto, texto)
+_DTYPES_FRAME = {20: "Int64", 21: "Int64", 23: "Int64", 26: "Int64",
+                 700: "float64", 701: "float64", 1700: "float64"}
+_OID_BOOL     = 16
+_OID_FECHAS   = {1082: False, 1114: False, 1184: True}    # oid -> con zona horaria
+
+def query_frame(sql: str, params=None, ttl: float = None):
+    """Ejecuta SELECT y devuelve un DataFrame sin construir un dict por fila.
+
+    El resultado viaja como CSV con COPY ... TO STDOUT a un buffer y pandas
+    lo lee por columnas: enteros como Int64 (admiten nulos), booleanos
+    como boolean, fechas y timestamps como datetime64 y numeric como
+    float64. Con `ttl` se cachea igual que `query`.
+    """
+    import pandas as pd
+    if ttl:
+        cache   = get_query_cache()
+        k       = clave("frame:" + sql, params)
+        df      = cache.get(k)
+        if df is not None:
+            return df.copy()
+        tablas  = tablas_de(sql)
+        version = cache.version(tablas)
+    t0 = time.perf_counter()
     try:
-        conn = get_conn()
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                consulta = cur.mogrify(sql, params).decode().strip().rstrip(";")
+                cur.execute(f"SELECT * FROM ({consulta}) q LIMIT 0")
+                tipos  = [(c.name, c.type_code) for c in cur.description]
+                buffer = io.BytesIO()
+                cur.copy_expert(f"COPY ({consulta}) TO STDOUT "
+                                "WITH (FORMAT csv, HEADER, NULL '\\N')", buffer)
+                filas = cur.rowcount
+    except Exception as e:
+        _medir(sql, params, t0, error=True)
+        st.error(f"ERROR SQL: {e}")
+        return pd.DataFrame()
+    _medir(sql, params, t0, max(filas, 0))
+    buffer.seek(0)
+    df = pd.read_csv(buffer, dtype={n: _DTYPES_FRAME.get(t, "str") for n, t in tipos},
+                     na_values=["\\N"], keep_default_na=False)
+    for n, t in tipos:
+        if t == _OID_BOOL:
+            df[n] = df[n].map({"t": True, "f": False}).astype("boolean")
+        elif t in _OID_FECHAS:
+            df[n] = pd.to_datetime(df[n], format="ISO8601", utc=_OID_FECHAS[t], errors="coerce")
+    if ttl:
+        cache.put(k, tablas, df, version, ttl)
+        return df.copy()
+    return df
+
+STREAM_ITERSIZE = 500   # filas por viaje al servidor en query_stream
+_FABRICAS_FILA  = {
+    "dict":       psycopg2.extras.RealDictCursor,
+    "tupla":      None,
+    "namedtuple": psycopg2.extras.NamedTupleCursor,
+}
+
+def query_stream(sql: str, params=None, itersize: int = STREAM_ITERSIZE, filas: str = "dict"):
+    """Itera las filas de un SELECT con un cursor de servidor.
+
+    Solo hay `itersize` filas en memoria a la vez; la conexión queda ocupada
+    hasta que se agota o se cierra el iterador. `filas` elige el tipo de
+    fila: "dict", "tupla" (la más barata) o "namedtuple". El tiempo que
+    se apunta en las métricas incluye el del consumidor.
+    """
+    if filas not in _FABRICAS_FILA:
+        raise ValueError(f"filas debe ser uno de {', '.join(_FABRICAS_FILA)}")
+    t0, n, error = time.perf_counter(), 0, False
+    try:
+        with get_conn() as conn:
+            conn.autocommit = False          # DECLARE necesita transacción; putconn la cierra
+            with conn.cursor(name="query_stream",
+                             cursor_factory=_FABRICAS_FILA[filas]) as cur:
+                cur.itersize = itersize
+                cur.execute(sql, params)
+                for fila in cur:
+                    n += 1
+                    yield fila
+    except psycopg2.Error as e:
+        error = True
+        st.error(f"ERROR SQL: {e}")
+    finally:
+        _medir(sql, params, t0, n, error)
+
+@st.cache_resource(show_spinner=False)
+def _esquema_aplicado() -> dict:
+    with get_conn() as conn:
+        return aplicar_esquema(conn)
+
+def ensure_schema() -> dict:
+    """Crea/actualiza tablas auxiliares, índices y triggers una vez por proceso."""
+    try:
+        return _esquema_aplicado()
+    except Exception as e:
+        return {"conexion": str(e)}
+
+def _sondeo_bd():
+    with get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute("SELECT 1")
+
+def db_status() -> bool:
+    try:
+        _sondeo_bd()
         return True
     except Exception:
         return False
 
+@st.cache_resource(show_spinner=False)
+def get_monitor() -> MonitorBD:
+    """Hilo que sondea la BD en segundo plano; el primer sondeo es síncrono."""
+    monitor = MonitorBD(_sondeo_bd,
+                        intervalo=float(st.secrets.get("MONITOR_INTERVALO", MONITOR_INTERVALO)))
+    monitor.comprobar()
+    monitor.start()
+    return monitor
+
+# ─────────────────────────────────────────────
+# PAGINACIÓN (KEYSET)
+# ─────────────────────────────────────────────
+PAGE_SIZES  = [25, 50, 100]
+COUNT_TOPE  = 1000     # a partir de aquí el total se estima
+
+def query_page(tabla: str, orden: list, where=(), params=(), after=None,
+               limit: int = 50, columnas: str = "*", ttl: float = None):
+    """Una página ordenada por `orden` (expresiones ASC, la última única).
+
+    `after` son los valores de clave de la última fila de la página anterior;
+    el coste es el de leer `limit` filas del índice, sea cual sea la página.
+    Devuelve (filas, clave_siguiente | None).
+    """
+    claves = ", ".join(f"{e} AS _k{i}" for i, e in enumerate(orden))
+    conds  = list(where)
+    params = list(params)
+    if after:
+        conds.append(f"({', '.join(orden)}) > ({', '.join(['%s'] * len(orden))})")
+        params += list(after)
+    sql = f"SELECT {columnas}, {claves} FROM {tabla}"
+    if conds:
+        sql += " WHERE " + " AND ".join(conds)
+    sql += f" ORDER BY {', '.join(orden)} LIMIT %s"
+    rows = query(sql, params + [limit + 1], ttl=ttl)
+    siguiente = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        siguiente = tuple(rows[-1][f"_k{i}"] for i in range(len(orden)))
+    for r in rows:
+        for i in range(len(orden)):
+            r.pop(f"_k{i}", None)
+    return rows, siguiente
+
+def contar(tabla: str, where=(), params=(), ttl: float = 60) -> str:
+    """Total acotado: exacto hasta COUNT_TOPE filas; por encima, estimado."""
+    sql = f"SELECT COUNT(*) AS n FROM (SELECT 1 FROM {tabla}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " LIMIT %s) s"
+    rows = query(sql, list(params) + [COUNT_TOPE + 1], ttl=ttl)
+    n = rows[0]["n"] if rows else 0
+    if n <= COUNT_TOPE:
+        return str(n)
+    if not where:
+        est = query("SELECT reltuples::bigint AS n FROM pg_class WHERE oid = %s::regclass",
+                    (tabla,), ttl=ttl)
+        if est and est[0]["n"] > COUNT_TOPE:
+            return f"≈{est[0]['n']:,}".replace(",", ".")
+    return f"{COUNT_TOPE}+"
+
+def pagina_actual(key: str, filtros):
+    """Clave `after` de la página visible. Vuelve a la primera si cambian los filtros."""
+    estado = st.session_state.setdefault(f"pag_{key}", {"filtros": None, "pila": []})
+    if estado["filtros"] != filtros:
+        estado["filtros"] = filtros
+        estado["pila"]    = []
+    return estado["pila"][-1] if estado["pila"] else None
+
+def controles_pagina(key: str, siguiente):
+    estado = st.session_state[f"pag_{key}"]
+    c_prev, c_num, c_next = st.columns([1, 2, 1])
+    with c_prev:
+        if estado["pila"] and st.button("← Anterior", key=f"{key}_prev"):
+            estado["pila"].pop()
+            st.rerun()
+    with c_num:
+        st.caption(f"Página {len(estado['pila']) + 1}")
+    with c_next:
+        if siguiente and st.button("Siguiente →", key=f"{key}_next"):
+            estado["pila"].append(siguiente)
+            st.rerun()
+
 # ─────────────────────────────────────────────
 # AUTH
 # ─────────────────────────────────────────────
 def hash_pwd(p: str) -> str:
-    return hashlib.sha256(p.encode()).hexdigest()
+    """Hash PBKDF2 con sal, listo para guardar en usuarios.csv o en la tabla usuarios."""
+    return hash_password(p, int(st.secrets.get("KDF_ITERACIONES", KDF_ITERACIONES)))
+
+def _usuarios_db() -> dict:
+    rows = query("SELECT username, password, rol FROM usuarios WHERE activo")
+    return {r["username"].strip(): {"password": r["password"].strip(), "rol": r["rol"]}
+            for r in rows}
+
+def _guardar_hash_db(username: str, nuevo: str):
+    execute("UPDATE usuarios SET password = %s WHERE username = %s", (nuevo, username))
+
+@st.cache_resource(show_spinner=False)
+def get_directorio() -> DirectorioUsuarios:
+    """Usuarios de data/usuarios.csv, o de la tabla `usuarios` si USUARIOS_DB=true."""
+    if st.secrets.get("USUARIOS_DB"):
+        return DirectorioUsuarios(cargar_db=_usuarios_db, guardar_hash=_guardar_hash_db,
+                                  iteraciones=int(st.secrets.get("KDF_ITERACIONES", KDF_ITERACIONES)))
+    return DirectorioUsuarios(iteraciones=int(st.secrets.get("KDF_ITERACIONES", KDF_ITERACIONES)))
+
+def _cliente() -> str:
+    """Origen del intento de login: IP del navegador o, si no se conoce, la sesión."""
+    ip = st.context.ip_address
+    if ip:
+        return ip
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx else ""
 
 def check_login(username: str, password: str):
-    import pandas as pd
-    from pathlib import Path
-    default = pd.DataFrame([{"username": "admin", "password": "admin", "rol": "admin"}])
-    path = Path("data/usuarios.csv")
-    df = default
-    if path.exists():
-        for enc in ("utf-8-sig", "utf-8", "latin1"):
-            try:
-                df = pd.read_csv(path, dtype=str, encoding=enc).fillna("")
-                break
-            except Exception:
-                continue
-    time.sleep(0.25)
-    match = df[df["username"].str.strip() == username.strip()]
-    if not match.empty:
-        stored = match.iloc[0]["password"].strip()
-        plain_ok = stored == password
-        hash_ok  = (len(stored) == 64 and hash_pwd(password) == stored)
-        if plain_ok or hash_ok:
-            return True, match.iloc[0]["rol"]
-    return False, None
+    return get_directorio().verificar(username, password, _cliente())
+
+def segundos_bloqueo(username: str) -> int:
+    return get_directorio().segundos_bloqueo(username, _cliente())
 
 def require_login():
     """Llama en cada página para redirigir si no hay sesión."""
@@ -311,17 +912,26 @@ NAV_PAGES = {
     "📊 Dashboard":   "Dashboard",
     "👥 Empleados":   "Empleados",
     "🚛 Vehículos":   "Vehiculos",
+    "🩺 Flota":       "Flota",
     "📋 Servicios":   "Servicios",
     "📅 Ausencias":   "Ausencias",
 }
 
+# Solo para el rol admin
+NAV_ADMIN = {
+    "⏱️ Rendimiento": "Rendimiento",
+}
+
 def render_sidebar():
     with st.sidebar:
         st.markdown("## 🚚 PRODE")
         st.markdown("*Última Milla Manager*")
         st.markdown("---")
 
-        for label, page in NAV_PAGES.items():
+        nav = dict(NAV_PAGES)
+        if st.session_state.get("rol") == "admin":
+            nav.update(NAV_ADMIN)
+        for label, page in nav.items():
             active = st.session_state.get("page") == page
             css    = "nav-active" if active else ""
             st.markdown(f'<div class="{css}">', unsafe_allow_html=True)
@@ -335,10 +945,35 @@ def render_sidebar():
             st.markdown("</div>", unsafe_allow_html=True)
 
         st.markdown("---")
-        ok = db_status()
+        monitor = get_monitor()
+        est     = monitor.estado()
+        ok      = bool(est["ok"])
         st.markdown(
             f"{'🟢' if ok else '🔴'} {'BD conectada' if ok else 'Sin conexión'}",
         )
+        if st.session_state.get("rol") == "admin":
+            pct = monitor.percentiles()
+            if pct["muestras"]:
+                st.caption(f"Latencia p50 {pct['p50']:.0f} · p95 {pct['p95']:.0f} · "
+                           f"p99 {pct['p99']:.0f} ms")
+            if ok:
+                ps = pool_status()
+                st.caption(f"Pool {ps['en_uso']}/{ps['max']} · "
+                           f"espera media {ps['espera_media_ms']} ms")
+                pp = preparadas_status()
+                if pp["por_execute"]:
+                    st.caption(f"Preparadas {pp['preparadas']} · "
+                               f"aciertos {pp['hit_rate']:.0%}")
+            elif est["ultimo_error"]:
+                st.caption(f"Último error: {est['ultimo_error'][:120]}")
+            arranque = informe_arranque()
+            if arranque:
+                st.caption(f"Arranque en {arranque['total_ms']:.0f} ms"
+                           + (f" · {len(arranque['errores'])} error(es)"
+                              if arranque["errores"] else ""))
+            st.toggle("⏱️ Perfilar reruns", key="perfil_activo")
+            if st.session_state.get("perfil_activo"):
+                st.checkbox("Guardar cProfile", key="perfil_cprofile")
         st.markdown("---")
         usuario = st.session_state.get("usuario", "—")
         rol     = st.session_state.get("rol", "—")
@@ -0,0 +1,79 @@
+"""utils_arranque.py — Calentamiento del proceso e informe de tiempos de arranque.
+
+Al primer rerun se lanza un hilo que importa las páginas y librerías
+pesadas, abre el pool, aplica el esquema y precarga las cachés de datos de
+referencia mientras el usuario aún está en la pantalla de login. Cada
+arranque añade una línea a data/arranque.jsonl para comparar despliegues.
+"""
+import datetime
+import importlib
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+
+import streamlit as st
+
+log = logging.getLogger(__name__)
+
+MODULOS_PESADOS = ["pandas", "numpy", "PIL.Image", "requests", "openpyxl",
+                   "reportlab.pdfgen.canvas"]
+MODULOS_PAGINAS = ["pages.empleados", "pages.vehiculos", "pages.servicios",
+                   "pages.ausencias", "pages.flota", "pages.rendimiento"]
+INFORME = Path("data/arranque.jsonl")
+
+
+class Calentamiento(threading.Thread):
+    def __init__(self):
+        super().__init__(name="calentamiento", daemon=True)
+        self.informe = {"inicio": datetime.datetime.now().isoformat(timespec="seconds"),
+                        "importaciones": {}, "pasos": {}, "errores": {}}
+
+    def _medir(self, seccion: str, nombre: str, fn):
+        t0 = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            self.informe["errores"][nombre] = str(e).strip()
+        self.informe[seccion][nombre] = round((time.perf_counter() - t0) * 1000, 1)
+
+    def run(self):
+        t0 = time.perf_counter()
+        for mod in MODULOS_PESADOS + MODULOS_PAGINAS:
+            self._medir("importaciones", mod, lambda m=mod: importlib.import_module(m))
+
+        import utils
+        self._medir("pasos", "pool", utils.get_pool)
+        self._medir("pasos", "esquema", utils.ensure_schema)
+        self._medir("pasos", "monitor", utils.get_monitor)
+        self._medir("pasos", "usuarios", lambda: utils.get_directorio().get(""))
+        from utils_dashboard import dashboard_snapshot
+        self._medir("pasos", "dashboard", dashboard_snapshot)
+        for mod in MODULOS_PAGINAS:
+            precargar = getattr(importlib.import_module(mod), "precargar", None)
+            if precargar:
+                self._medir("pasos", f"precarga:{mod}", precargar)
+
+        self.informe["total_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        log.info("Calentamiento completado en %s ms", self.informe["total_ms"])
+        try:
+            INFORME.parent.mkdir(parents=True, exist_ok=True)
+            with open(INFORME, "a", encoding="utf-8") as f:
+                f.write(json.dumps(self.informe, ensure_ascii=False) + "\n")
+        except OSError as e:
+            log.warning("No se pudo escribir %s: %s", INFORME, e)
+
+
+@st.cache_resource(show_spinner=False)
+def iniciar_calentamiento() -> Calentamiento:
+    """Arranca el calentamiento una sola vez por proceso, sin bloquear el rerun."""
+    hilo = Calentamiento()
+    hilo.start()
+    return hilo
+
+
+def informe_arranque():
+    """Informe del último calentamiento, o None si aún no ha terminado."""
+    hilo = iniciar_calentamiento()
+    return None if hilo.is_alive() else hilo.informe
@@ -0,0 +1,211 @@
+"""utils_ausencias.py — Índice de ausencias en memoria para consultas por fecha.
+
+Las ausencias se guardan en arrays de numpy ordenados por fecha de inicio
+(fechas como ordinales). Una consulta "¿quién falta entre A y B?" se reduce
+a dos búsquedas binarias y una máscara sobre el tramo candidato: como
+ninguna ausencia cerrada dura más que `max_dias`, solo pueden solapar las
+que empiezan en [A - max_dias, B], más las abiertas (sin fecha de fin,
+p. ej. una baja en curso) que empezaron antes. Igual que `periodo_ausencia`
+en la BD, un fin anterior al inicio cuenta como ausencia de un solo día.
+
+El índice es compartido por todas las sesiones. Los triggers apuntan cada
+alta, cambio o baja en `ausencias_cambios` con la transacción que la hizo;
+al refrescar se releen las ausencias tocadas por transacciones que aún no
+habían terminado en el refresco anterior (`xid` >= horizonte). No basta con
+"id mayor que el último visto": una carga larga reserva ids bajos y puede
+confirmar después que una escritura corta con un id mayor. Se refresca en
+cuanto este proceso escribe en `ausencias` (versión de la caché de
+consultas) y, para recoger escrituras de otros procesos, como mucho cada
+REFRESCO_SEG.
+"""
+import datetime
+import threading
+import time
+
+import numpy as np
+import streamlit as st
+
+from utils import query, get_query_cache
+
+REFRESCO_SEG = 30
+
+_COLUMNAS = "a.id, a.empleado_id, a.tipo, a.fecha_inicio, a.fecha_fin, a.observaciones"
+
+SQL_CARGA = f"""
+    SELECT {_COLUMNAS} FROM ausencias a
+    WHERE a.fecha_inicio IS NOT NULL
+"""
+
+SQL_CAMBIOS = f"""
+    SELECT c.ausencia_id, c.ultimo, {_COLUMNAS}
+    FROM (SELECT ausencia_id, MAX(id) AS ultimo FROM ausencias_cambios
+          WHERE xid >= %s::xid8 GROUP BY ausencia_id) c
+    LEFT JOIN ausencias a ON a.id = c.ausencia_id AND a.fecha_inicio IS NOT NULL
+"""
+
+# Horizonte: xid más antiguo aún en curso; lo anterior ya está confirmado o deshecho
+SQL_MARCA = """
+    SELECT COALESCE(MIN(id), 0) AS primero, COALESCE(MAX(id), 0) AS ultimo,
+           pg_snapshot_xmin(pg_current_snapshot())::text AS horizonte
+    FROM ausencias_cambios
+"""
+
+
+FIN_ABIERTO = datetime.date.max.toordinal()     # fin de las ausencias sin fecha_fin
+
+
+def _ordinal(d) -> int:
+    return FIN_ABIERTO if d is None else d.toordinal()
+
+
+class _Datos:
+    """Instantánea inmutable del índice (se sustituye entera al refrescar)."""
+
+    def __init__(self, filas: dict, tipos: list):
+        orden = sorted(filas.values(), key=lambda r: (r["fecha_inicio"], r["id"]))
+        self.filas    = filas
+        self.tipos    = {t: i for i, t in enumerate(tipos)}
+        self.id       = np.fromiter((r["id"] for r in orden), np.int64, len(orden))
+        self.empleado = np.fromiter((r["empleado_id"] or 0 for r in orden), np.int64, len(orden))
+        self.tipo     = np.fromiter((self.tipos[r["tipo"]] for r in orden), np.int32, len(orden))
+        self.ini      = np.fromiter((_ordinal(r["fecha_inicio"]) for r in orden), np.int32, len(orden))
+        self.fin      = np.maximum(
+            np.fromiter((_ordinal(r["fecha_fin"]) for r in orden), np.int32, len(orden)), self.ini)
+        abierta       = self.fin == FIN_ABIERTO
+        self.abiertas = np.flatnonzero(abierta)       # posiciones, en orden de inicio
+        cerradas      = self.fin[~abierta] - self.ini[~abierta]
+        self.max_dias = int(cerradas.max()) if len(cerradas) else 0
+
+
+class IndiceAusencias:
+    """Índice por intervalos de fechas sobre la tabla `ausencias`."""
+
+    def __init__(self):
+        self._lock        = threading.Lock()
+        self._datos       = _Datos({}, [])
+        self._cambio      = None        # último id de ausencias_cambios aplicado
+        self._horizonte   = None        # desde qué xid hay que releer cambios
+        self._version     = None
+        self._comprobado  = 0.0
+
+    # ── Carga ──
+    def _cargar(self, marca: dict):
+        filas = {r["id"]: r for r in query(SQL_CARGA)}
+        self._publicar(filas, marca["ultimo"])
+
+    def _publicar(self, filas: dict, cambio: int):
+        tipos = sorted({r["tipo"] for r in filas.values()}, key=lambda t: (t is None, t or ""))
+        self._datos  = _Datos(filas, tipos)
+        self._cambio = cambio
+
+    def refrescar(self, version=None, forzar: bool = False):
+        """Aplica los cambios pendientes si ha cambiado `version` o toca comprobar."""
+        ahora = time.monotonic()
+        if not forzar and version == self._version and ahora - self._comprobado < REFRESCO_SEG:
+            return
+        with self._lock:
+            if not forzar and version == self._version and \
+                    ahora - self._comprobado < REFRESCO_SEG:
+                return
+            marca = query(SQL_MARCA)
+            if not marca:
+                return                         # la BD no responde: se reintenta luego
+            marca = marca[0]
+            if self._horizonte is None or forzar or marca["primero"] > self._cambio + 1:
+                self._cargar(marca)            # primera vez o cambios ya purgados
+            else:
+                cambios = query(SQL_CAMBIOS, (self._horizonte,))
+                if cambios:
+                    filas = dict(self._datos.filas)
+                    for r in cambios:
+                        filas.pop(r["ausencia_id"], None)
+                        if r["id"] is not None:
+                            filas[r["id"]] = {k: r[k] for k in r
+                                              if k not in ("ausencia_id", "ultimo")}
+                    self._publicar(filas, max(self._cambio, *(r["ultimo"] for r in cambios)))
+            # Las transacciones anteriores al horizonte ya se ven enteras; las
+            # demás se vuelven a leer en el siguiente refresco
+            self._horizonte  = marca["horizonte"]
+            self._version    = version
+            self._comprobado = ahora
+
+    # ── Consultas ──
+    def _posiciones(self, d: _Datos, desde: datetime.date, hasta: datetime.date = None,
+                    tipo: str = None, empleado_id: int = None) -> np.ndarray:
+        a = _ordinal(desde)
+        b = _ordinal(hasta) if hasta else a
+        lo = np.searchsorted(d.ini, a - d.max_dias, "left")
+        hi = np.searchsorted(d.ini, b, "right")
+        # Las abiertas que empiezan antes del tramo también solapan
+        previas = d.abiertas[:np.searchsorted(d.abiertas, lo)]
+        pos = np.concatenate([previas, np.arange(lo, hi)]) if len(previas) else np.arange(lo, hi)
+        mascara = d.fin[pos] >= a
+        if tipo is not None:
+            if tipo not in d.tipos:
+                return np.empty(0, np.int64)
+            mascara &= d.tipo[pos] == d.tipos[tipo]
+        if empleado_id is not None:
+            mascara &= d.empleado[pos] == empleado_id
+        return pos[mascara]
+
+    def ausentes(self, desde: datetime.date, hasta: datetime.date = None,
+                 tipo: str = None) -> set:
+        """Ids de empleado ausentes el día `desde` (o algún día de [desde, hasta])."""
+        d = self._datos
+        return set(d.empleado[self._posiciones(d, desde, hasta, tipo)].tolist())
+
+    def contar(self, desde: datetime.date, hasta: datetime.date = None,
+               tipo: str = None) -> int:
+        """Número de ausencias que solapan con [desde, hasta]."""
+        d = self._datos
+        return len(self._posiciones(d, desde, hasta, tipo))
+
+    def registros(self, desde: datetime.date, hasta: datetime.date = None,
+                  tipo: str = None, empleado_id: int = None) -> list:
+        """Filas de `ausencias` que solapan con [desde, hasta], la más reciente primero."""
+        d = self._datos
+        pos = self._posiciones(d, desde, hasta, tipo, empleado_id)[::-1]
+        return [dict(d.filas[i]) for i in d.id[pos].tolist()]
+
+    def matriz(self, empleado_ids, desde: datetime.date, hasta: datetime.date,
+               tipo: str = None) -> np.ndarray:
+        """Matriz bool (empleado × día) de [desde, hasta] con True si está ausente.
+
+        Las filas siguen el orden de `empleado_ids`.
+        """
+        d = self._datos
+        empleado_ids = np.asarray(list(empleado_ids), np.int64)
+        n_dias = (hasta - desde).days + 1
+        if n_dias <= 0 or not len(empleado_ids):
+            return np.zeros((len(empleado_ids), max(n_dias, 0)), bool)
+        pos = self._posiciones(d, desde, hasta, tipo)
+        orden = np.argsort(empleado_ids, kind="stable")
+        fila = np.searchsorted(empleado_ids, d.empleado[pos], sorter=orden)
+        fila = np.minimum(fila, len(empleado_ids) - 1)
+        fila = orden[fila]
+        valida = empleado_ids[fila] == d.empleado[pos]
+        base = _ordinal(desde)
+        ini = np.maximum(d.ini[pos], base) - base
+        fin = np.minimum(d.fin[pos], _ordinal(hasta)) - base + 1
+        # Suma de diferencias: +1 al empezar, -1 al día siguiente de acabar
+        delta = np.zeros((len(empleado_ids), n_dias + 1), np.int32)
+        np.add.at(delta, (fila[valida], ini[valida]), 1)
+        np.add.at(delta, (fila[valida], fin[valida]), -1)
+        return np.cumsum(delta[:, :-1], axis=1) > 0
+
+    def estado(self) -> dict:
+        d = self._datos
+        return {"ausencias": len(d.id), "abiertas": len(d.abiertas), "max_dias": d.max_dias,
+                "cambio": self._cambio, "horizonte": self._horizonte}
+
+
+@st.cache_resource(show_spinner=False)
+def get_indice() -> IndiceAusencias:
+    return IndiceAusencias()
+
+
+def indice_ausencias() -> IndiceAusencias:
+    """Índice compartido, al día con las escrituras de este proceso."""
+    indice = get_indice()
+    indice.refrescar(get_query_cache().version(("ausencias",)))
+    return indice
@@ -0,0 +1,170 @@
+"""utils_auth.py — Directorio de usuarios en memoria y verificación de contraseñas.
+
+Los usuarios se cargan una vez en un dict por nombre y se recargan solo
+cuando cambia `data/usuarios.csv` (o cada RECARGA_DB s si vienen de la
+tabla `usuarios`). Las contraseñas nuevas se guardan con PBKDF2-SHA256 y
+sal; se siguen aceptando las antiguas en claro o en SHA-256.
+
+Para generar el hash de una contraseña:  python utils_auth.py <contraseña>
+"""
+import csv
+import hashlib
+import hmac
+import math
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+USUARIOS_CSV    = Path("data/usuarios.csv")
+KDF_ITERACIONES = 200_000
+MAX_FALLOS      = 5        # intentos fallidos seguidos antes de bloquear
+BLOQUEO_SEG     = 60       # duración del bloqueo por usuario y cliente
+OLVIDO_SEG      = 15 * 60  # sin fallos en este tiempo se olvida el contador
+MAX_CLAVES      = 10_000   # tope de (usuario, cliente) con fallos en memoria
+RECARGA_DB      = 60       # segundos entre recargas desde la tabla usuarios
+
+USUARIO_DEFECTO = {"admin": {"password": "admin", "rol": "admin"}}
+
+
+def hash_password(password: str, iteraciones: int = KDF_ITERACIONES, salt: bytes = None) -> str:
+    salt = salt or os.urandom(16)
+    dk = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iteraciones)
+    return f"pbkdf2_sha256${iteraciones}${salt.hex()}${dk.hex()}"
+
+
+def verificar_password(password: str, almacenado: str) -> bool:
+    if almacenado.startswith("pbkdf2_sha256$"):
+        try:
+            _, it, salt, dk = almacenado.split("$")
+            calc = hashlib.pbkdf2_hmac("sha256", password.encode(),
+                                       bytes.fromhex(salt), int(it))
+        except ValueError:
+            return False
+        return hmac.compare_digest(calc.hex(), dk)
+    if len(almacenado) == 64:
+        sha = hashlib.sha256(password.encode()).hexdigest()
+        if hmac.compare_digest(sha, almacenado):
+            return True
+    return hmac.compare_digest(password.encode(), almacenado.encode())
+
+
+def necesita_rehash(almacenado: str, iteraciones: int) -> bool:
+    if not almacenado.startswith("pbkdf2_sha256$"):
+        return True
+    return almacenado.split("$")[1] != str(iteraciones)
+
+
+def leer_csv(ruta: Path) -> dict:
+    for enc in ("utf-8-sig", "utf-8", "latin1"):
+        try:
+            with open(ruta, newline="", encoding=enc) as f:
+                return {
+                    (r.get("username") or "").strip(): {
+                        "password": (r.get("password") or "").strip(),
+                        "rol": (r.get("rol") or "").strip(),
+                    }
+                    for r in csv.DictReader(f) if (r.get("username") or "").strip()
+                }
+        except (UnicodeDecodeError, csv.Error):
+            continue
+    return dict(USUARIO_DEFECTO)
+
+
+class DirectorioUsuarios:
+    """Usuarios indexados por nombre, con bloqueo temporal tras varios fallos.
+
+    El bloqueo va por (usuario, cliente): quien falla la contraseña de otro
+    no impide que el titular entre desde su propio navegador.
+
+    `cargar_db` (opcional) devuelve {username: {"password", "rol"}} desde BD
+    y `guardar_hash(username, hash)` actualiza el hash al subir iteraciones.
+    """
+
+    def __init__(self, ruta: Path = USUARIOS_CSV, cargar_db=None, guardar_hash=None,
+                 iteraciones: int = KDF_ITERACIONES):
+        self.ruta         = Path(ruta)
+        self.cargar_db    = cargar_db
+        self.guardar_hash = guardar_hash
+        self.iteraciones  = iteraciones
+        self._lock        = threading.Lock()
+        self._usuarios    = {}
+        self._version     = None
+        self._fallos      = {}     # (username, cliente) -> (nº fallos, bloqueado hasta, último)
+        self._ficticio    = hash_password("-", iteraciones)
+
+    def _refrescar(self):
+        if self.cargar_db:
+            version = int(time.monotonic() // RECARGA_DB)
+        else:
+            try:
+                version = self.ruta.stat().st_mtime_ns
+            except FileNotFoundError:
+                version = 0
+        if version == self._version:
+            return
+        if self.cargar_db:
+            usuarios = self.cargar_db()
+        elif version:
+            usuarios = leer_csv(self.ruta)
+        else:
+            usuarios = dict(USUARIO_DEFECTO)
+        with self._lock:
+            self._usuarios = usuarios
+            self._version  = version
+
+    def get(self, username: str):
+        self._refrescar()
+        return self._usuarios.get(username.strip())
+
+    def segundos_bloqueo(self, username: str, cliente: str = "") -> int:
+        _, hasta, _ = self._fallos.get((username.strip(), cliente), (0, 0.0, 0.0))
+        return max(0, math.ceil(hasta - time.monotonic()))
+
+    def _fallo(self, clave: tuple):
+        ahora = time.monotonic()
+        with self._lock:
+            # Se reinserta al final: el dict queda ordenado por último fallo
+            n, _, _ = self._fallos.pop(clave, (0, 0.0, 0.0))
+            n += 1
+            hasta = ahora + BLOQUEO_SEG if n >= MAX_FALLOS else 0.0
+            self._fallos[clave] = (0 if hasta else n, hasta, ahora)
+            # Los más antiguos van primero: fuera los olvidados y lo que pase del tope
+            while self._fallos:
+                primera = next(iter(self._fallos))
+                if len(self._fallos) <= MAX_CLAVES and \
+                        self._fallos[primera][2] > ahora - OLVIDO_SEG:
+                    break
+                del self._fallos[primera]
+
+    def verificar(self, username: str, password: str, cliente: str = ""):
+        """(True, rol) si las credenciales son válidas; (False, None) si no.
+
+        `cliente` identifica el origen del intento (IP o sesión) para el bloqueo.
+        """
+        username = username.strip()
+        clave = (username, cliente)
+        if self.segundos_bloqueo(username, cliente):
+            return False, None
+        user = self.get(username)
+        if user is None:
+            verificar_password(password, self._ficticio)   # mismo coste que un usuario real
+            self._fallo(clave)
+            return False, None
+        if not verificar_password(password, user["password"]):
+            self._fallo(clave)
+            return False, None
+        with self._lock:
+            self._fallos.pop(clave, None)
+        if self.guardar_hash and necesita_rehash(user["password"], self.iteraciones):
+            nuevo = hash_password(password, self.iteraciones)
+            self.guardar_hash(username, nuevo)
+            user["password"] = nuevo
+        return True, user["rol"]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit("Uso: python utils_auth.py <contraseña>")
+    print(hash_password(sys.argv[1]))
@@ -0,0 +1,69 @@
+"""utils_busqueda.py — Búsqueda sin acentos de empleados y vehículos, por relevancia.
+
+Usa los índices GIN de trigramas que crea la migración `busqueda`
+(utils_schema) y sus funciones `busqueda_parecido` / `busqueda_relevancia`,
+que llaman a pg_trgm por su esquema aunque no esté en el search_path. Si
+no se pudo aplicar se vuelve al ILIKE de siempre.
+"""
+from utils import query, ensure_schema
+
+BUSQUEDA_LIMITE = 50
+
+DOCUMENTO = {
+    "empleados": "texto_busqueda(nombre, apellidos, dni)",
+    "vehiculos": "texto_busqueda(matricula, marca, modelo)",
+}
+CAMPOS = {
+    "empleados": ("nombre", "apellidos", "dni"),
+    "vehiculos": ("matricula", "marca", "modelo"),
+}
+ORDEN = {
+    "empleados": "apellidos, nombre, id",
+    "vehiculos": "matricula, id",
+}
+
+
+def disponible() -> bool:
+    return ensure_schema().get("busqueda") == "ok"
+
+
+def _escapar_like(texto: str) -> str:
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def buscar(tabla: str, termino: str, where=(), params=(),
+           limite: int = BUSQUEDA_LIMITE, ttl: float = None) -> list:
+    """Filas de `tabla` que contienen `termino` (o se le parecen), mejor primero.
+
+    "pena" encuentra "Peña"; los errores de una letra se recuperan por
+    similitud de trigramas. Como mucho `limite` filas.
+    """
+    termino = termino.strip()
+    if not disponible():
+        ilike = "(" + " OR ".join(f"{c} ILIKE %s" for c in CAMPOS[tabla]) + ")"
+        conds = [ilike] + list(where)
+        sql = (f"SELECT * FROM {tabla} WHERE {' AND '.join(conds)} "
+               f"ORDER BY {ORDEN[tabla]} LIMIT %s")
+        patron = f"%{_escapar_like(termino)}%"
+        return query(sql, [patron] * len(CAMPOS[tabla]) + list(params) + [limite], ttl=ttl)
+
+    doc   = DOCUMENTO[tabla]
+    conds = [f"({doc} LIKE '%%' || texto_busqueda(%s) || '%%' "
+             f"OR busqueda_parecido(texto_busqueda(%s), {doc}))"] + list(where)
+    sql = f"""
+        SELECT *, busqueda_relevancia(texto_busqueda(%s), {doc}) AS relevancia
+        FROM {tabla}
+        WHERE {' AND '.join(conds)}
+        ORDER BY relevancia DESC, {ORDEN[tabla]}
+        LIMIT %s
+    """
+    return query(sql, [termino, _escapar_like(termino), termino]
+                 + list(params) + [limite], ttl=ttl)
+
+
+def buscar_empleados(termino: str, where=(), params=(), limite: int = BUSQUEDA_LIMITE):
+    return buscar("empleados", termino, where, params, limite)
+
+
+def buscar_vehiculos(termino: str, where=(), params=(), limite: int = BUSQUEDA_LIMITE):
+    return buscar("vehiculos", termino, where, params, limite, ttl=300)
@@ -0,0 +1,114 @@
+"""utils_cache.py — Caché compartida de resultados de consultas (TTL + LRU).
+
+Las entradas se etiquetan con las tablas que lee cada SELECT; una escritura
+sobre una tabla invalida todas las entradas que la mencionan.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+
+TABLAS = ("empleados", "vehiculos", "servicios", "ausencias", "checkins_vehiculo",
+          "checkins_fotos", "checkins_ultimo", "dashboard_resumen", "vencimientos")
+
+# Tablas mantenidas por triggers: escribir en la clave cambia también las derivadas
+DERIVADAS = {
+    "empleados": ("dashboard_resumen",),
+    "vehiculos": ("dashboard_resumen", "vencimientos", "checkins_ultimo"),
+    "servicios": ("dashboard_resumen",),
+    "checkins_vehiculo": ("checkins_ultimo",),
+}
+
+_RE_TABLAS = re.compile(r"\b(" + "|".join(TABLAS) + r")\b", re.IGNORECASE)
+
+
+def tablas_de(sql: str) -> frozenset:
+    """Tablas conocidas que aparecen en la sentencia."""
+    return frozenset(t.lower() for t in _RE_TABLAS.findall(sql))
+
+
+def con_derivadas(tablas) -> set:
+    tablas = set(tablas)
+    for t in list(tablas):
+        tablas.update(DERIVADAS.get(t, ()))
+    return tablas
+
+
+def _hashable(valor):
+    if isinstance(valor, (list, tuple)):
+        return tuple(_hashable(v) for v in valor)
+    if isinstance(valor, dict):
+        return tuple(sorted((k, _hashable(v)) for k, v in valor.items()))
+    if isinstance(valor, set):
+        return tuple(sorted(valor))
+    return valor
+
+
+def clave(sql: str, params=None):
+    return " ".join(sql.split()), _hashable(params)
+
+
+class QueryCache:
+    """LRU acotada por número de entradas con caducidad por entrada (el `ttl`
+    que pasa quien la llena; no hay caducidad por defecto).
+
+    Cada tabla lleva un contador de versión: un resultado leído mientras otra
+    sesión escribía en la misma tabla no llega a guardarse.
+    """
+
+    def __init__(self, max_entradas: int = 512):
+        self.max_entradas = max_entradas
+        self._lock    = threading.Lock()
+        self._datos   = OrderedDict()   # clave -> (caduca, tablas, filas)
+        self._version = {}              # tabla -> nº de invalidaciones
+        self._stats   = {"hits": 0, "misses": 0, "invalidadas": 0, "expulsadas": 0}
+
+    def version(self, tablas) -> tuple:
+        with self._lock:
+            return tuple(self._version.get(t, 0) for t in sorted(tablas))
+
+    def get(self, k):
+        with self._lock:
+            item = self._datos.get(k)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._datos[k]
+                self._stats["misses"] += 1
+                return None
+            self._datos.move_to_end(k)
+            self._stats["hits"] += 1
+            return item[2]
+
+    def put(self, k, tablas, filas, version: tuple, ttl: float):
+        with self._lock:
+            if tuple(self._version.get(t, 0) for t in sorted(tablas)) != version:
+                return
+            self._datos[k] = (time.monotonic() + ttl, tablas, filas)
+            self._datos.move_to_end(k)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+                self._stats["expulsadas"] += 1
+
+    def invalidar(self, tablas):
+        tablas = con_derivadas(tablas)
+        if not tablas:
+            return
+        with self._lock:
+            for t in tablas:
+                self._version[t] = self._version.get(t, 0) + 1
+            fuera = [k for k, (_, ts, _) in self._datos.items() if ts & tablas]
+            for k in fuera:
+                del self._datos[k]
+            self._stats["invalidadas"] += len(fuera)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def estado(self) -> dict:
+        with self._lock:
+            s = dict(self._stats)
+            s["entradas"] = len(self._datos)
+        total = s["hits"] + s["misses"]
+        s["hit_rate"] = round(s["hits"] / total, 3) if total else 0.0
+        return s
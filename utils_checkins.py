@@ -0,0 +1,153 @@
+"""utils_checkins.py — Puntos del check-in y consultas de defectos en la flota.
+
+El estado de cada check-in se guarda en `checkins_vehiculo.estado_json`
+(JSONB, {punto: opción}) con una columna `gravedad` calculada por la BD:
+0 todo correcto, 1 algo a revisar, 2 algún defecto (ver utils_schema).
+Las preguntas del tipo "¿qué vehículos tienen ❌ Defecto en frenos?" se
+resuelven en SQL: por contención (@>) con el índice GIN para un punto
+concreto y con el índice parcial de gravedad > 0 para "cualquier punto".
+
+Lo que se refiere al estado actual de la flota se lee de `checkins_ultimo`,
+una fila por vehículo con su último check-in que mantiene un trigger.
+"""
+import datetime
+import json
+
+from psycopg2.extras import Json
+
+from utils import query
+
+CHECKLIST_ITEMS = [
+    ("carroceria",    "🚗 Carrocería exterior"),
+    ("ruedas",        "🔧 Ruedas y neumáticos"),
+    ("luces",         "💡 Luces delanteras y traseras"),
+    ("cristales",     "🪟 Cristales y espejos"),
+    ("interior",      "💺 Interior y limpieza"),
+    ("frenos",        "🛑 Frenos"),
+    ("nivel_aceite",  "🛢️ Nivel de aceite"),
+    ("documentacion", "📄 Documentación en vehículo"),
+]
+ITEMS = dict(CHECKLIST_ITEMS)
+
+ESTADO_OPTS = ["✅ Correcto", "⚠️ Revisar", "❌ Defecto"]
+
+# Nombre corto -> opción guardada, y gravedad de cada opción (igual que checkin_gravedad)
+ESTADOS  = {"correcto": ESTADO_OPTS[0], "revisar": ESTADO_OPTS[1], "defecto": ESTADO_OPTS[2]}
+GRAVEDAD = {opcion: i for i, opcion in enumerate(ESTADO_OPTS)}
+
+_VEHICULO = "x.id AS vehiculo_id, x.matricula, x.marca, x.modelo"
+
+# Último check-in de cada vehículo (tabla de estado)
+SQL_ACTUALES = f"""
+    SELECT {_VEHICULO}, c.checkin_id, c.fecha, c.responsable, c.estado_json, c.gravedad
+    FROM checkins_ultimo c
+    JOIN vehiculos x ON x.id = c.vehiculo_id
+"""
+
+SQL_HISTORICO = f"""
+    SELECT {_VEHICULO}, c.id AS checkin_id, c.fecha, c.responsable, c.estado_json, c.gravedad
+    FROM checkins_vehiculo c
+    JOIN vehiculos x ON x.id = c.vehiculo_id
+"""
+
+# Toda la flota, también los vehículos que nunca han pasado check-in
+SQL_FLOTA = f"""
+    SELECT {_VEHICULO}, c.checkin_id, c.fecha, c.responsable, c.estado_json, c.gravedad,
+           CURRENT_DATE - c.fecha AS dias
+    FROM vehiculos x
+    LEFT JOIN checkins_ultimo c ON c.vehiculo_id = x.id
+"""
+
+
+def estado_de(fila: dict) -> dict:
+    """{punto: opción} de una fila de checkins_vehiculo (JSONB o texto antiguo)."""
+    est = fila.get("estado_json")
+    if isinstance(est, str):
+        try:
+            est = json.loads(est)
+        except ValueError:
+            est = None
+    return est if isinstance(est, dict) else {}
+
+
+def estado_json(estado: dict) -> Json:
+    """Parámetro para guardar el estado en la columna JSONB."""
+    return Json(estado)
+
+
+def _filtro(item: str, estado: str):
+    """Condición SQL y parámetros para "`item` en `estado`" (o cualquier punto)."""
+    opcion = ESTADOS.get(estado, estado)
+    if opcion not in GRAVEDAD:
+        raise ValueError(f"estado debe ser uno de {', '.join(ESTADOS)}")
+    if item is None:
+        if GRAVEDAD[opcion] == 0:
+            return "c.gravedad = 0", []
+        # El "> 0" deja usar el índice parcial también con planes genéricos
+        return "c.gravedad > 0 AND c.gravedad >= %s", [GRAVEDAD[opcion]]
+    if item not in ITEMS:
+        raise ValueError(f"Punto de check-in desconocido: {item}")
+    return "c.estado_json @> %s::jsonb", [json.dumps({item: opcion}, ensure_ascii=False)]
+
+
+def vehiculos_con(item: str = None, estado: str = "defecto", ttl: float = 60) -> list:
+    """Vehículos cuyo último check-in tiene `estado` en `item`.
+
+    Sin `item`, los que tienen al menos esa gravedad en algún punto
+    ("revisar" incluye también los defectos). Los más graves primero.
+    """
+    cond, params = _filtro(item, estado)
+    return query(SQL_ACTUALES + f" WHERE {cond} ORDER BY c.gravedad DESC, c.fecha, x.matricula",
+                 tuple(params), ttl=ttl)
+
+
+def checkins_con(item: str = None, estado: str = "defecto", desde: datetime.date = None,
+                 hasta: datetime.date = None, vehiculo_id: int = None,
+                 limite: int = 500, ttl: float = 60) -> list:
+    """Check-ins (no solo el último) con `estado` en `item`, el más reciente primero."""
+    cond, params = _filtro(item, estado)
+    where = [cond]
+    if desde:
+        where.append("c.fecha >= %s")
+        params.append(desde)
+    if hasta:
+        where.append("c.fecha <= %s")
+        params.append(hasta)
+    if vehiculo_id is not None:
+        where.append("c.vehiculo_id = %s")
+        params.append(vehiculo_id)
+    params.append(limite)
+    return query(SQL_HISTORICO + " WHERE " + " AND ".join(where)
+                 + " ORDER BY c.fecha DESC, c.id DESC LIMIT %s", tuple(params), ttl=ttl)
+
+
+def flota(ttl: float = 60) -> list:
+    """Una fila por vehículo con su último check-in (None si no tiene), la
+    gravedad y los días desde la última inspección."""
+    return query(SQL_FLOTA + " ORDER BY c.gravedad DESC NULLS FIRST, c.fecha NULLS FIRST, "
+                 "x.matricula", ttl=ttl)
+
+
+def incidencias(fila: dict) -> list:
+    """[(punto, opción)] de los puntos que no están correctos, los defectos primero."""
+    est = estado_de(fila)
+    malos = [(k, v) for k, v in est.items() if GRAVEDAD.get(v, 0) > 0]
+    return sorted(malos, key=lambda kv: -GRAVEDAD[kv[1]])
+
+
+def resumen_puntos(ttl: float = 60) -> list:
+    """Por punto del checklist, cuántos vehículos tienen a revisar o con defecto
+    en su último check-in."""
+    filas = query(f"""
+        SELECT p.key AS item,
+               COUNT(*) FILTER (WHERE p.value = to_jsonb(%s::text)) AS revisar,
+               COUNT(*) FILTER (WHERE p.value = to_jsonb(%s::text)) AS defecto
+        FROM ({SQL_ACTUALES} WHERE c.gravedad > 0) a
+        CROSS JOIN LATERAL jsonb_each(a.estado_json) p
+        GROUP BY p.key
+    """, (ESTADOS["revisar"], ESTADOS["defecto"]), ttl=ttl)
+    por_item = {f["item"]: f for f in filas}
+    return [{"item": k, "label": label,
+             "revisar": por_item.get(k, {}).get("revisar", 0),
+             "defecto": por_item.get(k, {}).get("defecto", 0)}
+            for k, label in CHECKLIST_ITEMS]
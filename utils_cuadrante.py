@@ -0,0 +1,201 @@
+"""utils_cuadrante.py — Cuadrante diario: quién conduce qué cada día.
+
+Cada servicio se expande a un turno por día según `dias_servicio`. Si el
+conductor base está ausente (índice de utils_ausencias), inactivo o no
+existe, se propone un sustituto entre los empleados activos que ese día
+no estén ausentes ni tengan otro turno que se solape.
+
+Los horarios se representan como bitsets de franjas de FRANJA_MIN minutos
+(dos uint64 por día) y la ocupación de la plantilla como un array
+empleado × día × palabra, así que comprobar solapes para toda la
+plantilla es un AND vectorizado por turno a cubrir.
+"""
+import datetime
+import re
+import unicodedata
+
+import numpy as np
+
+from utils import query
+from utils_ausencias import indice_ausencias
+
+FRANJA_MIN = 15
+FRANJAS    = 24 * 60 // FRANJA_MIN          # 96 franjas -> 2 palabras de 64 bits
+PALABRAS   = (FRANJAS + 63) // 64
+
+DIAS_SEMANA  = "LMXJVSD"                   # lunes = bit 0
+DIAS_DEFECTO = 0b0011111                   # L-V si `dias_servicio` está vacío
+
+SQL_SERVICIOS = """
+    SELECT id, codigo, descripcion, horario_inicio, horario_fin, dias_servicio,
+           empleado_base_id, vehiculo_base_id
+    FROM servicios ORDER BY id
+"""
+SQL_EMPLEADOS = "SELECT id, activo FROM empleados"
+SQL_VEHICULOS = "SELECT id, itv_vigente_hasta, seguro_vigente_hasta FROM vehiculos"
+
+_NOMBRES_DIA = {"lunes": "L", "martes": "M", "miercoles": "X", "jueves": "J",
+                "viernes": "V", "sabado": "S", "domingo": "D"}
+
+
+# ─────────────────────────────────────────────
+# DÍAS Y HORARIOS
+# ─────────────────────────────────────────────
+def mascara_dias(texto: str) -> int:
+    """'L-V', 'L,X,V', 'Lunes a viernes', 'todos'… → máscara de 7 bits (lunes = bit 0)."""
+    if not texto or not texto.strip():
+        return DIAS_DEFECTO
+    t = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode().lower()
+    if t.strip() in ("todos", "diario", "l-d"):
+        return 0b1111111
+    for nombre, letra in _NOMBRES_DIA.items():
+        t = t.replace(nombre, letra.lower())
+    t = re.sub(r"\s+a\s+", "-", t)
+    mascara = 0
+    for parte in re.split(r"[,;/\s]+", t.upper()):
+        if "-" in parte:
+            ini, _, fin = parte.partition("-")
+            if ini in DIAS_SEMANA and fin in DIAS_SEMANA and ini and fin:
+                a, b = DIAS_SEMANA.index(ini), DIAS_SEMANA.index(fin)
+                for i in range(a, b + 1) if a <= b else [*range(a, 7), *range(0, b + 1)]:
+                    mascara |= 1 << i
+        elif len(parte) == 1 and parte in DIAS_SEMANA:
+            mascara |= 1 << DIAS_SEMANA.index(parte)
+    return mascara or DIAS_DEFECTO
+
+
+def _minutos(t) -> int:
+    return t.hour * 60 + t.minute if t is not None else None
+
+
+def franjas(inicio, fin) -> np.ndarray:
+    """Bitset (PALABRAS uint64) de las franjas que ocupa [inicio, fin).
+
+    Sin horario se considera el día entero; si `fin` <= `inicio` el turno
+    cruza la medianoche y se marca hasta el final del día y desde el inicio.
+    """
+    a, b = _minutos(inicio), _minutos(fin)
+    bits = np.zeros(FRANJAS, bool)
+    if a is None or b is None:
+        bits[:] = True
+    elif b > a:
+        bits[a // FRANJA_MIN:-(-b // FRANJA_MIN)] = True
+    else:
+        bits[a // FRANJA_MIN:] = True
+        bits[:-(-b // FRANJA_MIN)] = True
+    palabras = np.zeros(PALABRAS * 64, bool)
+    palabras[:FRANJAS] = bits
+    return np.packbits(palabras, bitorder="little").view(np.uint64)
+
+
+# ─────────────────────────────────────────────
+# MOTOR
+# ─────────────────────────────────────────────
+def resolver(servicios: list, empleados: list, vehiculos: list, ausencias,
+             desde: datetime.date, hasta: datetime.date) -> dict:
+    """Cuadrante de [desde, hasta] a partir de filas ya cargadas.
+
+    `ausencias(ids, desde, hasta)` devuelve la matriz bool empleado × día
+    (IndiceAusencias.matriz). Devuelve {"turnos": [...], "sin_cubrir": n,
+    "sustituciones": n}; cada turno es un dict con fecha, servicio, horario,
+    conductor base, conductor asignado, motivo de la sustitución y estado
+    del vehículo.
+    """
+    n_dias = (hasta - desde).days + 1
+    if n_dias <= 0 or not servicios:
+        return {"turnos": [], "sin_cubrir": 0, "sustituciones": 0}
+    fechas  = [desde + datetime.timedelta(days=i) for i in range(n_dias)]
+    semana  = np.array([f.weekday() for f in fechas])
+
+    # Empleados: activos primero; los base inactivos también necesitan fila
+    activos = {e["id"] for e in empleados if e.get("activo")}
+    ids     = sorted({e["id"] for e in empleados}
+                     | {s["empleado_base_id"] for s in servicios if s["empleado_base_id"]})
+    fila    = {e: i for i, e in enumerate(ids)}
+    ids_np  = np.array(ids, np.int64)
+    libre   = ~ausencias(ids, desde, hasta) if ids else np.zeros((0, n_dias), bool)
+    libre  &= np.isin(ids_np, list(activos))[:, None]
+
+    # Servicios × día
+    n_srv   = len(servicios)
+    dias    = np.array([mascara_dias(s["dias_servicio"]) for s in servicios], np.int64)
+    activo  = ((dias[:, None] >> semana[None, :]) & 1).astype(bool)
+    bits    = np.stack([franjas(s["horario_inicio"], s["horario_fin"]) for s in servicios])
+    base    = np.array([fila.get(s["empleado_base_id"], -1) for s in servicios])
+    base_ok = np.zeros((n_srv, n_dias), bool)
+    tiene   = base >= 0
+    base_ok[tiene] = libre[base[tiene]]
+    base_ok &= activo
+
+    # Ocupación de la plantilla con sus propios turnos
+    ocupado = np.zeros((len(ids), n_dias, PALABRAS), np.uint64)
+    s_idx, d_idx = np.nonzero(base_ok)
+    np.bitwise_or.at(ocupado, (base[s_idx], d_idx), bits[s_idx])
+    carga   = np.zeros(len(ids), np.int64)
+    np.add.at(carga, base[s_idx], 1)
+
+    # Turnos sin conductor, por día y hora de inicio
+    elegible = np.isin(ids_np, list(activos))
+    huecos   = np.argwhere(activo & ~base_ok)
+    inicio   = np.array([_minutos(s["horario_inicio"]) or 0 for s in servicios])
+    huecos   = huecos[np.lexsort((inicio[huecos[:, 0]], huecos[:, 1]))] if len(huecos) else huecos
+    asignado = {}
+    for s, d in huecos.tolist():
+        compatible = libre[:, d] & elegible & \
+            ~np.any(ocupado[:, d, :] & bits[s], axis=1)
+        if base[s] >= 0:
+            compatible[base[s]] = False
+        if compatible.any():
+            cand = np.flatnonzero(compatible)
+            c = cand[np.argmin(carga[cand])]                 # el menos cargado
+            ocupado[c, d] |= bits[s]
+            carga[c] += 1
+            asignado[(s, d)] = int(ids_np[c])
+
+    # Vehículos: ITV o seguro caducados ese día
+    veh = {v["id"]: v for v in vehiculos}
+
+    def estado_vehiculo(vid, fecha):
+        v = veh.get(vid)
+        if v is None:
+            return "sin vehículo"
+        if v.get("itv_vigente_hasta") and v["itv_vigente_hasta"] < fecha:
+            return "ITV caducada"
+        if v.get("seguro_vigente_hasta") and v["seguro_vigente_hasta"] < fecha:
+            return "seguro caducado"
+        return "ok"
+
+    turnos, sin_cubrir = [], 0
+    for d, s in zip(*np.nonzero(activo.T)):
+        srv = servicios[s]
+        b   = srv["empleado_base_id"]
+        if base_ok[s, d]:
+            conductor, motivo = b, None
+        else:
+            conductor = asignado.get((s, d))
+            if b is None or base[s] < 0:
+                motivo = "sin conductor base"
+            elif b not in activos:
+                motivo = "conductor inactivo"
+            else:
+                motivo = "ausencia"
+            sin_cubrir += conductor is None
+        turnos.append({
+            "fecha": fechas[d], "servicio_id": srv["id"], "codigo": srv["codigo"],
+            "horario_inicio": srv["horario_inicio"], "horario_fin": srv["horario_fin"],
+            "empleado_base_id": b, "empleado_id": conductor, "motivo": motivo,
+            "vehiculo_id": srv["vehiculo_base_id"],
+            "vehiculo_estado": estado_vehiculo(srv["vehiculo_base_id"], fechas[d]),
+        })
+    return {"turnos": turnos, "sin_cubrir": sin_cubrir, "sustituciones": len(asignado)}
+
+
+def cuadrante(desde: datetime.date, hasta: datetime.date) -> dict:
+    """Cuadrante de [desde, hasta] con los datos actuales de la BD (ver `resolver`)."""
+    return resolver(
+        query(SQL_SERVICIOS, ttl=300),
+        query(SQL_EMPLEADOS, ttl=300),
+        query(SQL_VEHICULOS, ttl=300),
+        indice_ausencias().matriz,
+        desde, hasta,
+    )
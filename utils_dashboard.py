@@ -0,0 +1,40 @@
+"""utils_dashboard.py — Instantánea del dashboard en una sola consulta."""
+import datetime
+
+from utils import query
+from utils_ausencias import indice_ausencias
+
+SNAPSHOT_SQL = """
+    SELECT r.empleados_activos, r.vehiculos, r.servicios,
+           (SELECT COALESCE(json_agg(x ORDER BY x.fecha_inicio DESC), '[]')
+            FROM (SELECT e.nombre, e.apellidos, a.tipo, a.fecha_inicio, a.fecha_fin
+                  FROM ausencias a
+                  JOIN empleados e ON e.id = a.empleado_id
+                  ORDER BY a.fecha_inicio DESC LIMIT 8) x
+           ) AS ausencias_recientes,
+           (SELECT COALESCE(json_agg(x ORDER BY x.itv_vigente_hasta), '[]')
+            FROM (SELECT x.matricula, x.marca, x.modelo,
+                         v.itv_hasta AS itv_vigente_hasta,
+                         (v.itv_hasta - CURRENT_DATE) AS dias
+                  FROM vencimientos v
+                  JOIN vehiculos x ON x.id = v.vehiculo_id
+                  WHERE v.itv_hasta >= CURRENT_DATE
+                  ORDER BY v.itv_hasta ASC LIMIT 6) x
+           ) AS itv_proximas
+    FROM dashboard_resumen r
+"""
+
+
+def dashboard_snapshot(ttl: float = 60) -> dict:
+    """KPIs y listas del dashboard. Dict vacío si la consulta falla.
+
+    Los contadores salen de `dashboard_resumen` (mantenida por triggers) y
+    las listas usan índices, así que el coste no crece con el histórico.
+    Las ausencias de hoy se cuentan en el índice en memoria.
+    """
+    rows = query(SNAPSHOT_SQL, ttl=ttl)
+    if not rows:
+        return {}
+    snap = dict(rows[0])
+    snap["ausencias_hoy"] = indice_ausencias().contar(datetime.date.today())
+    return snap
@@ -0,0 +1,125 @@
+"""utils_export.py — Exportación de listados a CSV comprimido o a Excel.
+
+Las filas se leen con un cursor de servidor (utils.query_stream) y se
+escriben según llegan en un fichero temporal: CSV dentro de gzip o XLSX
+con openpyxl en modo write-only, que no guarda la hoja en memoria. El
+botón de descarga solo genera el fichero cuando se pulsa y recibe sus bytes.
+"""
+import csv
+import datetime
+import gzip
+import io
+import tempfile
+
+import streamlit as st
+
+from utils import query_stream
+
+FORMATOS = {
+    "CSV (gzip)": ("csv.gz", "application/gzip"),
+    "Excel":      ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+# nombre -> (SELECT sin WHERE ni ORDER BY, ORDER BY, cabeceras)
+EXPORTACIONES = {
+    "ausencias": ("""
+        SELECT a.id, e.nombre || ' ' || e.apellidos AS empleado, e.dni, a.tipo,
+               a.fecha_inicio, a.fecha_fin, (a.fecha_fin - a.fecha_inicio + 1) AS dias,
+               a.observaciones
+        FROM ausencias a
+        JOIN empleados e ON e.id = a.empleado_id
+    """, "a.fecha_inicio DESC, a.id DESC",
+        ["ID", "Empleado", "DNI", "Tipo", "Inicio", "Fin", "Días", "Observaciones"]),
+    "empleados": ("""
+        SELECT e.id, e.nombre, e.apellidos, e.dni, e.telefono, e.email, e.activo,
+               (SELECT string_agg(s.codigo, ', ' ORDER BY s.codigo) FROM servicios s
+                WHERE s.empleado_base_id = e.id) AS servicios
+        FROM empleados e
+    """, "COALESCE(e.apellidos, ''), COALESCE(e.nombre, ''), e.id",
+        ["ID", "Nombre", "Apellidos", "DNI", "Teléfono", "Email", "Activo", "Servicios"]),
+    "servicios": ("""
+        SELECT s.codigo, s.descripcion, s.tipo_servicio, s.horario_inicio, s.horario_fin,
+               s.dias_servicio, e.nombre || ' ' || e.apellidos AS conductor, v.matricula
+        FROM servicios s
+        LEFT JOIN empleados e ON e.id = s.empleado_base_id
+        LEFT JOIN vehiculos v ON v.id = s.vehiculo_base_id
+    """, "s.codigo, s.id",
+        ["Código", "Descripción", "Tipo", "Inicio", "Fin", "Días", "Conductor base",
+         "Vehículo base"]),
+    "vehiculos": ("""
+        SELECT x.id, x.matricula, x.bastidor, x.marca, x.modelo, x.tipo,
+               x.itv_vigente_hasta, x.seguro_vigente_hasta, v.estado AS vencimientos,
+               x.aseguradora, x.poliza
+        FROM vehiculos x
+        LEFT JOIN vencimientos v ON v.vehiculo_id = x.id
+    """, "COALESCE(x.matricula, ''), x.id",
+        ["ID", "Matrícula", "Bastidor", "Marca", "Modelo", "Tipo", "ITV hasta",
+         "Seguro hasta", "Vencimientos", "Aseguradora", "Póliza"]),
+    "checkins": ("""
+        SELECT x.matricula, c.fecha, c.responsable, c.estado_json::text, c.observaciones,
+               (SELECT COUNT(*) FROM checkins_fotos f WHERE f.checkin_id = c.id) AS fotos
+        FROM checkins_vehiculo c
+        JOIN vehiculos x ON x.id = c.vehiculo_id
+    """, "c.fecha DESC, c.id DESC",
+        ["Matrícula", "Fecha", "Responsable", "Estado", "Observaciones", "Fotos"]),
+}
+
+
+def _celda(v):
+    """Valor apto para openpyxl (fechas y números tal cual, el resto como texto)."""
+    if v is None or isinstance(v, (str, int, float, bool, datetime.date, datetime.datetime)):
+        return v
+    if isinstance(v, datetime.time):
+        return v.strftime("%H:%M")
+    return str(v)
+
+
+def escribir(filas, cabeceras: list, formato: str, destino):
+    """Vuelca el iterable `filas` (secuencias) en el fichero binario `destino`."""
+    if formato == "xlsx":
+        from openpyxl import Workbook
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet()
+        ws.append(cabeceras)
+        for fila in filas:
+            ws.append([_celda(v) for v in fila])
+        wb.save(destino)
+        return
+    with gzip.GzipFile(fileobj=destino, mode="wb", compresslevel=6) as gz:
+        texto = io.TextIOWrapper(gz, encoding="utf-8-sig", newline="")
+        salida = csv.writer(texto, delimiter=";")
+        salida.writerow(cabeceras)
+        salida.writerows(filas)
+        texto.flush()
+        texto.detach()
+
+
+def exportar(nombre: str, formato: str, where=(), params=()) -> bytes:
+    """Bytes de la exportación `nombre` filtrada por `where`.
+
+    Se escribe primero en un fichero temporal, así solo el resultado
+    comprimido llega a la memoria.
+    """
+    sql, orden, cabeceras = EXPORTACIONES[nombre]
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {orden}"
+    with tempfile.TemporaryFile() as destino:
+        escribir(query_stream(sql, tuple(params), filas="tupla"), cabeceras, formato, destino)
+        destino.seek(0)
+        return destino.read()
+
+
+def boton_exportar(nombre: str, where=(), params=(), etiqueta: str = None):
+    """Selector de formato y botón que descarga la exportación al pulsarlo."""
+    c1, c2 = st.columns([1, 1.4])
+    fmt = c1.selectbox("Formato", list(FORMATOS), key=f"exp_fmt_{nombre}",
+                       label_visibility="collapsed")
+    ext, mime = FORMATOS[fmt]
+    where, params = tuple(where), tuple(params)
+    c2.download_button(
+        etiqueta or f"⬇️ Exportar {nombre}",
+        data=lambda: exportar(nombre, ext, where, params),
+        file_name=f"{nombre}_{datetime.date.today():%Y%m%d}.{ext}",
+        mime=mime, key=f"exp_{nombre}", on_click="ignore", use_container_width=True,
+    )
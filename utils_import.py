@@ -0,0 +1,310 @@
+"""utils_import.py — Importación masiva de empleados, vehículos y ausencias.
+
+El fichero (CSV o XLSX) se lee fila a fila: cada fila se valida y, si es
+correcta, se escribe como CSV en un fichero temporal que solo pasa a disco
+si crece (SpooledTemporaryFile). Al final todo se carga con un único COPY
+dentro de una transacción: o entran todas las filas válidas o ninguna.
+Las filas con errores no se cargan y se devuelven en el informe con su
+número de línea.
+"""
+import csv
+import datetime
+import io
+import re
+import tempfile
+import unicodedata
+
+import streamlit as st
+
+from utils import query, transaccion
+
+MAX_ERRORES_INFORME = 1000          # errores guardados en el informe (se cuentan todos)
+SPOOL_BYTES         = 8 * 1024 * 1024
+
+TIPOS_AUSENCIA = ["Vacaciones", "Baja médica", "Ausencia justificada",
+                  "Ausencia injustificada", "Otro"]
+TIPOS_VEHICULO = ["renting", "propiedad"]
+
+# columna -> (tipo, obligatoria, alias aceptados en la cabecera)
+COLUMNAS = {
+    "empleados": {
+        "nombre":    ("texto", True, ()),
+        "apellidos": ("texto", True, ("apellido",)),
+        "dni":       ("texto", True, ("nif", "nie")),
+        "telefono":  ("texto", False, ("tel", "movil")),
+        "email":     ("texto", False, ("correo", "e_mail")),
+        "activo":    ("bool", False, ("estado",)),
+    },
+    "vehiculos": {
+        "matricula":            ("texto", True, ()),
+        "bastidor":             ("texto", False, ("vin",)),
+        "marca":                ("texto", False, ()),
+        "modelo":               ("texto", False, ()),
+        "tipo":                 ("tipo_vehiculo", False, ()),
+        "itv_vigente_hasta":    ("fecha", False, ("itv",)),
+        "seguro_vigente_hasta": ("fecha", False, ("seguro",)),
+        "aseguradora":          ("texto", False, ()),
+        "poliza":               ("texto", False, ()),
+    },
+    "ausencias": {
+        "empleado_id":   ("empleado", True, ("empleado", "dni")),
+        "tipo":          ("tipo_ausencia", True, ()),
+        "fecha_inicio":  ("fecha", True, ("inicio", "desde")),
+        "fecha_fin":     ("fecha", True, ("fin", "hasta")),
+        "observaciones": ("texto", False, ("obs",)),
+    },
+}
+
+# Columna que no puede repetirse (ni en BD ni dentro del fichero)
+UNICAS = {"empleados": "dni", "vehiculos": "matricula"}
+
+
+class ErrorFila(ValueError):
+    pass
+
+
+# ─────────────────────────────────────────────
+# LECTURA
+# ─────────────────────────────────────────────
+def _normalizar(nombre) -> str:
+    t = unicodedata.normalize("NFKD", str(nombre or "")).encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-z0-9]+", "_", t.strip().lower()).strip("_")
+
+
+def _texto_csv(archivo) -> io.TextIOWrapper:
+    archivo.seek(0)
+    muestra = archivo.read(64 * 1024)
+    archivo.seek(0)
+    try:
+        muestra.decode("utf-8-sig")
+        encoding = "utf-8-sig"
+    except UnicodeDecodeError as e:
+        # un corte a mitad de carácter al final de la muestra no cuenta
+        encoding = "utf-8-sig" if e.start >= len(muestra) - 3 else "latin1"
+    return io.TextIOWrapper(archivo, encoding=encoding, newline="")
+
+
+def leer_filas(archivo, nombre: str):
+    """Itera (nº de línea, [valores]) del fichero; la primera fila son las cabeceras."""
+    if nombre.lower().endswith((".xlsx", ".xlsm")):
+        from openpyxl import load_workbook
+        archivo.seek(0)
+        wb = load_workbook(archivo, read_only=True, data_only=True)
+        try:
+            for n, fila in enumerate(wb.active.iter_rows(values_only=True), start=1):
+                yield n, list(fila)
+        finally:
+            wb.close()
+        return
+    texto = _texto_csv(archivo)
+    try:
+        muestra = texto.read(8192)
+        texto.seek(0)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t|")
+        except csv.Error:
+            dialecto = csv.excel
+        for n, fila in enumerate(csv.reader(texto, dialecto), start=1):
+            yield n, fila
+    finally:
+        texto.detach()                 # no cerrar el fichero subido
+
+
+# ─────────────────────────────────────────────
+# VALIDACIÓN
+# ─────────────────────────────────────────────
+def _fecha(v):
+    if isinstance(v, datetime.datetime):
+        return v.date()
+    if isinstance(v, datetime.date):
+        return v
+    s = str(v).strip()
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d/%m/%y", "%Y/%m/%d"):
+        try:
+            return datetime.datetime.strptime(s, fmt).date()
+        except ValueError:
+            continue
+    raise ErrorFila(f"fecha no válida: {s!r}")
+
+
+def _bool(v):
+    if isinstance(v, bool):
+        return v
+    s = _normalizar(v)
+    if s in ("1", "si", "s", "true", "verdadero", "x", "activo", "yes"):
+        return True
+    if s in ("0", "no", "n", "false", "falso", "inactivo", "baja"):
+        return False
+    raise ErrorFila(f"valor sí/no no válido: {v!r}")
+
+
+def _elegir(v, opciones: list):
+    por_clave = {_normalizar(o): o for o in opciones}
+    o = por_clave.get(_normalizar(v))
+    if o is None:
+        raise ErrorFila(f"{v!r} no es uno de: {', '.join(opciones)}")
+    return o
+
+
+class Validador:
+    """Convierte filas crudas en tuplas listas para COPY, o lanza ErrorFila."""
+
+    def __init__(self, tabla: str, cabecera: list):
+        self.tabla    = tabla
+        self.columnas = COLUMNAS[tabla]
+        alias = {}
+        for col, (_, _, otros) in self.columnas.items():
+            for a in (col, *otros):
+                alias[a] = col
+        self.posicion = {}
+        for i, h in enumerate(cabecera):
+            col = alias.get(_normalizar(h))
+            if col and col not in self.posicion:
+                self.posicion[col] = i
+        faltan = [c for c, (_, oblig, _) in self.columnas.items()
+                  if oblig and c not in self.posicion]
+        if faltan:
+            raise ErrorFila(f"faltan columnas obligatorias: {', '.join(faltan)}")
+        self.destino = list(self.posicion)             # columnas que se cargan
+        self.unica   = UNICAS.get(tabla)
+        self.vistos  = set()
+        if self.unica:
+            self.vistos = {_normalizar(r["v"]) for r in
+                           query(f"SELECT {self.unica} AS v FROM {tabla} "
+                                 f"WHERE {self.unica} IS NOT NULL")}
+        if tabla == "ausencias":
+            emp = query("SELECT id, dni FROM empleados")
+            self.empleados = {str(r["id"]): r["id"] for r in emp}
+            self.empleados.update({_normalizar(r["dni"]): r["id"] for r in emp if r["dni"]})
+
+    def _valor(self, col: str, v):
+        tipo, oblig, _ = self.columnas[col]
+        if v is None or (isinstance(v, str) and not v.strip()):
+            if oblig:
+                raise ErrorFila(f"{col} es obligatorio")
+            return True if tipo == "bool" else None
+        if tipo == "texto":
+            return str(v).strip()
+        if tipo == "fecha":
+            return _fecha(v)
+        if tipo == "bool":
+            return _bool(v)
+        if tipo == "tipo_vehiculo":
+            return _elegir(v, TIPOS_VEHICULO)
+        if tipo == "tipo_ausencia":
+            return _elegir(v, TIPOS_AUSENCIA)
+        if tipo == "empleado":
+            clave = str(int(v)) if isinstance(v, (int, float)) else str(v).strip()
+            emp = self.empleados.get(clave) or self.empleados.get(_normalizar(clave))
+            if emp is None:
+                raise ErrorFila(f"empleado {v!r} no existe (usa id o DNI)")
+            return emp
+        raise AssertionError(tipo)
+
+    def validar(self, fila: list) -> tuple:
+        valores = {}
+        errores = []
+        for col, i in self.posicion.items():
+            try:
+                valores[col] = self._valor(col, fila[i] if i < len(fila) else None)
+            except ErrorFila as e:
+                errores.append(str(e))
+        if self.tabla == "ausencias" and not errores and \
+                valores["fecha_fin"] < valores["fecha_inicio"]:
+            errores.append("fecha_fin anterior a fecha_inicio")
+        if self.unica and not errores:
+            clave = _normalizar(valores[self.unica])
+            if clave in self.vistos:
+                errores.append(f"{self.unica} {valores[self.unica]!r} ya existe")
+            else:
+                self.vistos.add(clave)
+        if errores:
+            raise ErrorFila("; ".join(errores))
+        return tuple(valores[c] for c in self.destino)
+
+
+# ─────────────────────────────────────────────
+# CARGA
+# ─────────────────────────────────────────────
+def importar(tabla: str, archivo, nombre: str, solo_validar: bool = False) -> dict:
+    """Valida e importa `archivo` en `tabla` en una sola transacción.
+
+    Devuelve {"leidas", "validas", "insertadas", "errores": [(línea, mensaje)],
+    "n_errores", "error": mensaje global o None}. Con `solo_validar` no
+    escribe nada.
+    """
+    if tabla not in COLUMNAS:
+        raise ValueError(f"tabla no importable: {tabla}")
+    informe = {"leidas": 0, "validas": 0, "insertadas": 0, "errores": [],
+               "n_errores": 0, "error": None}
+    filas = leer_filas(archivo, nombre)
+    try:
+        _, cabecera = next(filas)
+        validador = Validador(tabla, cabecera)
+    except StopIteration:
+        informe["error"] = "el fichero está vacío"
+        return informe
+    except ErrorFila as e:
+        informe["error"] = str(e)
+        return informe
+
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES, mode="w+", newline="",
+                                       encoding="utf-8") as buffer:
+        salida = csv.writer(buffer)
+        for n, fila in filas:
+            if not any(v not in (None, "") for v in fila):
+                continue                                  # filas en blanco
+            informe["leidas"] += 1
+            try:
+                salida.writerow(["\\N" if v is None else v for v in validador.validar(fila)])
+                informe["validas"] += 1
+            except ErrorFila as e:
+                informe["n_errores"] += 1
+                if len(informe["errores"]) < MAX_ERRORES_INFORME:
+                    informe["errores"].append((n, str(e)))
+        if solo_validar or not informe["validas"]:
+            return informe
+
+        buffer.seek(0)
+        copia = (f"COPY {tabla} ({', '.join(validador.destino)}) FROM STDIN "
+                 "WITH (FORMAT csv, NULL '\\N')")
+        with transaccion(avisar=False) as tx:
+            informe["insertadas"] = tx.copy(copia, buffer)
+        if not tx.ok:
+            informe["error"] = tx.error
+    return informe
+
+
+# ─────────────────────────────────────────────
+# UI
+# ─────────────────────────────────────────────
+def panel_importacion(tabla: str):
+    """Expander con subida de fichero, validación previa e importación."""
+    with st.expander("📥 Importar desde CSV / Excel"):
+        cols = COLUMNAS[tabla]
+        st.caption("Columnas: " + ", ".join(
+            f"**{c}**" if oblig else c for c, (_, oblig, _) in cols.items()
+        ) + " (en negrita, obligatorias). La primera fila debe ser la cabecera.")
+        archivo = st.file_uploader("Fichero", type=["csv", "txt", "xlsx"],
+                                   key=f"imp_{tabla}", label_visibility="collapsed")
+        if not archivo:
+            return
+        c1, c2 = st.columns(2)
+        validar = c1.button("🔎 Solo validar", key=f"imp_val_{tabla}", use_container_width=True)
+        cargar  = c2.button("📥 Importar", key=f"imp_go_{tabla}", use_container_width=True)
+        if not (validar or cargar):
+            return
+        with st.spinner("Procesando fichero…"):
+            inf = importar(tabla, archivo, archivo.name, solo_validar=validar)
+        if inf["error"]:
+            st.error(f"No se importó nada: {inf['error']}")
+        elif validar:
+            st.info(f"{inf['validas']} de {inf['leidas']} filas son válidas.")
+        else:
+            st.success(f"✅ {inf['insertadas']} fila(s) importadas.")
+        if inf["n_errores"]:
+            st.warning(f"{inf['n_errores']} fila(s) con errores"
+                       + (" no se cargaron." if not validar else "."))
+            import pandas as pd
+            st.dataframe(pd.DataFrame(inf["errores"], columns=["Línea", "Error"]),
+                         use_container_width=True, hide_index=True)
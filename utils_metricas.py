@@ -0,0 +1,197 @@
+"""utils_metricas.py — Tiempos de las consultas a la BD por sentencia y página.
+
+utils.query / execute / query_frame / query_stream apuntan aquí cada
+ejecución: latencia en un histograma de cubos fijos, filas devueltas o
+afectadas y errores, agrupados por sentencia normalizada (literales y
+parámetros sustituidos por ?) y por la página que la lanzó.
+
+Las consultas que superan LENTA_MS se guardan con su EXPLAIN en un
+registro en memoria y en data/consultas_lentas.jsonl. Todo se puede
+exportar en formato OpenMetrics para Prometheus o similares.
+"""
+import datetime
+import json
+import logging
+import re
+import threading
+from collections import deque
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+LENTA_MS   = 500          # a partir de aquí la consulta va al registro de lentas
+LENTAS_MAX = 100          # consultas lentas guardadas en memoria
+REGISTRO_LENTAS = Path("data/consultas_lentas.jsonl")
+
+# Límites superiores de los cubos del histograma, en milisegundos
+CUBOS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_RE_CADENA  = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMERO  = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+_RE_PARAM   = re.compile(r"%(?:\(\w+\))?s")
+_RE_LISTA   = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_RE_ESPACIO = re.compile(r"\s+")
+_EXPLICABLES = ("select", "with", "insert", "update", "delete")
+
+
+def normalizar(sql: str, largo: int = 300) -> str:
+    """Texto de la sentencia sin literales ni parámetros, para agrupar."""
+    s = _RE_CADENA.sub("?", sql)
+    s = _RE_PARAM.sub("?", s)
+    s = _RE_NUMERO.sub("?", s)
+    s = _RE_LISTA.sub("(?)", s)
+    s = _RE_ESPACIO.sub(" ", s).strip().rstrip(";")
+    return s[:largo]
+
+
+def explicable(sql: str) -> bool:
+    return sql.lstrip().split(None, 1)[0].lower() in _EXPLICABLES if sql.strip() else False
+
+
+class _Serie:
+    __slots__ = ("cubos", "n", "suma", "maximo", "filas", "errores")
+
+    def __init__(self):
+        self.cubos   = [0] * (len(CUBOS_MS) + 1)   # el último es +Inf
+        self.n       = 0
+        self.suma    = 0.0
+        self.maximo  = 0.0
+        self.filas   = 0
+        self.errores = 0
+
+    def percentil(self, p: float):
+        """Límite superior del cubo donde cae el percentil `p` (None si > último cubo)."""
+        if not self.n:
+            return None
+        objetivo, acumulado = p / 100 * self.n, 0
+        for limite, c in zip(CUBOS_MS, self.cubos):
+            acumulado += c
+            if acumulado >= objetivo:
+                return limite
+        return None
+
+
+class Metricas:
+    """Histogramas de latencia por (sentencia, página) y registro de lentas."""
+
+    def __init__(self, lenta_ms: float = LENTA_MS, lentas_max: int = LENTAS_MAX,
+                 registro: Path = REGISTRO_LENTAS):
+        self.lenta_ms = lenta_ms
+        self.registro = registro
+        self._lock    = threading.Lock()
+        self._series  = {}                 # (sentencia, página) -> _Serie
+        self._lentas  = deque(maxlen=lentas_max)
+        self.desde    = datetime.datetime.now()
+
+    def registrar(self, sql: str, pagina: str, ms: float, filas: int = 0,
+                  error: bool = False) -> bool:
+        """Apunta una ejecución; devuelve True si es lenta (para pedir su EXPLAIN)."""
+        k = (normalizar(sql), pagina or "—")
+        with self._lock:
+            s = self._series.get(k)
+            if s is None:
+                s = self._series[k] = _Serie()
+            i = next((i for i, limite in enumerate(CUBOS_MS) if ms <= limite), len(CUBOS_MS))
+            s.cubos[i] += 1
+            s.n        += 1
+            s.suma     += ms
+            s.maximo    = max(s.maximo, ms)
+            s.filas    += filas or 0
+            s.errores  += bool(error)
+        return ms >= self.lenta_ms and not error
+
+    def lenta(self, sql: str, pagina: str, ms: float, filas: int, plan: str = None):
+        entrada = {"cuando": datetime.datetime.now().isoformat(timespec="seconds"),
+                   "pagina": pagina or "—", "ms": round(ms, 1), "filas": filas,
+                   "sentencia": normalizar(sql, 2000), "plan": plan}
+        with self._lock:
+            self._lentas.append(entrada)
+        try:
+            self.registro.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.registro, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+        except OSError as e:
+            log.warning("No se pudo escribir %s: %s", self.registro, e)
+
+    def reiniciar(self):
+        with self._lock:
+            self._series.clear()
+            self._lentas.clear()
+            self.desde = datetime.datetime.now()
+
+    # ── Lectura ──
+    def sentencias(self) -> list:
+        """Una fila por (sentencia, página) con n, media, p50/p95/p99, máximo, filas y errores."""
+        with self._lock:
+            items = [(k, _copia(s)) for k, s in self._series.items()]
+        filas = []
+        for (sentencia, pagina), s in items:
+            filas.append({
+                "sentencia": sentencia, "pagina": pagina, "n": s.n,
+                "total_ms": round(s.suma, 1), "media_ms": round(s.suma / s.n, 2) if s.n else 0,
+                "p50_ms": s.percentil(50), "p95_ms": s.percentil(95), "p99_ms": s.percentil(99),
+                "max_ms": round(s.maximo, 1), "filas": s.filas, "errores": s.errores,
+            })
+        return sorted(filas, key=lambda f: -f["total_ms"])
+
+    def paginas(self) -> list:
+        """Totales por página."""
+        with self._lock:
+            items = [(k[1], _copia(s)) for k, s in self._series.items()]
+        por_pagina = {}
+        for pagina, s in items:
+            p = por_pagina.setdefault(pagina, _Serie())
+            p.cubos  = [a + b for a, b in zip(p.cubos, s.cubos)]
+            p.n     += s.n
+            p.suma  += s.suma
+            p.maximo = max(p.maximo, s.maximo)
+            p.filas += s.filas
+            p.errores += s.errores
+        return sorted(({"pagina": k, "n": s.n, "total_ms": round(s.suma, 1),
+                        "media_ms": round(s.suma / s.n, 2) if s.n else 0,
+                        "p95_ms": s.percentil(95), "max_ms": round(s.maximo, 1),
+                        "filas": s.filas, "errores": s.errores}
+                       for k, s in por_pagina.items()), key=lambda f: -f["total_ms"])
+
+    def lentas(self) -> list:
+        with self._lock:
+            return list(reversed(self._lentas))
+
+    def openmetrics(self) -> str:
+        """Exposición en formato OpenMetrics (text/plain; version=1.0.0)."""
+        with self._lock:
+            items = sorted((k, _copia(s)) for k, s in self._series.items())
+        lineas = [
+            "# TYPE prode_sql_duration_seconds histogram",
+            "# UNIT prode_sql_duration_seconds seconds",
+            "# HELP prode_sql_duration_seconds Latencia de las sentencias SQL.",
+        ]
+        for (sentencia, pagina), s in items:
+            etiquetas = f'statement="{_escapar(sentencia)}",page="{_escapar(pagina)}"'
+            acumulado = 0
+            for limite, c in zip(CUBOS_MS, s.cubos):
+                acumulado += c
+                lineas.append(f'prode_sql_duration_seconds_bucket{{{etiquetas},'
+                              f'le="{limite / 1000:g}"}} {acumulado}')
+            lineas.append(f'prode_sql_duration_seconds_bucket{{{etiquetas},le="+Inf"}} {s.n}')
+            lineas.append(f"prode_sql_duration_seconds_sum{{{etiquetas}}} {s.suma / 1000:.6f}")
+            lineas.append(f"prode_sql_duration_seconds_count{{{etiquetas}}} {s.n}")
+        for nombre, campo, ayuda in (("prode_sql_rows", "filas", "Filas devueltas o afectadas."),
+                                     ("prode_sql_errors", "errores", "Sentencias con error.")):
+            lineas += [f"# TYPE {nombre} counter", f"# HELP {nombre} {ayuda}"]
+            for (sentencia, pagina), s in items:
+                lineas.append(f'{nombre}_total{{statement="{_escapar(sentencia)}",'
+                              f'page="{_escapar(pagina)}"}} {getattr(s, campo)}')
+        lineas.append("# EOF")
+        return "\n".join(lineas) + "\n"
+
+
+def _copia(s: _Serie) -> _Serie:
+    c = _Serie()
+    c.cubos, c.n, c.suma = list(s.cubos), s.n, s.suma
+    c.maximo, c.filas, c.errores = s.maximo, s.filas, s.errores
+    return c
+
+
+def _escapar(texto: str) -> str:
+    return texto.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
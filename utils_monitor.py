@@ -0,0 +1,75 @@
+"""utils_monitor.py — Comprobación periódica de la BD en un hilo de fondo.
+
+El sidebar lee el último estado publicado sin hacer ninguna consulta.
+"""
+import threading
+import time
+from collections import deque
+
+MONITOR_INTERVALO = 15     # segundos entre sondeos
+MONITOR_MUESTRAS  = 240    # latencias guardadas (1 h con el intervalo por defecto)
+
+
+def percentil(valores, p: float):
+    if not valores:
+        return None
+    orden = sorted(valores)
+    i = min(len(orden) - 1, max(0, round(p / 100 * (len(orden) - 1))))
+    return orden[i]
+
+
+class MonitorBD(threading.Thread):
+    """Ejecuta `sondeo()` cada `intervalo` s y guarda latencia y último error.
+
+    `sondeo` debe lanzar una excepción si la BD no responde.
+    """
+
+    def __init__(self, sondeo, intervalo: float = MONITOR_INTERVALO,
+                 muestras: int = MONITOR_MUESTRAS):
+        super().__init__(name="monitor-bd", daemon=True)
+        self.sondeo     = sondeo
+        self.intervalo  = intervalo
+        self._lock      = threading.Lock()
+        self._parar     = threading.Event()
+        self._latencias = deque(maxlen=muestras)
+        self._estado    = {"ok": None, "latencia_ms": None, "ultimo_error": None,
+                           "error_en": None, "comprobado_en": None, "fallos_seguidos": 0}
+
+    def comprobar(self):
+        t0 = time.perf_counter()
+        try:
+            self.sondeo()
+        except Exception as e:
+            with self._lock:
+                self._estado.update(ok=False, latencia_ms=None,
+                                    ultimo_error=str(e).strip() or type(e).__name__,
+                                    error_en=time.time(), comprobado_en=time.time(),
+                                    fallos_seguidos=self._estado["fallos_seguidos"] + 1)
+            return
+        ms = (time.perf_counter() - t0) * 1000
+        with self._lock:
+            self._latencias.append(ms)
+            self._estado.update(ok=True, latencia_ms=round(ms, 1),
+                                comprobado_en=time.time(), fallos_seguidos=0)
+
+    def run(self):
+        while not self._parar.is_set():
+            self.comprobar()
+            self._parar.wait(self.intervalo)
+
+    def parar(self):
+        self._parar.set()
+
+    def estado(self) -> dict:
+        with self._lock:
+            return dict(self._estado)
+
+    def percentiles(self) -> dict:
+        with self._lock:
+            lat = list(self._latencias)
+        return {
+            "muestras": len(lat),
+            "p50": percentil(lat, 50),
+            "p95": percentil(lat, 95),
+            "p99": percentil(lat, 99),
+        }
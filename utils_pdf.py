@@ -0,0 +1,202 @@
+"""utils_pdf.py — Fichas de empleados en PDF.
+
+Los empleados se reparten en lotes que se dibujan en paralelo en un pool de
+procesos; cada lote es un PDF independiente y al final se concatenan en un
+único documento. Las fotos se reducen una vez al tamaño de impresión y se
+guardan en FOTOS_CACHE, así que ni los demás lotes ni las siguientes
+impresiones vuelven a descargar o decodificar el original.
+
+Este módulo no importa Streamlit a nivel de módulo para que los procesos
+hijos arranquen rápido.
+"""
+import hashlib
+import io
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import chain, islice
+from multiprocessing import get_context
+from pathlib import Path
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+from reportlab.lib.units import cm
+from reportlab.lib.colors import HexColor
+
+COLOR_PRODE = HexColor("#00587A")
+PDF_LOTE    = 50                       # fichas por lote (un PDF parcial por lote)
+PDF_PROCESOS = os.cpu_count() or 1
+FOTO_PX     = 320                      # lado en px para 4 cm a ~200 ppp
+FOTOS_CACHE = Path("data/pdf_fotos")
+FOTOS_EMPLEADOS = Path("data/fotos_empleados")   # <id>.jpg de quien no tiene foto_url
+HTTP_TIMEOUT = (5, 30)
+
+SQL_EMPLEADOS = """
+    SELECT id, nombre, apellidos, dni, email, telefono, activo,
+           foto_url, foto_miniaturas
+    FROM empleados {where}
+    ORDER BY COALESCE(apellidos, ''), COALESCE(nombre, ''), id
+"""
+
+
+def _ficha(emp: dict, fotos_dir) -> tuple:
+    """Reduce un empleado a lo que se dibuja: (nombre, [(etiqueta, valor)], origen_foto)."""
+    from utils_storage import miniatura_url
+    foto = None
+    if emp.get("foto_url"):
+        foto = miniatura_url(emp["foto_url"], 256) if emp.get("foto_miniaturas") \
+            else emp["foto_url"]
+    elif fotos_dir is not None:
+        ruta = Path(fotos_dir) / f"{emp.get('id')}.jpg"
+        if ruta.exists():
+            foto = str(ruta)
+    nombre = f"{emp.get('nombre') or ''} {emp.get('apellidos') or ''}".strip()
+    datos = [
+        ("ID", emp.get("id")),
+        ("DNI", emp.get("dni")),
+        ("Email", emp.get("email")),
+        ("Teléfono", emp.get("telefono")),
+        ("Estado", "Activo" if emp.get("activo") else "Inactivo"),
+    ]
+    return nombre or "—", [(k, v if v not in (None, "") else "—") for k, v in datos], foto
+
+
+@lru_cache(maxsize=1)
+def _session():
+    import requests
+    return requests.Session()
+
+
+@lru_cache(maxsize=512)
+def _foto_reducida(origen: str):
+    """Ruta de la foto ya reducida a FOTO_PX (en caché de disco); None si no se puede leer."""
+    clave = origen
+    if not origen.startswith(("http://", "https://")):
+        try:
+            clave = f"{origen}@{os.stat(origen).st_mtime_ns}"
+        except OSError:
+            return None
+    ruta = FOTOS_CACHE / f"{hashlib.sha1(clave.encode()).hexdigest()}.jpg"
+    if ruta.exists():
+        return str(ruta)
+    from PIL import Image, ImageOps
+    try:
+        if clave is origen:
+            r = _session().get(origen, timeout=HTTP_TIMEOUT)
+            r.raise_for_status()
+            fuente = io.BytesIO(r.content)
+        else:
+            fuente = origen
+        with Image.open(fuente) as img:
+            img.draft("RGB", (FOTO_PX, FOTO_PX))
+            img = ImageOps.exif_transpose(img)
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            img.thumbnail((FOTO_PX, FOTO_PX), Image.LANCZOS)
+            FOTOS_CACHE.mkdir(parents=True, exist_ok=True)
+            tmp = ruta.with_suffix(f".{os.getpid()}.tmp")
+            img.save(tmp, "JPEG", quality=85)
+        os.replace(tmp, ruta)                # otro proceso puede estar escribiendo la misma
+    except Exception:
+        return None
+    return str(ruta)
+
+
+def _dibujar_lote(fichas: list) -> bytes:
+    """Dibuja un lote de fichas (salida de _ficha) y devuelve el PDF parcial."""
+    salida = io.BytesIO()
+    c = canvas.Canvas(salida, pagesize=A4)
+    width, height = A4
+
+    for nombre, datos, foto in fichas:
+        y = height - 2*cm
+
+        # CABECERA
+        c.setFont("Helvetica-Bold", 18)
+        c.setFillColor(COLOR_PRODE)
+        c.drawString(2*cm, y, "PRODE · Ficha de Empleado")
+        y -= 1.2*cm
+
+        # FOTO
+        ruta = _foto_reducida(foto) if foto else None
+        if ruta:
+            c.drawImage(
+                ruta,
+                2*cm, y-4*cm,
+                width=4*cm, height=4*cm,
+                preserveAspectRatio=True
+            )
+
+        # DATOS
+        x = 7*cm
+        c.setFont("Helvetica-Bold", 14)
+        c.drawString(x, y, nombre)
+        y -= 0.8*cm
+
+        c.setFont("Helvetica", 11)
+        for label, valor in datos:
+            c.drawString(x, y, f"{label}: {valor}")
+            y -= 0.6*cm
+
+        c.showPage()
+
+    c.save()
+    return salida.getvalue()
+
+
+def _lotes(iterable, n: int):
+    it = iter(iterable)
+    while lote := list(islice(it, n)):
+        yield lote
+
+
+def generar_pdf_empleados(empleados, fotos_dir=None, salida=None,
+                          procesos: int = PDF_PROCESOS, lote: int = PDF_LOTE) -> int:
+    """Genera un PDF con una ficha por empleado y devuelve cuántas fichas tiene.
+
+    `empleados` puede ser cualquier iterable de dicts (p. ej. query_stream):
+    se consume lote a lote sin materializarlo entero: como mucho hay
+    2 × `procesos` lotes en vuelo y cada PDF parcial se añade al documento
+    en cuanto le toca. `salida` es una ruta o un fichero binario abierto
+    (io.BytesIO para descargar sin tocar disco).
+    `fotos_dir` es la carpeta de fotos locales `<id>.jpg` para empleados sin
+    foto_url.
+    """
+    from pypdf import PdfWriter
+
+    writer  = PdfWriter()
+    lotes   = ([_ficha(e, fotos_dir) for e in l] for l in _lotes(empleados, lote))
+    primero = next(lotes, None)
+    segundo = next(lotes, None)
+    if procesos <= 1 or segundo is None:
+        # un solo lote: no compensa arrancar procesos
+        for l in chain(filter(None, (primero, segundo)), lotes):
+            writer.append(io.BytesIO(_dibujar_lote(l)))
+    else:
+        # spawn: los hijos no heredan los hilos ni el estado de Streamlit
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=get_context("spawn")) as ex:
+            en_vuelo = deque()
+            for l in chain((primero, segundo), lotes):
+                en_vuelo.append(ex.submit(_dibujar_lote, l))
+                if len(en_vuelo) >= procesos * 2:
+                    writer.append(io.BytesIO(en_vuelo.popleft().result()))
+            while en_vuelo:
+                writer.append(io.BytesIO(en_vuelo.popleft().result()))
+
+    if isinstance(salida, (str, Path)):
+        with open(salida, "wb") as f:
+            writer.write(f)
+    elif salida is not None:
+        writer.write(salida)
+    return len(writer.pages)
+
+
+def pdf_empleados(where=(), params=()) -> bytes:
+    """PDF de las fichas de los empleados que cumplen `where`, leído en streaming."""
+    from utils import query_stream
+    sql = SQL_EMPLEADOS.format(where=("WHERE " + " AND ".join(where)) if where else "")
+    buffer = io.BytesIO()
+    generar_pdf_empleados(query_stream(sql, tuple(params)), fotos_dir=FOTOS_EMPLEADOS,
+                          salida=buffer)
+    return buffer.getvalue()
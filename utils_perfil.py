@@ -0,0 +1,233 @@
+"""utils_perfil.py — Perfilado de reruns por secciones (opcional, solo admin).
+
+Con el interruptor "Perfilar reruns" del sidebar activado, app.py envuelve
+cada rerun en `perfilar_rerun` y las páginas marcan sus partes con
+`seccion("tab_datos")`, `seccion("lista")`… Se apunta el tiempo de pared
+de cada sección (anidadas: "rerun/Vehiculos/ficha/tab_checkin") y se
+compara con PRESUPUESTOS_MS; las que se pasan quedan marcadas.
+
+Con "cProfile" también activo se guarda en PERFILES un .prof del rerun
+(para snakeviz o pstats) y un .speedscope.json con las secciones, que se
+abre en https://www.speedscope.app.
+
+Con el perfilador apagado `seccion` no hace nada más que comprobar un
+atributo.
+"""
+import cProfile
+import datetime
+import fnmatch
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+
+import streamlit as st
+
+from utils_monitor import percentil
+
+log = logging.getLogger(__name__)
+
+HISTORIAL = 200                  # reruns guardados en memoria
+PERFILES  = Path("data/perfiles")
+PERFILES_MAX = 40                # dumps en disco; se borran los más antiguos
+
+# Presupuesto por sección en ms; las claves admiten comodines (fnmatch)
+PRESUPUESTOS_MS = {
+    "rerun":          2000,
+    "rerun/sidebar":   200,
+    "rerun/*/ficha":  1500,
+    "rerun/*/tab_*":   800,
+    "rerun/*/lista":  1000,
+}
+
+_local = threading.local()       # rerun en curso del hilo del script
+
+
+def presupuestos() -> dict:
+    """PRESUPUESTOS_MS con lo que haya en secrets ([PRESUPUESTOS_MS] en secrets.toml)."""
+    p = dict(PRESUPUESTOS_MS)
+    try:
+        p.update({k: float(v) for k, v in st.secrets.get("PRESUPUESTOS_MS", {}).items()})
+    except Exception:
+        pass
+    return p
+
+
+def presupuesto(ruta: str, tabla: dict):
+    if ruta in tabla:
+        return tabla[ruta]
+    for patron, ms in tabla.items():
+        if fnmatch.fnmatchcase(ruta, patron):
+            return ms
+    return None
+
+
+class _Rerun:
+    def __init__(self, pagina: str):
+        self.pagina    = pagina
+        self.cuando    = datetime.datetime.now()
+        self.t0        = time.perf_counter()
+        self.pila      = []
+        self.secciones = []          # [{"seccion", "inicio_ms", "ms"}] en orden de cierre
+
+
+@contextmanager
+def seccion(nombre: str):
+    """Mide el bloque como sección del rerun en curso (si se está perfilando)."""
+    r = getattr(_local, "rerun", None)
+    if r is None:
+        yield
+        return
+    r.pila.append(nombre)
+    ruta = "/".join(r.pila)
+    t0   = time.perf_counter()
+    try:
+        yield
+    finally:
+        r.secciones.append({"seccion": ruta, "inicio_ms": (t0 - r.t0) * 1000,
+                            "ms": (time.perf_counter() - t0) * 1000})
+        r.pila.pop()
+
+
+def activo() -> bool:
+    return st.session_state.get("rol") == "admin" and bool(st.session_state.get("perfil_activo"))
+
+
+@contextmanager
+def perfilar_rerun(pagina: str):
+    """Envuelve el rerun entero; al salir guarda el registro y, si toca, los dumps."""
+    if not activo():
+        yield
+        return
+    r = _local.rerun = _Rerun(pagina)
+    prof = cProfile.Profile() if st.session_state.get("perfil_cprofile") else None
+    if prof:
+        prof.enable()
+    try:
+        with seccion("rerun"):
+            yield
+    finally:
+        if prof:
+            prof.disable()
+        _local.rerun = None
+        registro = get_perfilador().guardar(r, prof)
+        st.session_state["perfil_ultimo"] = registro
+
+
+class Perfilador:
+    """Historial de reruns perfilados del proceso, con su resumen por sección."""
+
+    def __init__(self, historial: int = HISTORIAL, carpeta: Path = PERFILES):
+        self.carpeta   = carpeta
+        self._lock     = threading.Lock()
+        self._reruns   = deque(maxlen=historial)
+
+    def guardar(self, r: _Rerun, prof: cProfile.Profile = None) -> dict:
+        tabla = presupuestos()
+        secciones = sorted(r.secciones, key=lambda s: (s["inicio_ms"], -s["ms"]))
+        for s in secciones:
+            s["presupuesto_ms"] = presupuesto(s["seccion"], tabla)
+        registro = {
+            "cuando": r.cuando.isoformat(timespec="seconds"), "pagina": r.pagina,
+            "total_ms": next((s["ms"] for s in secciones if s["seccion"] == "rerun"), 0),
+            "secciones": secciones,
+            "excedidas": [s["seccion"] for s in secciones
+                          if s["presupuesto_ms"] is not None and s["ms"] > s["presupuesto_ms"]],
+            "dumps": self._volcar(r, secciones, prof) if prof else [],
+        }
+        if registro["excedidas"]:
+            log.warning("Rerun de %s fuera de presupuesto: %s", r.pagina,
+                        ", ".join(registro["excedidas"]))
+        with self._lock:
+            self._reruns.append(registro)
+        return registro
+
+    def _volcar(self, r: _Rerun, secciones: list, prof: cProfile.Profile) -> list:
+        base = self.carpeta / f"{r.cuando:%Y%m%d_%H%M%S_%f}_{r.pagina}"
+        try:
+            self.carpeta.mkdir(parents=True, exist_ok=True)
+            prof.dump_stats(f"{base}.prof")
+            Path(f"{base}.speedscope.json").write_text(
+                json.dumps(speedscope(r.pagina, secciones)), encoding="utf-8")
+            viejos = sorted(self.carpeta.glob("*.prof"))[:-PERFILES_MAX]
+            for p in viejos:
+                p.unlink(missing_ok=True)
+                p.with_suffix("").with_suffix(".speedscope.json").unlink(missing_ok=True)
+        except OSError as e:
+            log.warning("No se pudo guardar el perfil en %s: %s", self.carpeta, e)
+            return []
+        return [f"{base}.prof", f"{base}.speedscope.json"]
+
+    def reruns(self) -> list:
+        with self._lock:
+            return list(reversed(self._reruns))
+
+    def resumen(self) -> list:
+        """Por sección: n, media, p95, máximo, presupuesto y veces que se pasó."""
+        tiempos, limites = {}, {}
+        for reg in self.reruns():
+            for s in reg["secciones"]:
+                tiempos.setdefault(s["seccion"], []).append(s["ms"])
+                limites[s["seccion"]] = s["presupuesto_ms"]
+        filas = []
+        for ruta, ms in tiempos.items():
+            lim = limites[ruta]
+            filas.append({
+                "seccion": ruta, "n": len(ms), "media_ms": round(sum(ms) / len(ms), 1),
+                "p95_ms": round(percentil(ms, 95), 1), "max_ms": round(max(ms), 1),
+                "presupuesto_ms": lim,
+                "excedido": sum(m > lim for m in ms) if lim is not None else 0,
+            })
+        return sorted(filas, key=lambda f: f["seccion"])
+
+    def limpiar(self):
+        with self._lock:
+            self._reruns.clear()
+
+
+def speedscope(nombre: str, secciones: list) -> dict:
+    """Perfil "evented" de speedscope con una trama por sección."""
+    frames, indice, eventos = [], {}, []
+    for s in secciones:
+        hoja = s["seccion"].rsplit("/", 1)[-1]
+        if hoja not in indice:
+            indice[hoja] = len(frames)
+            frames.append({"name": hoja})
+        eventos.append((s["inicio_ms"], 1, s["ms"], "O", indice[hoja]))
+        eventos.append((s["inicio_ms"] + s["ms"], 0, s["ms"], "C", indice[hoja]))
+    # A igual instante: cierres antes que aperturas, el padre (más largo) abre primero
+    eventos.sort(key=lambda e: (e[0], e[1], -e[2] if e[1] else e[2]))
+    fin = max((e[0] for e in eventos), default=0)
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": [{"type": "evented", "name": nombre, "unit": "milliseconds",
+                      "startValue": 0, "endValue": fin,
+                      "events": [{"type": t, "frame": f, "at": at} for at, _, _, t, f in eventos]}],
+        "exporter": "prode utils_perfil",
+    }
+
+
+@st.cache_resource(show_spinner=False)
+def get_perfilador() -> Perfilador:
+    return Perfilador()
+
+
+def mostrar_ultimo():
+    """Tabla con las secciones del último rerun perfilado, al pie de la página."""
+    if not activo() or not st.session_state.get("perfil_ultimo"):
+        return
+    reg = st.session_state["perfil_ultimo"]
+    aviso = f" · ⚠️ {len(reg['excedidas'])} fuera de presupuesto" if reg["excedidas"] else ""
+    with st.expander(f"⏱️ Rerun de {reg['pagina']}: {reg['total_ms']:.0f} ms{aviso}"):
+        for s in reg["secciones"]:
+            nivel = s["seccion"].count("/")
+            marca = "⚠️ " if s["seccion"] in reg["excedidas"] else ""
+            lim   = f" / {s['presupuesto_ms']:.0f}" if s["presupuesto_ms"] is not None else ""
+            st.markdown(f"{'&nbsp;' * 4 * nivel}{marca}`{s['seccion'].rsplit('/', 1)[-1]}` "
+                        f"— {s['ms']:.1f}{lim} ms")
+        if reg["dumps"]:
+            st.caption("Dumps: " + " · ".join(reg["dumps"]))
@@ -0,0 +1,161 @@
+"""utils_preparadas.py — Sentencias preparadas por conexión del pool.
+
+Las consultas parametrizadas que se repiten (la ficha de un empleado o de
+un vehículo, sus servicios, ausencias y check-ins…) se preparan en el
+servidor con PREPARE la primera vez que cada conexión las ve después de
+PREPARAR_TRAS ejecuciones en el proceso; a partir de ahí se lanzan con
+EXECUTE y PostgreSQL se ahorra el análisis y, tras unas pocas
+ejecuciones, la planificación.
+
+Es transparente para quien llama a utils.query: la sentencia se reconoce
+por su texto (espacios normalizados) y los %s se traducen a $1, $2…
+Si una sentencia no se puede preparar (tipos que el servidor no sabe
+deducir, parámetros con nombre…) se sigue ejecutando como siempre.
+"""
+import threading
+from collections import OrderedDict
+
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+
+PREPARAR_TRAS  = 3      # ejecuciones en el proceso antes de preparar una sentencia
+PREPARADAS_MAX = 64     # por conexión; al pasarse se libera la menos usada
+SENTENCIAS_MAX = 500    # textos distintos seguidos en el registro del proceso
+
+# Errores tras los que basta con volver a preparar: la sentencia ya no existe
+# en la sesión (DISCARD ALL…) o una tabla cambió de columnas (SELECT *).
+_REPREPARAR = (psycopg2.errors.InvalidSqlStatementName, psycopg2.errors.FeatureNotSupported)
+
+
+class ConexionPreparada(psycopg2.extensions.connection):
+    """Conexión que recuerda qué sentencias tiene preparadas en el servidor."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.preparadas = OrderedDict()     # nombre -> None, la más reciente al final
+
+
+def convertir(sql: str):
+    """'... %s ... %%' → ('... $1 ... %', 1); None si usa otros marcadores."""
+    partes, n, i = [], 0, 0
+    while True:
+        j = sql.find("%", i)
+        if j < 0:
+            partes.append(sql[i:])
+            break
+        partes.append(sql[i:j])
+        sig = sql[j + 1:j + 2]
+        if sig == "s":
+            n += 1
+            partes.append(f"${n}")
+        elif sig == "%":
+            partes.append("%")
+        else:
+            return None                     # %(nombre)s u otro marcador
+        i = j + 2
+    return "".join(partes), n
+
+
+class SentenciasPreparadas:
+    """Registro de sentencias del proceso y sus estadísticas de uso."""
+
+    def __init__(self, preparar_tras: int = PREPARAR_TRAS,
+                 maximo_conexion: int = PREPARADAS_MAX, maximo: int = SENTENCIAS_MAX):
+        self.preparar_tras   = preparar_tras
+        self.maximo_conexion = maximo_conexion
+        self.maximo          = maximo
+        self._lock       = threading.Lock()
+        self._sentencias = OrderedDict()    # texto normalizado -> dict
+        self._contador   = 0
+
+    def _entrada(self, sql: str) -> dict:
+        k = " ".join(sql.split())
+        with self._lock:
+            e = self._sentencias.get(k)
+            if e is None:
+                self._contador += 1
+                conv = convertir(sql)
+                e = {"nombre": f"prode_{self._contador}", "sql": k,
+                     "texto": conv[0] if conv else None, "params": conv[1] if conv else 0,
+                     "preparable": conv is not None and conv[1] > 0,
+                     "ejecuciones": 0, "preparadas": 0, "aciertos": 0, "preparaciones": 0}
+                self._sentencias[k] = e
+                if len(self._sentencias) > self.maximo:
+                    self._sentencias.popitem(last=False)
+            else:
+                self._sentencias.move_to_end(k)
+            e["ejecuciones"] += 1
+        return e
+
+    def _preparar(self, cur, e: dict):
+        conn = cur.connection
+        cur.execute(f"PREPARE {e['nombre']} AS {e['texto']}")
+        conn.preparadas[e["nombre"]] = None
+        with self._lock:
+            e["preparaciones"] += 1
+        while len(conn.preparadas) > self.maximo_conexion:
+            viejo, _ = conn.preparadas.popitem(last=False)
+            cur.execute(f"DEALLOCATE {viejo}")
+
+    def ejecutar(self, cur, sql: str, params=None):
+        """cur.execute(sql, params), por EXECUTE si la sentencia es caliente."""
+        conn = cur.connection
+        if not isinstance(params, (tuple, list)) or not params \
+                or not isinstance(conn, ConexionPreparada) or not conn.autocommit:
+            return cur.execute(sql, params)
+        e = self._entrada(sql)
+        if not e["preparable"] or e["ejecuciones"] < self.preparar_tras \
+                or len(params) != e["params"]:
+            return cur.execute(sql, params)
+
+        ejecutar = f"EXECUTE {e['nombre']} ({', '.join(['%s'] * e['params'])})"
+        acierto = e["nombre"] in conn.preparadas
+        if acierto:
+            conn.preparadas.move_to_end(e["nombre"])
+        else:
+            try:
+                self._preparar(cur, e)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                raise
+            except psycopg2.Error:
+                e["preparable"] = False      # p. ej. tipo de un parámetro indeterminado
+                return cur.execute(sql, params)
+        try:
+            cur.execute(ejecutar, params)
+        except _REPREPARAR as error:
+            if isinstance(error, psycopg2.errors.InvalidSqlStatementName):
+                conn.preparadas.clear()          # la sesión perdió sus sentencias
+            else:
+                conn.preparadas.pop(e["nombre"], None)
+                cur.execute(f"DEALLOCATE {e['nombre']}")
+            self._preparar(cur, e)
+            acierto = False
+            cur.execute(ejecutar, params)
+        with self._lock:
+            e["preparadas"] += 1
+            e["aciertos"]   += acierto
+
+    def estado(self) -> dict:
+        """Totales y, por sentencia preparada, ejecuciones y tasa de aciertos.
+
+        Un acierto es una ejecución que encontró la sentencia ya preparada
+        en la conexión que le tocó.
+        """
+        with self._lock:
+            filas = [dict(e) for e in self._sentencias.values()]
+        preparadas = [e for e in filas if e["preparadas"]]
+        for e in preparadas:
+            e["hit_rate"] = round(e["aciertos"] / e["preparadas"], 3)
+            for campo in ("nombre", "texto", "params", "preparable"):
+                e.pop(campo)
+        total    = sum(e["preparadas"] for e in preparadas)
+        aciertos = sum(e["aciertos"] for e in preparadas)
+        return {
+            "sentencias": len(filas),
+            "preparadas": len(preparadas),
+            "ejecuciones": sum(e["ejecuciones"] for e in filas),
+            "por_execute": total,
+            "hit_rate": round(aciertos / total, 3) if total else 0.0,
+            "detalle": sorted(preparadas, key=lambda e: -e["preparadas"]),
+        }
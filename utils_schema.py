@@ -0,0 +1,425 @@
+"""utils_schema.py — Tablas auxiliares, índices y triggers que crea la propia app.
+
+Cada migración es idempotente y se ejecuta como una única transacción al
+arrancar el proceso (ver `utils.ensure_schema`). Si una falla (p.ej. falta
+de permisos en Supabase) se registra y el resto se aplica igualmente.
+"""
+import logging
+
+log = logging.getLogger(__name__)
+
+_LOCK = "SELECT pg_advisory_xact_lock(hashtext('prode_esquema'));\n"
+
+MIGRACIONES = [
+    # ── Dashboard: contadores mantenidos por triggers ──
+    ("dashboard_resumen", """
+CREATE TABLE IF NOT EXISTS dashboard_resumen (
+    id                BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    empleados_activos INT NOT NULL DEFAULT 0,
+    vehiculos         INT NOT NULL DEFAULT 0,
+    servicios         INT NOT NULL DEFAULT 0,
+    actualizado       TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+INSERT INTO dashboard_resumen (id, empleados_activos, vehiculos, servicios)
+SELECT TRUE,
+       (SELECT COUNT(*) FROM empleados WHERE activo),
+       (SELECT COUNT(*) FROM vehiculos),
+       (SELECT COUNT(*) FROM servicios)
+ON CONFLICT (id) DO UPDATE
+SET empleados_activos = EXCLUDED.empleados_activos,
+    vehiculos         = EXCLUDED.vehiculos,
+    servicios         = EXCLUDED.servicios,
+    actualizado       = NOW();
+
+CREATE OR REPLACE FUNCTION dashboard_resumen_trg() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    d_emp INT := 0;
+    d_veh INT := 0;
+    d_srv INT := 0;
+    signo INT := CASE TG_OP WHEN 'INSERT' THEN 1 WHEN 'DELETE' THEN -1 ELSE 0 END;
+BEGIN
+    IF TG_TABLE_NAME = 'empleados' THEN
+        IF TG_OP <> 'DELETE' THEN
+            IF NEW.activo THEN d_emp := d_emp + 1; END IF;
+        END IF;
+        IF TG_OP <> 'INSERT' THEN
+            IF OLD.activo THEN d_emp := d_emp - 1; END IF;
+        END IF;
+    ELSIF TG_TABLE_NAME = 'vehiculos' THEN
+        d_veh := signo;
+    ELSIF TG_TABLE_NAME = 'servicios' THEN
+        d_srv := signo;
+    END IF;
+    IF d_emp <> 0 OR d_veh <> 0 OR d_srv <> 0 THEN
+        UPDATE dashboard_resumen
+        SET empleados_activos = empleados_activos + d_emp,
+            vehiculos         = vehiculos + d_veh,
+            servicios         = servicios + d_srv,
+            actualizado       = NOW()
+        WHERE id;
+    END IF;
+    RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS dashboard_resumen_emp ON empleados;
+CREATE TRIGGER dashboard_resumen_emp
+    AFTER INSERT OR DELETE OR UPDATE OF activo ON empleados
+    FOR EACH ROW EXECUTE FUNCTION dashboard_resumen_trg();
+DROP TRIGGER IF EXISTS dashboard_resumen_veh ON vehiculos;
+CREATE TRIGGER dashboard_resumen_veh
+    AFTER INSERT OR DELETE ON vehiculos
+    FOR EACH ROW EXECUTE FUNCTION dashboard_resumen_trg();
+DROP TRIGGER IF EXISTS dashboard_resumen_srv ON servicios;
+CREATE TRIGGER dashboard_resumen_srv
+    AFTER INSERT OR DELETE ON servicios
+    FOR EACH ROW EXECUTE FUNCTION dashboard_resumen_trg();
+"""),
+
+    # ── Dashboard: índices de las listas y de "ausentes hoy" ──
+    ("dashboard_indices", """
+CREATE OR REPLACE FUNCTION periodo_ausencia(ini DATE, fin DATE) RETURNS daterange
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT daterange(ini, CASE WHEN fin IS NULL THEN NULL ELSE GREATEST(ini, fin) END, '[]')
+$$;
+
+CREATE INDEX IF NOT EXISTS ausencias_periodo_idx
+    ON ausencias USING gist (periodo_ausencia(fecha_inicio, fecha_fin));
+CREATE INDEX IF NOT EXISTS ausencias_fecha_inicio_idx
+    ON ausencias (fecha_inicio DESC);
+CREATE INDEX IF NOT EXISTS vehiculos_itv_idx
+    ON vehiculos (itv_vigente_hasta);
+"""),
+
+    # ── Listados paginados por keyset ──
+    ("listados_orden", """
+CREATE INDEX IF NOT EXISTS empleados_orden_idx
+    ON empleados ((COALESCE(apellidos, '')), (COALESCE(nombre, '')), id);
+CREATE INDEX IF NOT EXISTS vehiculos_orden_idx
+    ON vehiculos ((COALESCE(matricula, '')), id);
+"""),
+
+    # ── Búsqueda sin acentos con índices de trigramas ──
+    # En Supabase las extensiones pueden vivir en el esquema `extensions`:
+    # se localiza su esquema y se cualifica explícitamente.
+    ("busqueda", """
+CREATE EXTENSION IF NOT EXISTS unaccent;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+DO $do$
+DECLARE
+    esq TEXT;
+BEGIN
+    SELECT n.nspname INTO esq
+    FROM pg_extension e JOIN pg_namespace n ON n.oid = e.extnamespace
+    WHERE e.extname = 'unaccent';
+    EXECUTE format(
+        'CREATE OR REPLACE FUNCTION f_unaccent(TEXT) RETURNS TEXT
+         LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT AS
+         $f$ SELECT %I.unaccent(%L::regdictionary, $1) $f$',
+        esq, esq || '.unaccent');
+END $do$;
+
+CREATE OR REPLACE FUNCTION texto_busqueda(VARIADIC partes TEXT[]) RETURNS TEXT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT f_unaccent(lower(array_to_string(partes, ' ')))
+$$;
+
+DO $do$
+DECLARE
+    esq TEXT;
+BEGIN
+    SELECT n.nspname INTO esq
+    FROM pg_extension e JOIN pg_namespace n ON n.oid = e.extnamespace
+    WHERE e.extname = 'pg_trgm';
+    EXECUTE format(
+        'CREATE INDEX IF NOT EXISTS empleados_busqueda_trgm ON empleados
+         USING gin (texto_busqueda(nombre, apellidos, dni) %I.gin_trgm_ops)', esq);
+    EXECUTE format(
+        'CREATE INDEX IF NOT EXISTS vehiculos_busqueda_trgm ON vehiculos
+         USING gin (texto_busqueda(matricula, marca, modelo) %I.gin_trgm_ops)', esq);
+    -- Operador y función de pg_trgm cualificados, para no depender del
+    -- search_path. Sin SET ni STRICT: el planificador las expande en línea
+    -- y `busqueda_parecido` sigue usando el índice GIN.
+    EXECUTE format(
+        'CREATE OR REPLACE FUNCTION busqueda_parecido(termino TEXT, doc TEXT) RETURNS BOOLEAN
+         LANGUAGE sql STABLE PARALLEL SAFE AS
+         $f$ SELECT $1 OPERATOR(%I.<%%) $2 $f$', esq);
+    EXECUTE format(
+        'CREATE OR REPLACE FUNCTION busqueda_relevancia(termino TEXT, doc TEXT) RETURNS REAL
+         LANGUAGE sql IMMUTABLE PARALLEL SAFE AS
+         $f$ SELECT %I.word_similarity($1, $2) $f$', esq);
+END $do$;
+"""),
+
+    # ── Miniaturas de fotos (utils_storage) ──
+    ("fotos_miniaturas", """
+ALTER TABLE vehiculos ADD COLUMN IF NOT EXISTS foto_miniaturas BOOLEAN NOT NULL DEFAULT FALSE;
+ALTER TABLE empleados ADD COLUMN IF NOT EXISTS foto_miniaturas BOOLEAN NOT NULL DEFAULT FALSE;
+"""),
+
+    # ── Usuarios en BD (opcional, ver USUARIOS_DB en utils.get_directorio) ──
+    ("usuarios", """
+CREATE TABLE IF NOT EXISTS usuarios (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL,
+    rol      TEXT NOT NULL DEFAULT 'usuario',
+    activo   BOOLEAN NOT NULL DEFAULT TRUE
+);
+"""),
+    ("checkins", """
+CREATE TABLE IF NOT EXISTS checkins_vehiculo (
+    id            SERIAL PRIMARY KEY,
+    vehiculo_id   INT REFERENCES vehiculos(id),
+    fecha         DATE NOT NULL DEFAULT CURRENT_DATE,
+    responsable   TEXT,
+    estado_json   TEXT,
+    observaciones TEXT,
+    created_at    TIMESTAMPTZ DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS checkins_vehiculo_fecha_idx
+    ON checkins_vehiculo (vehiculo_id, fecha DESC);
+CREATE TABLE IF NOT EXISTS checkins_fotos (
+    id         SERIAL PRIMARY KEY,
+    checkin_id INT NOT NULL REFERENCES checkins_vehiculo(id) ON DELETE CASCADE,
+    url        TEXT NOT NULL,
+    nombre     TEXT,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS checkins_fotos_checkin_idx ON checkins_fotos (checkin_id);
+ALTER TABLE checkins_fotos ADD COLUMN IF NOT EXISTS miniaturas BOOLEAN NOT NULL DEFAULT FALSE;
+"""),
+    # Registro de ausencias tocadas para refrescar el índice en memoria por deltas
+    # (utils_ausencias). Se conservan los últimos 10000 cambios. `xid` es la
+    # transacción que escribió la fila: los ids se reparten al insertar, no
+    # al confirmar, así que el índice avanza por transacciones terminadas.
+    ("ausencias_cambios", """
+CREATE TABLE IF NOT EXISTS ausencias_cambios (
+    id          BIGSERIAL PRIMARY KEY,
+    ausencia_id INT NOT NULL
+);
+ALTER TABLE ausencias_cambios
+    ADD COLUMN IF NOT EXISTS xid xid8 NOT NULL DEFAULT pg_current_xact_id();
+CREATE INDEX IF NOT EXISTS ausencias_cambios_xid_idx ON ausencias_cambios (xid);
+-- Por sentencia y con tablas de transición: una carga masiva apunta todos
+-- sus ids con un solo INSERT y purga una sola vez.
+CREATE OR REPLACE FUNCTION ausencias_cambios_trg() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO ausencias_cambios (ausencia_id) SELECT id FROM nuevas;
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO ausencias_cambios (ausencia_id)
+        SELECT id FROM viejas UNION SELECT id FROM nuevas;
+    ELSE
+        INSERT INTO ausencias_cambios (ausencia_id) SELECT id FROM viejas;
+    END IF;
+    -- SKIP LOCKED: dos escrituras a la vez no se esperan por purgar las mismas filas
+    DELETE FROM ausencias_cambios
+    WHERE id IN (SELECT id FROM ausencias_cambios
+                 WHERE id <= (SELECT MAX(id) FROM ausencias_cambios) - 10000
+                 FOR UPDATE SKIP LOCKED);
+    RETURN NULL;
+END $$;
+DROP TRIGGER IF EXISTS ausencias_cambios ON ausencias;
+DROP TRIGGER IF EXISTS ausencias_cambios_ins ON ausencias;
+CREATE TRIGGER ausencias_cambios_ins AFTER INSERT ON ausencias
+    REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION ausencias_cambios_trg();
+DROP TRIGGER IF EXISTS ausencias_cambios_upd ON ausencias;
+CREATE TRIGGER ausencias_cambios_upd AFTER UPDATE ON ausencias
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION ausencias_cambios_trg();
+DROP TRIGGER IF EXISTS ausencias_cambios_del ON ausencias;
+CREATE TRIGGER ausencias_cambios_del AFTER DELETE ON ausencias
+    REFERENCING OLD TABLE AS viejas
+    FOR EACH STATEMENT EXECUTE FUNCTION ausencias_cambios_trg();
+"""),
+
+    # ── Vencimientos de ITV y seguro precalculados por vehículo ──
+    # El estado depende de la fecha: el trigger lo recalcula al escribir y
+    # utils_vencimientos lo refresca una vez al día.
+    ("vencimientos", """
+CREATE OR REPLACE FUNCTION vencimiento_estado(hasta DATE) RETURNS TEXT
+LANGUAGE sql STABLE AS $$
+    SELECT CASE WHEN hasta IS NULL THEN 'sin fecha'
+                WHEN hasta <= CURRENT_DATE THEN 'vencido'
+                WHEN hasta <= CURRENT_DATE + 30 THEN 'proximo'
+                ELSE 'ok' END
+$$;
+CREATE TABLE IF NOT EXISTS vencimientos (
+    vehiculo_id   INT PRIMARY KEY REFERENCES vehiculos(id) ON DELETE CASCADE,
+    itv_hasta     DATE,
+    itv_estado    TEXT NOT NULL,
+    seguro_hasta  DATE,
+    seguro_estado TEXT NOT NULL,
+    estado        TEXT NOT NULL,      -- el peor de los dos
+    proximo       DATE,               -- la primera de las dos fechas
+    calculado     DATE NOT NULL DEFAULT CURRENT_DATE
+);
+CREATE INDEX IF NOT EXISTS vencimientos_estado_idx ON vencimientos (estado, proximo);
+CREATE INDEX IF NOT EXISTS vencimientos_itv_idx ON vencimientos (itv_hasta);
+CREATE OR REPLACE FUNCTION vencimientos_calcular(ids INT[] DEFAULT NULL) RETURNS INT
+LANGUAGE sql AS $$
+    WITH c AS (
+        INSERT INTO vencimientos AS v (vehiculo_id, itv_hasta, itv_estado, seguro_hasta,
+                                       seguro_estado, estado, proximo, calculado)
+        SELECT id, itv_vigente_hasta, vencimiento_estado(itv_vigente_hasta),
+               seguro_vigente_hasta, vencimiento_estado(seguro_vigente_hasta),
+               CASE LEAST(array_position(ARRAY['vencido', 'proximo', 'ok', 'sin fecha'],
+                                         vencimiento_estado(itv_vigente_hasta)),
+                          array_position(ARRAY['vencido', 'proximo', 'ok', 'sin fecha'],
+                                         vencimiento_estado(seguro_vigente_hasta)))
+                   WHEN 1 THEN 'vencido' WHEN 2 THEN 'proximo' WHEN 3 THEN 'ok'
+                   ELSE 'sin fecha' END,
+               LEAST(itv_vigente_hasta, seguro_vigente_hasta), CURRENT_DATE
+        FROM vehiculos
+        WHERE ids IS NULL OR id = ANY(ids)
+        ON CONFLICT (vehiculo_id) DO UPDATE SET
+            itv_hasta = EXCLUDED.itv_hasta, itv_estado = EXCLUDED.itv_estado,
+            seguro_hasta = EXCLUDED.seguro_hasta, seguro_estado = EXCLUDED.seguro_estado,
+            estado = EXCLUDED.estado, proximo = EXCLUDED.proximo,
+            calculado = EXCLUDED.calculado
+        RETURNING 1
+    )
+    SELECT COUNT(*)::int FROM c
+$$;
+CREATE OR REPLACE FUNCTION vencimientos_trg() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM vencimientos_calcular(ARRAY[NEW.id]);
+    RETURN NULL;
+END $$;
+DROP TRIGGER IF EXISTS vencimientos_veh ON vehiculos;
+CREATE TRIGGER vencimientos_veh
+    AFTER INSERT OR UPDATE OF itv_vigente_hasta, seguro_vigente_hasta ON vehiculos
+    FOR EACH ROW EXECUTE FUNCTION vencimientos_trg();
+SELECT vencimientos_calcular();
+"""),
+
+    # ── Check-ins: estado como JSONB con gravedad precalculada e índices ──
+    # gravedad: 0 todo correcto, 1 algún punto a revisar, 2 algún defecto
+    # (ver utils_checkins).
+    ("checkins_jsonb", """
+CREATE OR REPLACE FUNCTION checkin_json(t TEXT) RETURNS JSONB
+LANGUAGE plpgsql IMMUTABLE AS $$
+BEGIN
+    RETURN NULLIF(btrim(t), '')::jsonb;
+EXCEPTION WHEN others THEN
+    RETURN jsonb_build_object('texto', t);      -- no era JSON: se conserva tal cual
+END $$;
+DO $$
+BEGIN
+    IF (SELECT data_type FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'checkins_vehiculo'
+          AND column_name = 'estado_json') = 'text' THEN
+        ALTER TABLE checkins_vehiculo
+            ALTER COLUMN estado_json TYPE JSONB USING checkin_json(estado_json);
+    END IF;
+END $$;
+CREATE OR REPLACE FUNCTION checkin_gravedad(estado JSONB) RETURNS SMALLINT
+LANGUAGE sql IMMUTABLE AS $f$
+    SELECT CASE WHEN estado @? '$.* ? (@ == "❌ Defecto")' THEN 2
+                WHEN estado @? '$.* ? (@ == "⚠️ Revisar")' THEN 1
+                ELSE 0 END::smallint
+$f$;
+ALTER TABLE checkins_vehiculo ADD COLUMN IF NOT EXISTS gravedad SMALLINT
+    GENERATED ALWAYS AS (checkin_gravedad(estado_json)) STORED;
+CREATE INDEX IF NOT EXISTS checkins_vehiculo_estado_gin
+    ON checkins_vehiculo USING gin (estado_json jsonb_path_ops);
+CREATE INDEX IF NOT EXISTS checkins_vehiculo_incidencias_idx
+    ON checkins_vehiculo (vehiculo_id, fecha DESC, id DESC) WHERE gravedad > 0;
+"""),
+
+    # ── Último check-in de cada vehículo, mantenido por trigger ──
+    # Una fila por vehículo con check-ins; el tablero de flota lee solo esta
+    # tabla. Trigger por sentencia como en ausencias_cambios.
+    ("checkins_ultimo", """
+CREATE TABLE IF NOT EXISTS checkins_ultimo (
+    vehiculo_id INT PRIMARY KEY REFERENCES vehiculos(id) ON DELETE CASCADE,
+    checkin_id  INT NOT NULL,
+    fecha       DATE NOT NULL,
+    responsable TEXT,
+    estado_json JSONB,
+    gravedad    SMALLINT NOT NULL DEFAULT 0,
+    actualizado TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS checkins_ultimo_gravedad_idx ON checkins_ultimo (gravedad DESC, fecha);
+CREATE OR REPLACE FUNCTION checkins_ultimo_calcular(ids INT[] DEFAULT NULL) RETURNS INT
+LANGUAGE plpgsql AS $$
+DECLARE
+    n INT;
+BEGIN
+    -- Un recálculo por vehículo a la vez: el segundo espera a que el primero
+    -- confirme y su INSERT (instantánea nueva) ya ve el check-in del otro
+    PERFORM pg_advisory_xact_lock(hashtext('checkins_ultimo'), v.id)
+    FROM (SELECT id FROM vehiculos WHERE ids IS NULL OR id = ANY(ids) ORDER BY id) v;
+    INSERT INTO checkins_ultimo AS u (vehiculo_id, checkin_id, fecha, responsable,
+                                      estado_json, gravedad, actualizado)
+    SELECT DISTINCT ON (c.vehiculo_id)
+           c.vehiculo_id, c.id, c.fecha, c.responsable, c.estado_json,
+           COALESCE(c.gravedad, 0), NOW()
+    FROM checkins_vehiculo c
+    JOIN vehiculos x ON x.id = c.vehiculo_id
+    WHERE ids IS NULL OR c.vehiculo_id = ANY(ids)
+    ORDER BY c.vehiculo_id, c.fecha DESC, c.id DESC
+    ON CONFLICT (vehiculo_id) DO UPDATE SET
+        checkin_id = EXCLUDED.checkin_id, fecha = EXCLUDED.fecha,
+        responsable = EXCLUDED.responsable, estado_json = EXCLUDED.estado_json,
+        gravedad = EXCLUDED.gravedad, actualizado = EXCLUDED.actualizado
+    WHERE (u.checkin_id, u.fecha, u.estado_json, u.gravedad, u.responsable)
+          IS DISTINCT FROM (EXCLUDED.checkin_id, EXCLUDED.fecha, EXCLUDED.estado_json,
+                            EXCLUDED.gravedad, EXCLUDED.responsable);
+    GET DIAGNOSTICS n = ROW_COUNT;
+    -- Vehículos que se han quedado sin check-ins
+    DELETE FROM checkins_ultimo u
+    WHERE (ids IS NULL OR u.vehiculo_id = ANY(ids))
+      AND NOT EXISTS (SELECT 1 FROM checkins_vehiculo c WHERE c.vehiculo_id = u.vehiculo_id);
+    RETURN n;
+END $$;
+CREATE OR REPLACE FUNCTION checkins_ultimo_trg() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM checkins_ultimo_calcular(ARRAY(SELECT DISTINCT vehiculo_id FROM nuevas
+                                               WHERE vehiculo_id IS NOT NULL));
+    ELSIF TG_OP = 'UPDATE' THEN
+        PERFORM checkins_ultimo_calcular(ARRAY(
+            SELECT vehiculo_id FROM viejas WHERE vehiculo_id IS NOT NULL
+            UNION SELECT vehiculo_id FROM nuevas WHERE vehiculo_id IS NOT NULL));
+    ELSE
+        PERFORM checkins_ultimo_calcular(ARRAY(SELECT DISTINCT vehiculo_id FROM viejas
+                                               WHERE vehiculo_id IS NOT NULL));
+    END IF;
+    RETURN NULL;
+END $$;
+DROP TRIGGER IF EXISTS checkins_ultimo_ins ON checkins_vehiculo;
+CREATE TRIGGER checkins_ultimo_ins AFTER INSERT ON checkins_vehiculo
+    REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION checkins_ultimo_trg();
+DROP TRIGGER IF EXISTS checkins_ultimo_upd ON checkins_vehiculo;
+CREATE TRIGGER checkins_ultimo_upd AFTER UPDATE ON checkins_vehiculo
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION checkins_ultimo_trg();
+DROP TRIGGER IF EXISTS checkins_ultimo_del ON checkins_vehiculo;
+CREATE TRIGGER checkins_ultimo_del AFTER DELETE ON checkins_vehiculo
+    REFERENCING OLD TABLE AS viejas
+    FOR EACH STATEMENT EXECUTE FUNCTION checkins_ultimo_trg();
+SELECT checkins_ultimo_calcular();
+"""),
+]
+
+
+def aplicar_esquema(conn) -> dict:
+    """Aplica todas las migraciones. Devuelve {nombre: "ok" | mensaje de error}."""
+    resultado = {}
+    for nombre, sql in MIGRACIONES:
+        try:
+            with conn.cursor() as cur:
+                cur.execute(_LOCK + sql)
+            resultado[nombre] = "ok"
+        except Exception as e:
+            log.warning("Migración %s no aplicada: %s", nombre, e)
+            resultado[nombre] = str(e).strip()
+    return resultado
@@ -1,6 +1,38 @@
-"""utils_storage.py — Subida de fotos a Supabase Storage."""
-import streamlit as st
+"""utils_storage.py — Subida de fotos a Supabase Storage.
+
+Las fotos se reescalan y recomprimen a JPEG (sin EXIF) antes de subirlas,
+se envían en streaming por una sesión HTTP con conexiones reutilizables y
+se reintentan con backoff exponencial ante errores transitorios. La URL
+base sale de SUPABASE_URL, así que basta apuntarla a un servidor local que
+imite la API de Storage para probar el flujo completo.
+"""
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import PurePosixPath
+
 import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+
+FOTO_MAX_LADO = 1600        # px del lado mayor tras reescalar
+FOTO_CALIDAD  = 82          # calidad JPEG
+REINTENTOS    = 3
+BACKOFF_SEG   = 0.5         # espera base; se duplica en cada reintento
+HTTP_TIMEOUT  = (5, 60)     # (conexión, lectura) en segundos
+MINIATURAS    = (96, 256)   # lados de las miniaturas cuadradas
+SUBIDAS_PARALELAS = 12      # tope de hilos al subir varias fotos (un hilo por foto)
+_PUBLICO      = "/storage/v1/object/public/"
+
+
+@st.cache_resource(show_spinner=False)
+def get_session() -> requests.Session:
+    """Sesión compartida: reutiliza conexiones TLS entre subidas y sesiones."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
 
 def get_supabase_headers():
@@ -11,22 +43,233 @@ def get_supabase_headers():
     }
 
 
-def subir_foto(archivo, bucket: str, nombre_archivo: str):
-    url_base = st.secrets["SUPABASE_URL"]
+def preparar_imagen(archivo, max_lado: int = FOTO_MAX_LADO, calidad: int = FOTO_CALIDAD):
+    """JPEG reescalado, orientado y sin metadatos; None si no es una imagen legible."""
+    from PIL import Image, ImageOps
+    try:
+        archivo.seek(0)
+        with Image.open(archivo) as img:
+            img.draft("RGB", (max_lado, max_lado))    # decodifica JPEG ya reducido
+            img = ImageOps.exif_transpose(img)
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            img.thumbnail((max_lado, max_lado), Image.LANCZOS)
+            salida = io.BytesIO()
+            img.save(salida, "JPEG", quality=calidad, optimize=True, progressive=True)
+    except Exception:
+        return None
+    salida.seek(0)
+    return salida
+
+
+def preparar_miniatura(archivo, lado: int):
+    """Miniatura JPEG cuadrada de `lado` px, recortada al centro."""
+    from PIL import Image, ImageOps
+    try:
+        archivo.seek(0)
+        with Image.open(archivo) as img:
+            img.draft("RGB", (lado * 2, lado * 2))
+            img = ImageOps.exif_transpose(img)
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            img = ImageOps.fit(img, (lado, lado), Image.LANCZOS)
+            salida = io.BytesIO()
+            img.save(salida, "JPEG", quality=80, optimize=True)
+    except Exception:
+        return None
+    salida.seek(0)
+    return salida
+
+
+def ruta_miniatura(nombre_archivo: str, lado: int) -> str:
+    return f"miniaturas/{lado}/{PurePosixPath(nombre_archivo).with_suffix('.jpg')}"
+
+
+def miniatura_url(url: str, lado: int) -> str:
+    """URL pública de la miniatura de `url`; la propia `url` si no es de nuestro Storage."""
+    if not url or _PUBLICO not in url:
+        return url
+    base, resto = url.split(_PUBLICO, 1)
+    bucket, _, nombre = resto.partition("/")
+    return f"{base}{_PUBLICO}{bucket}/{ruta_miniatura(nombre, lado)}"
+
+
+def _transitorio(r: requests.Response) -> bool:
+    return r.status_code == 429 or r.status_code >= 500
+
+
+def _post(session, url_base: str, headers: dict, cuerpo, bucket: str,
+          nombre_archivo: str, content_type: str):
     endpoint = f"{url_base}/storage/v1/object/{bucket}/{nombre_archivo}"
-    headers  = get_supabase_headers()
-    headers["x-upsert"] = "true"
-    data = archivo.read()
-    r = requests.post(endpoint, headers=headers, data=data)
-    if r.status_code in (200, 201):
-        return f"{url_base}/storage/v1/object/public/{bucket}/{nombre_archivo}"
+    headers  = dict(headers, **{"Content-Type": content_type, "x-upsert": "true"})
+    detalle  = ""
+    for intento in range(REINTENTOS):
+        if intento:
+            time.sleep(BACKOFF_SEG * 2 ** (intento - 1))
+        cuerpo.seek(0)
+        try:
+            r = session.post(endpoint, headers=headers, data=cuerpo, timeout=HTTP_TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            detalle = str(e)
+            continue
+        if r.status_code in (200, 201):
+            return True, f"{url_base}{_PUBLICO}{bucket}/{nombre_archivo}"
+        detalle = f"{r.status_code} — {r.text}"
+        if not _transitorio(r):
+            break
+    return False, detalle
+
+
+def _subir_foto(session, url_base: str, headers: dict, archivo, bucket: str,
+                nombre_archivo: str):
+    """Reescala y sube una foto sin tocar la UI (se puede llamar desde otro hilo)."""
+    jpeg = preparar_imagen(archivo)
+    if jpeg is not None:
+        nombre_archivo = str(PurePosixPath(nombre_archivo).with_suffix(".jpg"))
+        return _post(session, url_base, headers, jpeg, bucket, nombre_archivo, "image/jpeg")
+    return _post(session, url_base, headers, archivo, bucket, nombre_archivo,
+                 "application/octet-stream")
+
+
+def subir_bytes(cuerpo, bucket: str, nombre_archivo: str,
+                content_type: str = "application/octet-stream"):
+    """Sube un objeto (file-like, enviado en streaming). Devuelve (ok, detalle)."""
+    return _post(get_session(), st.secrets["SUPABASE_URL"], get_supabase_headers(),
+                 cuerpo, bucket, nombre_archivo, content_type)
+
+
+def subir_foto(archivo, bucket: str, nombre_archivo: str):
+    ok, detalle = _subir_foto(get_session(), st.secrets["SUPABASE_URL"],
+                              get_supabase_headers(), archivo, bucket, nombre_archivo)
+    if ok:
+        return detalle
     else:
-        st.error(f"Error al subir foto: {r.status_code} — {r.text}")
+        st.error(f"Error al subir foto: {detalle}")
         return None
 
 
+def _subir_miniaturas(session, url_base: str, headers: dict, archivo, bucket: str,
+                      nombre_archivo: str):
+    """Miniaturas de `nombre_archivo` sin tocar la UI. Devuelve (ok, error)."""
+    for lado in MINIATURAS:
+        mini = preparar_miniatura(archivo, lado)
+        if mini is None:
+            return False, "no es una imagen"
+        ok, detalle = _post(session, url_base, headers, mini, bucket,
+                            ruta_miniatura(nombre_archivo, lado), "image/jpeg")
+        if not ok:
+            return False, detalle
+    return True, ""
+
+
+def _subir_foto_y_miniaturas(session, url_base: str, headers: dict, archivo, bucket: str,
+                             nombre_archivo: str):
+    """Foto y miniaturas; ok solo si se han subido todas."""
+    ok, detalle = _subir_foto(session, url_base, headers, archivo, bucket, nombre_archivo)
+    if not ok:
+        return ok, detalle
+    mini_ok, error = _subir_miniaturas(session, url_base, headers, archivo, bucket,
+                                       nombre_archivo)
+    return (True, detalle) if mini_ok else (False, f"miniaturas: {error}")
+
+
+def subir_fotos(archivos, bucket: str, nombres, al_terminar=None,
+                miniaturas: bool = False) -> list:
+    """Sube varias fotos en paralelo, una por hilo hasta SUBIDAS_PARALELAS (o el
+    valor en secrets), así un lote tarda lo que la subida más lenta.
+
+    Devuelve [(ok, url | error)] en el orden de `archivos`. `al_terminar(i, ok,
+    detalle)` se invoca en el hilo que llama conforme acaba cada subida, así
+    que puede actualizar widgets de Streamlit. Con `miniaturas` cada hilo sube
+    también las de su foto, y una foto sin miniaturas cuenta como fallida.
+    """
+    if not archivos:
+        return []
+    session, url_base, headers = get_session(), st.secrets["SUPABASE_URL"], get_supabase_headers()
+    tope = max(1, int(st.secrets.get("SUBIDAS_PARALELAS", SUBIDAS_PARALELAS)))
+    subir      = _subir_foto_y_miniaturas if miniaturas else _subir_foto
+    resultados = [None] * len(archivos)
+    with ThreadPoolExecutor(max_workers=min(tope, len(archivos)),
+                            thread_name_prefix="subida") as ex:
+        futuros = {
+            ex.submit(subir, session, url_base, headers, a, bucket, n): i
+            for i, (a, n) in enumerate(zip(archivos, nombres))
+        }
+        for fut in as_completed(futuros):
+            i = futuros[fut]
+            try:
+                resultados[i] = fut.result()
+            except Exception as e:
+                resultados[i] = (False, str(e))
+            if al_terminar:
+                al_terminar(i, *resultados[i])
+    return resultados
+
+
+def subir_miniaturas(archivo, bucket: str, nombre_archivo: str) -> bool:
+    """Genera y sube una miniatura por cada lado de MINIATURAS."""
+    ok, _ = _subir_miniaturas(get_session(), st.secrets["SUPABASE_URL"],
+                              get_supabase_headers(), archivo, bucket, nombre_archivo)
+    return ok
+
+
+def subir_foto_y_miniaturas(archivo, bucket: str, nombre_archivo: str):
+    """Como subir_foto, y además sus miniaturas. Devuelve (url | None, miniaturas_ok)."""
+    url = subir_foto(archivo, bucket, nombre_archivo)
+    if not url:
+        return None, False
+    nombre = url.split(f"{_PUBLICO}{bucket}/", 1)[1]
+    return url, subir_miniaturas(archivo, bucket, nombre)
+
+
+def backfill_miniaturas(tablas=("vehiculos", "empleados")) -> dict:
+    """Crea las miniaturas de las fotos subidas antes de que existieran.
+
+    Recorre las filas con `foto_miniaturas = FALSE`, descarga el original,
+    sube sus miniaturas y marca la fila. Devuelve {tabla: (hechas, fallidas)}.
+    """
+    from utils import query, execute
+    url_base  = st.secrets["SUPABASE_URL"]
+    resultado = {}
+    for tabla in tablas:
+        hechas = fallidas = 0
+        filas = query(f"SELECT id, foto_url FROM {tabla} "
+                      "WHERE COALESCE(foto_url, '') <> '' AND NOT foto_miniaturas")
+        for f in filas:
+            url = f["foto_url"]
+            if not url.startswith(url_base + _PUBLICO):
+                continue
+            bucket, _, nombre = url.split(_PUBLICO, 1)[1].partition("/")
+            try:
+                r = get_session().get(url, timeout=HTTP_TIMEOUT)
+                ok = r.status_code == 200 and subir_miniaturas(
+                    io.BytesIO(r.content), bucket, nombre)
+            except requests.RequestException:
+                ok = False
+            if ok and execute(f"UPDATE {tabla} SET foto_miniaturas = TRUE WHERE id = %s",
+                              (f["id"],)):
+                hechas += 1
+            else:
+                fallidas += 1
+        resultado[tabla] = (hechas, fallidas)
+    return resultado
+
+
 def eliminar_foto(bucket: str, nombre_archivo: str) -> bool:
     url_base = st.secrets["SUPABASE_URL"]
     endpoint = f"{url_base}/storage/v1/object/{bucket}/{nombre_archivo}"
-    r = requests.delete(endpoint, headers=get_supabase_headers())
+    r = get_session().delete(endpoint, headers=get_supabase_headers(), timeout=HTTP_TIMEOUT)
     return r.status_code in (200, 204)
+
+
+def eliminar_foto_y_miniaturas(bucket: str, nombre_archivo: str) -> bool:
+    """Borra la foto y sus miniaturas; True si se ha borrado la foto."""
+    for lado in MINIATURAS:
+        eliminar_foto(bucket, ruta_miniatura(nombre_archivo, lado))
+    return eliminar_foto(bucket, nombre_archivo)
+
+
+if __name__ == "__main__":
+    # python utils_storage.py  →  backfill de miniaturas (usa .streamlit/secrets.toml)
+    for tabla, (hechas, fallidas) in backfill_miniaturas().items():
+        print(f"{tabla}: {hechas} miniaturas creadas, {fallidas} fallidas")
@@ -0,0 +1,189 @@
+"""utils_vencimientos.py — Estado de ITV y seguro por vehículo y resumen diario.
+
+El estado (vencido / proximo / ok / sin fecha) vive precalculado en la
+tabla `vencimientos` (ver utils_schema): un trigger lo recalcula al
+escribir las fechas de un vehículo y aquí se refresca una vez al día,
+porque "vence en ≤30 días" cambia aunque nadie toque la fila.
+
+Un hilo de fondo deja cada día, a partir de RESUMEN_HORA, un resumen de
+los vencimientos en OUTBOX como texto y como .eml listo para enviar.
+
+Para generar el resumen a mano:  python utils_vencimientos.py
+"""
+import datetime
+import logging
+import threading
+from email.message import EmailMessage
+from pathlib import Path
+
+import streamlit as st
+
+from utils import query, execute
+
+log = logging.getLogger(__name__)
+
+ALERTA_DIAS  = 30                 # coincide con vencimiento_estado() en utils_schema
+RESUMEN_HORA = 7                  # hora local a partir de la que se genera el resumen
+OUTBOX       = Path("data/outbox")
+
+ESTADO_ICONO = {"vencido": "🔴", "proximo": "🟡", "ok": "🟢", "sin fecha": "⚪"}
+
+SQL_REFRESCO = ("SELECT vencimientos_calcular() "
+                "WHERE EXISTS (SELECT 1 FROM vencimientos WHERE calculado < CURRENT_DATE)")
+
+SQL_ESTADOS = """
+    SELECT vehiculo_id, itv_hasta, itv_estado, seguro_hasta, seguro_estado, estado
+    FROM vencimientos WHERE vehiculo_id = ANY(%s)
+"""
+
+SQL_ALERTAS = """
+    SELECT v.vehiculo_id, x.matricula, x.marca, x.modelo,
+           v.itv_hasta, v.itv_estado, v.seguro_hasta, v.seguro_estado,
+           v.estado, v.proximo
+    FROM vencimientos v
+    JOIN vehiculos x ON x.id = v.vehiculo_id
+    WHERE v.estado IN ('vencido', 'proximo')
+    ORDER BY v.estado DESC, v.proximo
+"""
+
+
+class _RefrescoFallido(Exception):
+    pass
+
+
+@st.cache_resource(show_spinner=False)
+def _refresco_diario(fecha: datetime.date) -> bool:
+    # Un fallo se lanza para que cache_resource no lo guarde hasta mañana
+    if not execute(SQL_REFRESCO):
+        raise _RefrescoFallido(fecha)
+    return True
+
+
+def refrescar() -> bool:
+    """Recalcula los estados si aún no se ha hecho hoy (una vez por proceso y día).
+
+    Si falla (execute ya muestra el error) se reintenta en la siguiente llamada.
+    """
+    try:
+        return _refresco_diario(datetime.date.today())
+    except _RefrescoFallido:
+        return False
+
+
+def estados(vehiculo_ids) -> dict:
+    """{vehiculo_id: fila de vencimientos} para los ids dados (búsqueda por clave)."""
+    refrescar()
+    ids = [int(i) for i in vehiculo_ids]
+    if not ids:
+        return {}
+    return {r["vehiculo_id"]: r for r in query(SQL_ESTADOS, (ids,), ttl=300)}
+
+
+def alertas() -> list:
+    """Vehículos con ITV o seguro vencido o a ≤ALERTA_DIAS días, los vencidos primero."""
+    refrescar()
+    return query(SQL_ALERTAS, ttl=300)
+
+
+def dias_hasta(fecha, hoy: datetime.date = None):
+    if fecha is None:
+        return None
+    return (fecha - (hoy or datetime.date.today())).days
+
+
+# ─────────────────────────────────────────────
+# RESUMEN
+# ─────────────────────────────────────────────
+def texto_resumen(filas: list, hoy: datetime.date) -> str:
+    lineas = [f"Vencimientos de flota — {hoy:%d/%m/%Y}", ""]
+    if not filas:
+        lineas.append(f"Ningún vehículo con ITV o seguro vencido o a menos de {ALERTA_DIAS} días.")
+    for estado, titulo in (("vencido", "VENCIDOS"), ("proximo", f"PRÓXIMOS {ALERTA_DIAS} DÍAS")):
+        grupo = [f for f in filas if f["estado"] == estado]
+        if not grupo:
+            continue
+        lineas.append(f"{titulo} ({len(grupo)})")
+        for f in grupo:
+            partes = []
+            for campo, nombre in (("itv", "ITV"), ("seguro", "Seguro")):
+                if f[f"{campo}_estado"] in ("vencido", "proximo"):
+                    d = dias_hasta(f[f"{campo}_hasta"], hoy)
+                    partes.append(f"{nombre} {f[f'{campo}_hasta']:%d/%m/%Y} "
+                                  + (f"(hace {-d} días)" if d < 0 else
+                                     "(hoy)" if d == 0 else f"(en {d} días)"))
+            lineas.append(f"  - {f['matricula'] or '—'} {f['marca'] or ''} "
+                          f"{f['modelo'] or ''}: " + "; ".join(partes))
+        lineas.append("")
+    return "\n".join(lineas).rstrip() + "\n"
+
+
+def generar_resumen(hoy: datetime.date = None, outbox: Path = OUTBOX,
+                    destino: str = None) -> Path:
+    """Escribe el resumen del día en `outbox` (.txt y .eml) y devuelve la ruta del .eml."""
+    hoy = hoy or datetime.date.today()
+    execute(SQL_REFRESCO)
+    filas = query(SQL_ALERTAS)
+    texto = texto_resumen(filas, hoy)
+
+    msg = EmailMessage()
+    msg["Subject"] = (f"[PRODE] Vencimientos {hoy:%d/%m/%Y}: "
+                      f"{sum(f['estado'] == 'vencido' for f in filas)} vencidos, "
+                      f"{sum(f['estado'] == 'proximo' for f in filas)} próximos")
+    msg["From"] = "prode@localhost"
+    msg["To"]   = destino or st.secrets.get("VENCIMIENTOS_DESTINO", "flota@localhost")
+    msg.set_content(texto)
+
+    outbox.mkdir(parents=True, exist_ok=True)
+    base = outbox / f"vencimientos_{hoy:%Y-%m-%d}"
+    base.with_suffix(".txt").write_text(texto, encoding="utf-8")
+    base.with_suffix(".eml").write_bytes(bytes(msg))
+    return base.with_suffix(".eml")
+
+
+class ProgramadorResumen(threading.Thread):
+    """Genera el resumen una vez al día a partir de RESUMEN_HORA.
+
+    Si el fichero del día ya está en el outbox (otro proceso o un reinicio)
+    no lo repite.
+    """
+
+    def __init__(self, hora: int = RESUMEN_HORA, outbox: Path = OUTBOX):
+        super().__init__(name="resumen-vencimientos", daemon=True)
+        self.hora   = hora
+        self.outbox = outbox
+        self._parar = threading.Event()
+
+    def _pendiente(self, ahora: datetime.datetime) -> bool:
+        hecho = self.outbox / f"vencimientos_{ahora:%Y-%m-%d}.eml"
+        return ahora.hour >= self.hora and not hecho.exists()
+
+    def _espera(self, ahora: datetime.datetime) -> float:
+        siguiente = ahora.replace(hour=self.hora, minute=0, second=0, microsecond=0)
+        if siguiente <= ahora:
+            siguiente += datetime.timedelta(days=1)
+        return min((siguiente - ahora).total_seconds(), 3600)
+
+    def run(self):
+        while not self._parar.is_set():
+            ahora = datetime.datetime.now()
+            if self._pendiente(ahora):
+                try:
+                    log.info("Resumen de vencimientos en %s", generar_resumen(ahora.date(), self.outbox))
+                except Exception as e:
+                    log.warning("No se pudo generar el resumen de vencimientos: %s", e)
+            self._parar.wait(self._espera(datetime.datetime.now()))
+
+    def parar(self):
+        self._parar.set()
+
+
+@st.cache_resource(show_spinner=False)
+def iniciar_programador() -> ProgramadorResumen:
+    """Arranca el hilo del resumen diario una sola vez por proceso."""
+    hilo = ProgramadorResumen()
+    hilo.start()
+    return hilo
+
+
+if __name__ == "__main__":
+    print(generar_resumen())